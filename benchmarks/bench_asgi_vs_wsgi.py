@@ -0,0 +1,117 @@
+"""Side-by-side load test of the WSGI (app.py) and ASGI (asgi_app.py) servers.
+
+Starts each server as a subprocess against the same MongoDB, then runs the
+k6 scenario (create, get, update, list, delete) from an asyncio client at
+several concurrency levels and prints throughput and latency for both.
+
+Needs a reachable MongoDB (MONGO_URL) and httpx:
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/bench_asgi_vs_wsgi.py --concurrency 10 100 500 --duration 15
+
+The server commands can be overridden, e.g. to compare against a
+multi-worker WSGI deployment.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from harness import BENCH_DB_NAME, REPO_ROOT, percentile
+
+NOTES_SERVER_DIR = os.path.join(REPO_ROOT, 'notes-server')
+AUTH = ('admin', 'password')
+
+SERVERS = {
+    'wsgi': '{python} -m flask --app app run --port {port} --with-threads',
+    'asgi': '{python} -m uvicorn asgi_app:app --port {port} --log-level warning',
+}
+
+
+async def timed_request(client, latencies, errors, method, path, body=None):
+    start = time.perf_counter()
+    res = await client.request(method, path, json=body)
+    latencies.append((time.perf_counter() - start) * 1000)
+    if res.status_code >= 400:
+        errors.append(res.status_code)
+    return res
+
+
+async def user_loop(client, deadline, latencies, errors):
+    """One virtual user running the k6 iteration back to back"""
+    while time.perf_counter() < deadline:
+        res = await timed_request(client, latencies, errors, 'POST', '/notes',
+                                  {'title': 'bench', 'content': 'x' * 100})
+        if res.status_code != 201:
+            continue
+        note_id = res.json()['id']
+        await timed_request(client, latencies, errors, 'GET', f'/notes/{note_id}')
+        await timed_request(client, latencies, errors, 'PUT', f'/notes/{note_id}', {'title': 'updated'})
+        await timed_request(client, latencies, errors, 'GET', '/notes?limit=20')
+        await timed_request(client, latencies, errors, 'DELETE', f'/notes/{note_id}')
+
+
+async def run_load(base_url, concurrency, duration):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, auth=AUTH, limits=limits, timeout=30) as client:
+        latencies, errors = [], []
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*(user_loop(client, deadline, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'errors': len(errors),
+    }
+
+
+def wait_until_healthy(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f'{base_url}/health', timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'{base_url} did not become healthy')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--duration', type=float, default=10, help='seconds per concurrency level')
+    parser.add_argument('--port', type=int, default=5055)
+    for name, command in SERVERS.items():
+        parser.add_argument(f'--{name}-cmd', default=command, help=f'command that starts the {name} server')
+    args = parser.parse_args()
+
+    env = dict(os.environ, DB_NAME=BENCH_DB_NAME)
+    print(f"{'server':<6} {'VUs':>5} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name in SERVERS:
+        command = getattr(args, f'{name}_cmd').format(python=sys.executable, port=args.port)
+        server = subprocess.Popen(command.split(), cwd=NOTES_SERVER_DIR, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base_url = f'http://127.0.0.1:{args.port}'
+        try:
+            wait_until_healthy(base_url)
+            for concurrency in args.concurrency:
+                stats = asyncio.run(run_load(base_url, concurrency, args.duration))
+                print(f"{name:<6} {concurrency:>5} {stats['requests']:>9} {stats['rps']:>9.0f} "
+                      f"{stats['p50']:>8.2f} {stats['p95']:>8.2f} {stats['p99']:>8.2f} {stats['errors']:>7}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""notes-server note bodies stored plain vs compressed (NOTES_COMPRESS_CONTENT).
+
+Seeds BENCH_DB_NAME with --notes notes per body size (--sizes, in KiB of
+word-salad text), once stored plain and once compressed, and reports:
+
+- the collection's BSON data size and its on-disk storage size (after
+  WiredTiger's own block compression);
+- bytes MongoDB sent back per request (command replies, counted by a
+  CommandListener) and p50 latency of GET /notes?limit=100, the same with
+  view=summary, and GET /notes/<id> with the note cache off;
+- p50 latency of POST /notes, which pays for the compression.
+
+Needs a reachable MongoDB (MONGO_URL).
+
+    python benchmarks/bench_content_compression.py --sizes 1 8 64
+"""
+import argparse
+import base64
+import os
+import random
+import sys
+
+import bson
+from pymongo import MongoClient, monitoring
+
+from harness import BENCH_DB_NAME, MONGO_URL, load_service, percentile, timed
+
+WORDS = ('note', 'load', 'test', 'server', 'latency', 'request', 'mongo', 'index', 'query', 'page',
+         'cursor', 'worker', 'thread', 'pool', 'cache', 'summary', 'content', 'title', 'update', 'create',
+         'delete', 'search', 'batch', 'stream', 'metric', 'trend', 'result', 'throughput', 'percentile', 'k6')
+
+
+class ReplyBytes(monitoring.CommandListener):
+    """Adds up the BSON size of every command reply"""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.bytes += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        pass
+
+
+def make_content(rng, kib):
+    words = []
+    size = 0
+    while size < kib * 1024:
+        word = rng.choice(WORDS) if rng.random() > 0.1 else str(rng.randrange(100000))
+        words.append(word)
+        size += len(word) + 1
+    return ' '.join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 8, 64], help='body size in KiB')
+    parser.add_argument('--notes', type=int, default=1000, help='notes seeded per size')
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ['DB_NAME'] = BENCH_DB_NAME
+    os.environ['NOTES_CACHE_SIZE'] = '0'
+    replies = ReplyBytes()
+    monitoring.register(replies)
+    notes_app = load_service('notes-server')
+    notes = sys.modules['notes']
+    client = notes_app.app.test_client()
+    auth = {'Authorization': 'Basic ' + base64.b64encode(b'admin:password').decode()}
+    db = MongoClient(MONGO_URL)[BENCH_DB_NAME]
+    collection = db[notes.COLLECTION_NAME]
+
+    def per_request(path):
+        assert client.get(path, headers=auth).status_code == 200, path
+        replies.bytes = 0
+        latencies = timed(lambda: client.get(path, headers=auth), args.iterations)
+        return replies.bytes / args.iterations, percentile(latencies, 50)
+
+    print(f"compression threshold {notes.COMPRESS_MIN_BYTES} B, zlib level {notes.COMPRESS_LEVEL}")
+    print(f"{'body KiB':>8} {'mode':<10} {'data KB':>9} {'disk KB':>9} {'list B/req':>11} {'list ms':>8} "
+          f"{'summary B/req':>13} {'summary ms':>10} {'get B/req':>10} {'get ms':>7} {'create ms':>9}")
+    for kib in args.sizes:
+        rng = random.Random(kib)
+        bodies = [make_content(rng, kib) for _ in range(args.notes)]
+        for mode in ('plain', 'compressed'):
+            notes.COMPRESS_CONTENT = mode == 'compressed'
+            collection.drop()
+            for name, keys, options in notes.INDEXES:
+                db[name].create_index(keys, **options)
+            now = notes.utc_now()
+            collection.insert_many([notes.build_note({'title': f'Note {i}', 'content': body}, now)
+                                    for i, body in enumerate(bodies)])
+            # Checkpoint, so storageSize reflects the new data
+            db.client.admin.command('fsync')
+            stats = next(collection.aggregate([{'$collStats': {'storageStats': {}}}]))['storageStats']
+
+            note_id = str(collection.find_one({}, {'_id': 1})['_id'])
+            list_bytes, list_ms = per_request('/notes?limit=100')
+            summary_bytes, summary_ms = per_request('/notes?limit=100&view=summary')
+            get_bytes, get_ms = per_request(f'/notes/{note_id}')
+            body = bodies[0]
+            create = timed(lambda: client.post('/notes', json={'title': 'bench', 'content': body}, headers=auth),
+                           args.iterations)
+            print(f"{kib:>8} {mode:<10} {stats['size'] / 1024:>9.0f} {stats['storageSize'] / 1024:>9.0f} "
+                  f"{list_bytes:>11.0f} {list_ms:>8.2f} {summary_bytes:>13.0f} {summary_ms:>10.2f} "
+                  f"{get_bytes:>10.0f} {get_ms:>7.3f} {percentile(create, 50):>9.3f}")
+
+    collection.drop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Sustained note-create throughput: one insert_one per request vs group commit.
+
+Runs --threads writer threads for --duration seconds against the same
+MongoDB, first each calling ``insert_one`` and then sharing one
+``GroupCommitter`` per window size, and prints inserts per second, p50/p95
+latency per create and the committer's batch statistics.
+
+Needs a reachable MongoDB (MONGO_URL); uses the BENCH_DB_NAME database.
+
+    python benchmarks/bench_group_commit.py --threads 20 --windows 0 1 2 5
+"""
+import argparse
+import threading
+import time
+
+from pymongo import MongoClient
+
+from harness import BENCH_DB_NAME, MONGO_URL, load_service, percentile
+
+notes = load_service('notes-server', 'notes')
+group_commit = load_service('notes-server', 'group_commit')
+
+
+def run_writers(insert, threads, duration):
+    latencies = [[] for _ in range(threads)]
+    deadline = time.perf_counter() + duration
+
+    def writer(samples):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            insert(notes.build_note({'title': 'bench', 'content': 'x' * 200}, notes.utc_now()))
+            samples.append((time.perf_counter() - start) * 1000)
+
+    workers = [threading.Thread(target=writer, args=(samples,)) for samples in latencies]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    merged = sorted(sample for samples in latencies for sample in samples)
+    return len(merged) / elapsed, percentile(merged, 50), percentile(merged, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--windows', type=float, nargs='+', default=[0, 2, 5], help='window sizes in ms')
+    parser.add_argument('--max-batch', type=int, default=notes.GROUP_COMMIT_MAX_BATCH)
+    args = parser.parse_args()
+
+    client = MongoClient(MONGO_URL, maxPoolSize=args.threads + 1)
+    collection = client[BENCH_DB_NAME]['notes']
+    collection.drop()
+
+    print(f"{'mode':<26} {'inserts/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'avg batch':>10} {'flush p50':>10}")
+    rate, p50, p95 = run_writers(collection.insert_one, args.threads, args.duration)
+    print(f"{'insert_one':<26} {rate:>10.0f} {p50:>8.2f} {p95:>8.2f} {'-':>10} {'-':>10}")
+    for window in args.windows:
+        committer = group_commit.GroupCommitter(lambda: collection, window / 1000, args.max_batch)
+        rate, p50, p95 = run_writers(committer.insert, args.threads, args.duration)
+        stats = committer.stats.snapshot()
+        print(f"{f'group commit {window:g} ms':<26} {rate:>10.0f} {p50:>8.2f} {p95:>8.2f} "
+              f"{stats['avg_batch_size']:>10.1f} {stats['flush_ms_p50']:>10.2f}")
+
+    collection.drop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""results-viewer list views: full documents vs materialized summaries.
+
+Seeds BENCH_DB_NAME with 100 k6 results whose ``metrics`` tree holds
+--metrics extra entries (a large run has hundreds of custom and per-tag
+metrics), then times GET / and GET /api/results through the Flask test
+client, next to the previous query that read the 100 full documents.
+
+Needs a reachable MongoDB (MONGO_URL).
+
+    python benchmarks/bench_results_list.py --metrics 10 1000 5000
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+from harness import BENCH_DB_NAME, MONGO_URL, load_service, percentile, timed
+
+
+def make_result(i, extra_metrics):
+    metrics = {
+        'http_reqs': {'type': 'counter', 'values': {'count': 1000 + i, 'rate': 33.3}},
+        'http_req_duration': {'type': 'trend', 'values': {'avg': 12.5, 'p(95)': 40.1, 'max': 250.0}},
+        'http_req_failed': {'type': 'rate', 'values': {'rate': 0.01}},
+    }
+    for n in range(extra_metrics):
+        metrics[f'http_req_duration{{name:/notes/{n}}}'] = {
+            'type': 'trend',
+            'values': {'avg': 1.0, 'min': 0.1, 'med': 0.9, 'max': 9.0, 'p(90)': 2.0, 'p(95)': 3.0}
+        }
+    return {'test_id': f'run-{i}', 'timestamp': datetime(2024, 1, 1) + timedelta(hours=i), 'metrics': metrics}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--metrics', type=int, nargs='+', default=[10, 1000, 5000],
+                        help='extra metrics per result document')
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ['DB_NAME'] = BENCH_DB_NAME
+    viewer = load_service('results-viewer')
+    client = viewer.app.test_client()
+    collection = MongoClient(MONGO_URL)[BENCH_DB_NAME][viewer.RESULTS_COLLECTION_NAME]
+
+    print(f"{'metrics/doc':>11} {'doc KB':>8} {'full find p50':>14} {'GET / p50':>10} {'GET /api p50':>13}")
+    for extra in args.metrics:
+        collection.drop()
+        collection.insert_many([make_result(i, extra) for i in range(100)])
+        # Materialize the summaries, as the first list view would
+        viewer.find_summaries(viewer.get_results_collection())
+        doc_kb = collection.find_one({}, {viewer.SUMMARY_FIELD: 1})[viewer.SUMMARY_FIELD]['size'] / 1024
+
+        full = timed(lambda: list(collection.find().sort('timestamp', -1).limit(100)), args.iterations)
+        index = timed(lambda: client.get('/'), args.iterations)
+        api = timed(lambda: client.get('/api/results'), args.iterations)
+        print(f"{extra:>11} {doc_kb:>8.1f} {percentile(full, 50):>11.2f} ms {percentile(index, 50):>7.2f} ms "
+              f"{percentile(api, 50):>10.2f} ms")
+
+    collection.drop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Check that GET /notes/search stays index-backed on a large collection.
+
+Seeds BENCH_DB_NAME with --notes synthetic notes (1M by default, kept
+between runs with --reuse), creates notes-server's indexes and runs the
+same queries the search route builds: a title prefix page, the next page
+from its cursor and a ranked text search. For each it prints the plan
+stages from ``explain``, keys and documents examined and p50/p95 latency.
+A case-insensitive ``$regex`` on ``title`` (what a client would have to
+send without the new route) is shown for comparison; it has to scan.
+
+Needs a reachable MongoDB 4.4+ (MONGO_URL).
+
+    python benchmarks/bench_search.py --notes 1000000 --iterations 50
+"""
+import argparse
+import random
+import re
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+from harness import BENCH_DB_NAME, MONGO_URL, load_service, percentile, timed
+
+notes = load_service('notes-server', 'notes')
+
+WORDS = ('alpha', 'budget', 'meeting', 'release', 'incident', 'roadmap', 'invoice', 'design',
+         'review', 'launch', 'backlog', 'retro', 'hiring', 'security', 'migration', 'latency')
+
+
+def seed(collection, count, batch=10000):
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    for offset in range(0, count, batch):
+        docs = []
+        for i in range(offset, min(offset + batch, count)):
+            words = rng.sample(WORDS, 3)
+            data = {'title': ' '.join(words).title() + f' {i}',
+                    'content': ' '.join(rng.choice(WORDS) for _ in range(30))}
+            docs.append(notes.build_note(data, start + timedelta(seconds=i)))
+        collection.insert_many(docs, ordered=False)
+
+
+def plan_stages(node, stages=None):
+    """All ``stage`` names in an explain output, outermost first"""
+    if stages is None:
+        stages = []
+    if isinstance(node, dict):
+        if 'stage' in node:
+            stages.append(node['stage'])
+        for key, value in node.items():
+            if key != 'rejectedPlans':
+                plan_stages(value, stages)
+    elif isinstance(node, list):
+        for item in node:
+            plan_stages(item, stages)
+    return stages
+
+
+def find_stat(node, name):
+    if isinstance(node, dict):
+        if name in node:
+            return node[name]
+        values = [find_stat(value, name) for value in node.values()]
+    elif isinstance(node, list):
+        values = [find_stat(item, name) for item in node]
+    else:
+        return None
+    return next((value for value in values if value is not None), None)
+
+
+def report(db, name, command, run, iterations):
+    explain = db.command({'explain': command, 'verbosity': 'executionStats'})
+    stages = list(dict.fromkeys(plan_stages(explain)))
+    latencies = timed(run, iterations)
+    print(f"{name:<30} {','.join(stages)[:38]:<38} {find_stat(explain, 'totalKeysExamined') or 0:>9} "
+          f"{find_stat(explain, 'totalDocsExamined') or 0:>9} "
+          f"{percentile(latencies, 50):>8.2f} {percentile(latencies, 95):>8.2f}")
+    if 'COLLSCAN' in stages and 'regex' not in name:
+        print(f"  warning: {name} is not index-backed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, default=1_000_000)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=notes.DEFAULT_PAGE_SIZE)
+    parser.add_argument('--prefix', default='Rel')
+    parser.add_argument('--q', default='incident roadmap')
+    parser.add_argument('--reuse', action='store_true', help='keep an already seeded collection')
+    args = parser.parse_args()
+
+    client = MongoClient(MONGO_URL)
+    db = client[BENCH_DB_NAME]
+    collection = db[notes.COLLECTION_NAME]
+    if not (args.reuse and collection.estimated_document_count() == args.notes):
+        collection.drop()
+        print(f'seeding {args.notes} notes...')
+        seed(collection, args.notes)
+    for name, keys, options in notes.INDEXES:
+        db[name].create_index(keys, **options)
+
+    limit = args.limit
+    sort = [(notes.TITLE_KEY_FIELD, 1), ('_id', 1)]
+    prefix = notes.title_key(args.prefix)
+
+    def prefix_page(after=None):
+        return list(collection.find(notes.prefix_search_query(prefix, after)).sort(sort).limit(limit + 1))
+
+    _, cursor = notes.search_page(prefix_page(), limit, 'prefix')
+    after = notes.decode_search_cursor(cursor, str) if cursor else None
+    pipeline = notes.text_search_pipeline(args.q, None, limit)
+    regex = {'title': {'$regex': '^' + re.escape(args.prefix), '$options': 'i'}}
+
+    print(f"{'query':<30} {'plan stages':<38} {'keys':>9} {'docs':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    report(db, 'prefix (page 1)',
+           {'find': collection.name, 'filter': notes.prefix_search_query(prefix),
+            'sort': dict(sort), 'limit': limit + 1},
+           prefix_page, args.iterations)
+    if after is not None:
+        report(db, 'prefix (page 2, from cursor)',
+               {'find': collection.name, 'filter': notes.prefix_search_query(prefix, after),
+                'sort': dict(sort), 'limit': limit + 1},
+               lambda: prefix_page(after), args.iterations)
+    report(db, f'text "{args.q}"',
+           {'aggregate': collection.name, 'pipeline': pipeline, 'cursor': {}},
+           lambda: list(collection.aggregate(pipeline)), args.iterations)
+    report(db, 'regex /^prefix/i on title',
+           {'find': collection.name, 'filter': regex, 'sort': {'title': 1}, 'limit': limit + 1},
+           lambda: list(collection.find(regex).sort('title', 1).limit(limit + 1)),
+           max(1, args.iterations // 10))
+
+
+if __name__ == '__main__':
+    main()
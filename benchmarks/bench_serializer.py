@@ -0,0 +1,64 @@
+"""Micro-benchmark: generic serialize_document + json vs the note fast path.
+
+Encodes 1, 1k and 100k synthetic notes to JSON the way the list endpoint
+used to (``serialize_document`` per note, then ``json.dumps`` with the
+sorted keys Flask's ``jsonify`` uses) and with ``serializer.dumps_notes``,
+and reports the best time of several runs. No MongoDB needed.
+
+    python benchmarks/bench_serializer.py
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from harness import load_service
+
+serializer = load_service('notes-server', 'serializer')
+
+
+def make_notes(count):
+    base = datetime(2024, 1, 1)
+    return [{
+        '_id': ObjectId(),
+        'title': f'Note {i}',
+        'content': f'This is test note content created by virtual user {i % 20} in iteration {i}',
+        'created_at': base + timedelta(seconds=i),
+        'updated_at': base + timedelta(seconds=i, milliseconds=500),
+    } for i in range(count)]
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 1000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    def generic(docs):
+        return json.dumps([serializer.serialize_document(doc) for doc in docs], sort_keys=True).encode('utf-8')
+
+    print(f"{'docs':>7} {'generic ms':>11} {'fast ms':>9} {'speedup':>8} {'us/doc fast':>12}")
+    for size in args.sizes:
+        docs = make_notes(size)
+        assert json.loads(generic(docs)) == json.loads(serializer.dumps_notes(docs))
+        # Small inputs are repeated inside one timing so the clock resolution does not dominate
+        loops = max(1, 10000 // size)
+        generic_s = best_of(lambda: [generic(docs) for _ in range(loops)], args.repeat) / loops
+        fast_s = best_of(lambda: [serializer.dumps_notes(docs) for _ in range(loops)], args.repeat) / loops
+        print(f"{size:>7} {generic_s * 1000:>11.3f} {fast_s * 1000:>9.3f} {generic_s / fast_s:>7.2f}x "
+              f"{fast_s / size * 1e6:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
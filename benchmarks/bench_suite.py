@@ -0,0 +1,394 @@
+"""In-process benchmark suite for every notes-server and results-viewer route.
+
+Drives each route of both ``app.py`` files through the Flask test client
+against mongomock (an in-memory MongoDB stand-in), plus
+``serialize_document`` and ``extract_metrics`` at several dataset sizes,
+and prints per case:
+
+- ops/s and p50/p99 latency over --iterations calls, made in --rounds
+  rounds; the spread of the rounds' p50s is kept as the case's noise;
+- allocations per call: the peak memory tracemalloc sees above the level
+  before the call, in KiB (measured in a separate, shorter pass).
+
+Results are compared with a stored baseline (``benchmarks/baseline.json``
+by default). The script exits with status 1, listing the cases, when a p50
+or allocation figure is worse than the baseline by more than --tolerance.
+A p50 also has to exceed that bound by more than the larger of the two
+runs' noise, and to do so again when the case is measured a second time.
+Timings are only compared when the baseline was recorded on a machine with
+the same fingerprint (CPU model and count, OS, Python and mongomock
+versions) and both runs made at least MIN_TIMED_ITERATIONS calls;
+allocations always are. Record a baseline with --save-baseline. A route
+without a case here is an error, so new routes have to be added to the
+suite.
+
+Absolute numbers say little about a real MongoDB. The suite is meant to
+catch regressions in the Python side of a request: routing, argument
+parsing, serialization and templating.
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --save-baseline
+"""
+import argparse
+import gzip
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from base64 import b64encode
+from datetime import datetime, timedelta
+
+import mongomock
+from bson import ObjectId
+
+from harness import load_service, percentile
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+AUTH = {'Authorization': 'Basic ' + b64encode(b'admin:password').decode()}
+# Allocation differences below this many KiB are noise, whatever the tolerance
+ALLOC_SLACK_KIB = 2.0
+# Fewer timed calls per case give p50s too noisy to fail a run on
+MIN_TIMED_ITERATIONS = 100
+
+notes_app = load_service('notes-server')
+serializer = load_service('notes-server', 'serializer')
+viewer = load_service('results-viewer')
+notes_app.MongoClient = mongomock.MongoClient
+viewer.MongoClient = mongomock.MongoClient
+
+
+def make_note(i, base=datetime(2024, 1, 1)):
+    return notes_app.build_note({
+        'title': f'Note {i}',
+        'content': f'This is test note content created by virtual user {i % 20} in iteration {i}',
+    }, base + timedelta(seconds=i))
+
+
+def make_result(i, extra_metrics):
+    metrics = {
+        'http_reqs': {'type': 'counter', 'values': {'count': 1000 + i, 'rate': 33.3}},
+        'http_req_duration': {'type': 'trend', 'values': {'avg': 12.5, 'p(95)': 40.1, 'max': 250.0}},
+        'http_req_failed': {'type': 'rate', 'values': {'rate': 0.01}},
+    }
+    for n in range(extra_metrics):
+        metrics[f'http_req_duration{{name:/notes/{n}}}'] = {
+            'type': 'trend', 'values': {'avg': 1.0, 'med': 0.9, 'max': 9.0, 'p(95)': 3.0}}
+    return {'test_id': f'run-{i % 5}', 'timestamp': datetime(2024, 1, 1) + timedelta(hours=i), 'metrics': metrics}
+
+
+def point_stream(points):
+    lines = [json.dumps({'type': 'Metric', 'metric': 'http_req_duration', 'data': {'type': 'trend'}})]
+    lines += [json.dumps({'type': 'Point', 'metric': 'http_req_duration',
+                          'data': {'time': f'2024-01-01T00:{i // 6000 % 60:02d}:{i // 100 % 60:02d}.{i % 100:02d}Z',
+                                   'value': 10 + i % 50}})
+              for i in range(points)]
+    return gzip.compress('\n'.join(lines).encode())
+
+
+class Suite:
+    """Seeds both services and builds the benchmark cases"""
+
+    def __init__(self, notes, results):
+        self.notes_client = notes_app.app.test_client()
+        self.viewer_client = viewer.app.test_client()
+        self.notes = notes_app.get_collection()
+        self.results = viewer.get_results_collection()
+        self.notes.insert_many([make_note(i) for i in range(notes)])
+        self.results.insert_many([make_result(i, 100) for i in range(results)])
+        # Marks both services ready and materializes the viewer summaries
+        notes_app.warm_pool()
+        viewer.warm_pool()
+        self.note_id = str(self.notes.find_one({}, sort=[('_id', -1)])['_id'])
+        self.result_id = str(self.results.find_one({}, sort=[('_id', -1)])['_id'])
+        self.counter = 0
+
+    def fresh_note_id(self):
+        self.counter += 1
+        return str(self.notes.insert_one(make_note(10 ** 6 + self.counter)).inserted_id)
+
+    def route_cases(self):
+        """``(name, service, endpoint, prepare)``; ``prepare()`` returns test client kwargs"""
+        notes, viewer_ = 'notes-server', 'results-viewer'
+        summary = json.dumps({'metrics': make_result(0, 10)['metrics']})
+        stream = point_stream(2000)
+
+        def get(path, headers=None):
+            return lambda: dict(method='GET', path=path, headers={**AUTH, **(headers or {})})
+
+        return [
+            ('GET /health', notes, 'health', get('/health')),
+            ('GET /ready', notes, 'ready', get('/ready')),
+            ('GET /stats', notes, 'stats', get('/stats')),
+            ('GET /metrics', notes, 'metrics', get('/metrics')),
+            ('GET /notes', notes, 'get_notes', get('/notes?limit=100')),
+            ('GET /notes ndjson', notes, 'get_notes',
+             lambda: dict(method='GET', path='/notes?limit=100',
+                          headers={**AUTH, 'Accept': 'application/x-ndjson'})),
+            ('GET /notes/changes', notes, 'get_changes', get('/notes/changes?limit=100')),
+            ('GET /notes/search?prefix=', notes, 'search_notes', get('/notes/search?prefix=note%201&limit=50')),
+            ('GET /notes/<id>', notes, 'get_note', get(f'/notes/{self.note_id}')),
+            ('POST /notes', notes, 'create_note',
+             lambda: dict(method='POST', path='/notes', headers=AUTH,
+                          json={'title': 'bench', 'content': 'x' * 200})),
+            ('PUT /notes/<id>', notes, 'update_note',
+             lambda: dict(method='PUT', path=f'/notes/{self.note_id}', headers=AUTH,
+                          json={'title': 'updated', 'content': 'y' * 200})),
+            ('DELETE /notes/<id>', notes, 'delete_note',
+             lambda: dict(method='DELETE', path=f'/notes/{self.fresh_note_id()}', headers=AUTH)),
+            ('POST /notes/_bulk', notes, 'bulk_notes',
+             lambda: dict(method='POST', path='/notes/_bulk', headers=AUTH, json={'operations': [
+                 {'op': 'create', 'title': f'bulk {i}', 'content': 'z' * 100} for i in range(20)]})),
+            ('GET / (viewer)', viewer_, 'index', get('/')),
+            ('GET /ready (viewer)', viewer_, 'ready', get('/ready')),
+            ('GET /metrics (viewer)', viewer_, 'metrics', get('/metrics')),
+            ('GET /view/<id>', viewer_, 'view_result', get(f'/view/{self.result_id}')),
+            ('GET /download/<id>', viewer_, 'download_result', get(f'/download/{self.result_id}')),
+            ('GET /download/<id> gzip', viewer_, 'download_result',
+             get(f'/download/{self.result_id}', headers={'Accept-Encoding': 'gzip'})),
+            ('GET /api/results', viewer_, 'api_results', get('/api/results?limit=100')),
+            ('GET /trends', viewer_, 'trends_page', get('/trends')),
+            ('GET /api/trends', viewer_, 'api_trends', get('/api/trends')),
+            ('GET /api/retention', viewer_, 'api_retention', get('/api/retention')),
+            ('POST /api/results summary', viewer_, 'ingest_result',
+             lambda: dict(method='POST', path='/api/results?test_id=bench', data=summary)),
+            ('POST /api/results 2k points', viewer_, 'ingest_result',
+             lambda: dict(method='POST', path='/api/results?test_id=bench', data=stream)),
+        ]
+
+    # Requests that need server features mongomock does not implement
+    STAND_IN_GAPS = [
+        ('notes-server', 'get_notes', 'GET /notes?view=summary ($substrCP projection)'),
+        ('notes-server', 'search_notes', 'GET /notes/search?q= ($text search)'),
+        ('results-viewer', 'result_node', 'GET /api/results/<id>/node ($getField, $unsetField)'),
+    ]
+
+    def function_cases(self):
+        """``(name, fn)`` for the helpers benchmarked outside of a request"""
+        cases = []
+        for size in (1, 1000, 10000):
+            docs = [make_note(i) for i in range(size)]
+            docs = [{**doc, '_id': ObjectId()} for doc in docs]
+            cases.append((f'serialize_document x{size}',
+                          lambda docs=docs: [serializer.serialize_document(doc) for doc in docs]))
+        for extra in (10, 1000, 5000):
+            doc = make_result(0, extra)
+            stored = dict(doc, **{viewer.SUMMARY_FIELD: viewer.summarize_result(doc)})
+            cases.append((f'extract_metrics {extra} metrics', lambda doc=doc: viewer.extract_metrics(doc)))
+            cases.append((f'extract_metrics {extra} metrics (summary)',
+                          lambda doc=stored: viewer.extract_metrics(doc)))
+        return cases
+
+
+def missing_routes(cases):
+    covered = {(service, endpoint) for _, service, endpoint, _ in cases}
+    covered |= {(service, endpoint) for service, endpoint, _ in Suite.STAND_IN_GAPS}
+    missing = []
+    for service, flask_app in (('notes-server', notes_app.app), ('results-viewer', viewer.app)):
+        for rule in flask_app.url_map.iter_rules():
+            if rule.endpoint != 'static' and (service, rule.endpoint) not in covered:
+                missing.append(f'{service} {rule.rule} ({rule.endpoint})')
+    return missing
+
+
+def fingerprint():
+    """What the timings depend on besides the code"""
+    return {
+        'cpu': cpu_model(),
+        'cpus': os.cpu_count(),
+        'system': f'{platform.system()} {platform.machine()}',
+        'python': f'{platform.python_implementation()} {platform.python_version()}',
+        'mongomock': mongomock.__version__,
+    }
+
+
+def cpu_model():
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def measure(call, iterations, alloc_iterations, rounds):
+    """``{ops_per_s, p50_ms, p99_ms, spread_ms, alloc_kib}`` of ``call()``
+
+    The timed calls are made in ``rounds`` rounds; ``spread_ms`` is the
+    range of the rounds' p50s.
+    """
+    for _ in range(min(10, iterations)):
+        call()
+    latencies = []
+    round_p50s = []
+    for i in range(rounds):
+        times = [call() for _ in range(iterations * (i + 1) // rounds - iterations * i // rounds)]
+        if times:
+            round_p50s.append(percentile(sorted(times), 50))
+        latencies += times
+    latencies.sort()
+
+    allocations = []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_iterations):
+            allocations.append(call(trace=True))
+    finally:
+        tracemalloc.stop()
+    allocations.sort()
+    return {
+        'ops_per_s': round(len(latencies) / (sum(latencies) / 1000), 1),
+        'p50_ms': round(percentile(latencies, 50), 4),
+        'p99_ms': round(percentile(latencies, 99), 4),
+        'spread_ms': round(max(round_p50s) - min(round_p50s), 4),
+        'alloc_kib': round(percentile(allocations, 50), 2),
+    }
+
+
+def timed_call(fn):
+    def call(trace=False):
+        if trace:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn()
+            return (tracemalloc.get_traced_memory()[1] - before) / 1024
+        start = time.perf_counter()
+        fn()
+        return (time.perf_counter() - start) * 1000
+    return call
+
+
+def route_call(client, prepare, name):
+    def call(trace=False):
+        # The DELETE case inserts its note in prepare(); keep that out of the figures
+        kwargs = prepare()
+        if trace:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            response = client.open(**kwargs)
+            response.get_data()
+            result = (tracemalloc.get_traced_memory()[1] - before) / 1024
+        else:
+            start = time.perf_counter()
+            response = client.open(**kwargs)
+            response.get_data()
+            result = (time.perf_counter() - start) * 1000
+        if response.status_code >= 400:
+            raise RuntimeError(f'{name}: {response.status_code} {response.get_data(as_text=True)[:200]}')
+        return result
+    return call
+
+
+def timing_skipped(baseline, iterations):
+    """Why timings cannot be compared with ``baseline``, or None if they can"""
+    recorded = baseline.get('fingerprint')
+    if not recorded:
+        return 'baseline has no machine fingerprint'
+    current = fingerprint()
+    differences = [f'{key} {recorded.get(key)!r} -> {value!r}' for key, value in current.items()
+                   if recorded.get(key) != value]
+    if differences:
+        return 'baseline recorded on a different machine (' + ', '.join(differences) + ')'
+    if min(iterations, baseline.get('iterations', 0)) < MIN_TIMED_ITERATIONS:
+        return f'fewer than {MIN_TIMED_ITERATIONS} timed iterations'
+    return None
+
+
+def slower(before, current, tolerance):
+    """True if ``current``'s p50 is worse than ``before``'s beyond tolerance and noise"""
+    noise = max(before.get('spread_ms', 0), current['spread_ms'])
+    return current['p50_ms'] > before['p50_ms'] * (1 + tolerance) + noise
+
+
+def compare(results, baseline, tolerance, timings):
+    """Lines describing cases worse than ``baseline`` by more than ``tolerance``"""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get('cases', {}).get(name)
+        if before is None:
+            continue
+        if timings and slower(before, current, tolerance):
+            regressions.append(f"{name}: p50 {before['p50_ms']:.3f} -> {current['p50_ms']:.3f} ms "
+                               f"(noise {max(before.get('spread_ms', 0), current['spread_ms']):.3f} ms)")
+        if current['alloc_kib'] > before['alloc_kib'] * (1 + tolerance) + ALLOC_SLACK_KIB:
+            regressions.append(f"{name}: alloc {before['alloc_kib']:.1f} -> {current['alloc_kib']:.1f} KiB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=5, help='rounds the timed iterations are split into')
+    parser.add_argument('--alloc-iterations', type=int, default=20)
+    # mongomock scans and copies documents in Python: keep the data small so
+    # its cost does not drown the routes' own
+    parser.add_argument('--notes', type=int, default=200, help='notes seeded before the route cases')
+    parser.add_argument('--results', type=int, default=20, help='k6 results seeded before the route cases')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown, 0.25 = 25%%')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('-k', dest='only', help='only run cases whose name contains this')
+    args = parser.parse_args()
+
+    suite = Suite(args.notes, args.results)
+    route_cases = suite.route_cases()
+    missing = missing_routes(route_cases)
+    if missing:
+        print('Routes without a benchmark case:\n  ' + '\n  '.join(missing))
+        return 2
+
+    clients = {'notes-server': suite.notes_client, 'results-viewer': suite.viewer_client}
+    calls = [(name, route_call(clients[service], prepare, name)) for name, service, _, prepare in route_cases]
+    calls += [(name, timed_call(fn)) for name, fn in suite.function_cases()]
+
+    measured = {}
+    results = {}
+    print(f"{'case':<44} {'ops/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'alloc KiB':>10}")
+    for name, call in calls:
+        if args.only and args.only not in name:
+            continue
+        measured[name] = call
+        results[name] = stats = measure(call, args.iterations, args.alloc_iterations, args.rounds)
+        print(f"{name:<44} {stats['ops_per_s']:>10.1f} {stats['p50_ms']:>9.3f} {stats['p99_ms']:>9.3f} "
+              f"{stats['alloc_kib']:>10.1f}")
+    for _, _, path in Suite.STAND_IN_GAPS:
+        print(f'not benchmarked (mongomock lacks it): {path}')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'fingerprint': fingerprint(), 'iterations': args.iterations,
+                       'recorded': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+                       'cases': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline written to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print('No baseline to compare with; record one with --save-baseline')
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    skipped = timing_skipped(baseline, args.iterations)
+    if skipped:
+        print(f'Not comparing timings: {skipped}; comparing allocations only')
+    else:
+        # A slow p50 has to show again before it counts; keep the faster run
+        for name, before in baseline.get('cases', {}).items():
+            if name in results and slower(before, results[name], args.tolerance):
+                again = measure(measured[name], args.iterations, args.alloc_iterations, args.rounds)
+                if again['p50_ms'] < results[name]['p50_ms']:
+                    results[name] = again
+    regressions = compare(results, baseline, args.tolerance, timings=not skipped)
+    if regressions:
+        print(f'\nREGRESSIONS (tolerance {args.tolerance:.0%}):\n  ' + '\n  '.join(regressions))
+        return 1
+    print(f'\nNo regressions against {args.baseline}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
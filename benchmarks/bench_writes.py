@@ -0,0 +1,85 @@
+"""Compare read-after-write and single round trip note writes.
+
+Runs the write patterns notes-server used before (insert_one + find_one,
+update_one + find_one) next to the current ones (insert_one alone,
+find_one_and_update) and reports MongoDB commands and latency per write.
+It also drives POST/PUT /notes through the Flask test client to confirm
+the routes issue one command each.
+
+Needs a reachable MongoDB (MONGO_URL); uses the BENCH_DB_NAME database.
+
+    python benchmarks/bench_writes.py --iterations 2000
+"""
+import argparse
+import base64
+import os
+from datetime import datetime
+
+from pymongo import MongoClient, ReturnDocument, monitoring
+
+from harness import BENCH_DB_NAME, MONGO_URL, CommandCounter, load_service, percentile, timed
+
+
+def run_pattern(counter, name, fn, iterations):
+    counter.reset()
+    latencies = timed(fn, iterations)
+    print(f"{name:<34} {counter.total() / iterations:>8.2f} "
+          f"{percentile(latencies, 50):>9.3f} {percentile(latencies, 95):>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=1000)
+    args = parser.parse_args()
+
+    counter = CommandCounter()
+    monitoring.register(counter)
+
+    client = MongoClient(MONGO_URL)
+    collection = client[BENCH_DB_NAME]['notes']
+    collection.drop()
+    seed_id = collection.insert_one({'title': 'seed', 'content': '', 'created_at': datetime.utcnow(),
+                                     'updated_at': datetime.utcnow()}).inserted_id
+
+    def new_note():
+        now = datetime.utcnow()
+        return {'title': 'bench', 'content': 'x' * 200, 'created_at': now, 'updated_at': now}
+
+    def create_before():
+        result = collection.insert_one(new_note())
+        collection.find_one({'_id': result.inserted_id})
+
+    def create_after():
+        collection.insert_one(new_note())
+
+    def update_before():
+        collection.update_one({'_id': seed_id}, {'$set': {'title': 'u', 'updated_at': datetime.utcnow()}})
+        collection.find_one({'_id': seed_id})
+
+    def update_after():
+        collection.find_one_and_update({'_id': seed_id}, {'$set': {'title': 'u', 'updated_at': datetime.utcnow()}},
+                                       return_document=ReturnDocument.AFTER)
+
+    print(f"{'pattern':<34} {'cmds/op':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    run_pattern(counter, 'create: insert_one + find_one', create_before, args.iterations)
+    run_pattern(counter, 'create: insert_one', create_after, args.iterations)
+    run_pattern(counter, 'update: update_one + find_one', update_before, args.iterations)
+    run_pattern(counter, 'update: find_one_and_update', update_after, args.iterations)
+
+    os.environ['DB_NAME'] = BENCH_DB_NAME
+    notes_app = load_service('notes-server')
+    test_client = notes_app.app.test_client()
+    headers = {'Authorization': 'Basic ' + base64.b64encode(b'admin:password').decode()}
+    seed = str(seed_id)
+    run_pattern(counter, 'POST /notes (app)',
+                lambda: test_client.post('/notes', json={'title': 'bench'}, headers=headers),
+                args.iterations)
+    run_pattern(counter, 'PUT /notes/<id> (app)',
+                lambda: test_client.put(f'/notes/{seed}', json={'title': 'u'}, headers=headers),
+                args.iterations)
+
+    collection.drop()
+
+
+if __name__ == '__main__':
+    main()
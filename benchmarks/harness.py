@@ -0,0 +1,67 @@
+"""Helpers shared by the benchmark scripts"""
+import importlib.util
+import os
+import sys
+import time
+
+from pymongo import monitoring
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017/')
+BENCH_DB_NAME = os.getenv('BENCH_DB_NAME', 'notes_bench')
+
+
+def load_service(service, module='app'):
+    """Import ``<service>/<module>.py`` (service dirs are not packages)"""
+    service_dir = os.path.join(REPO_ROOT, service)
+    if service_dir not in sys.path:
+        sys.path.insert(0, service_dir)
+    name = f"{service.replace('-', '_')}_{module}"
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(service_dir, f'{module}.py'))
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts MongoDB commands by name"""
+
+    def __init__(self):
+        self.counts = {}
+
+    def reset(self):
+        self.counts = {}
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def started(self, event):
+        self.counts[event.command_name] = self.counts.get(event.command_name, 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def timed(fn, iterations):
+    """Call ``fn`` repeatedly and return per-call latencies in milliseconds"""
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return latencies
@@ -0,0 +1,269 @@
+"""Prometheus metrics shared by notes-server and results-viewer.
+
+Exposes, in the Prometheus text format served on ``/metrics``:
+
+- ``http_request_duration_seconds{route,method,status}``: request latency
+  histogram per route template (``/notes/<note_id>``, not the raw path)
+- ``http_requests_in_flight``: requests currently being handled
+- ``serialization_duration_seconds{kind}``: time spent encoding bodies
+- ``mongodb_command_duration_seconds{command,outcome}``: driver-reported
+  round trip per MongoDB command, from a pymongo CommandListener
+- ``mongodb_pool_checkout_wait_seconds{outcome}``: time a request waited
+  for a pooled connection, and ``mongodb_pool_connections_open`` /
+  ``mongodb_pool_connections_checked_out``, from a ConnectionPoolListener
+
+The hot path only reads ``time.perf_counter()`` and observes into a label
+child looked up in a plain dict, so ``labels()`` validation runs once per
+label combination instead of once per request.
+
+Under a pre-fork server every worker has its own counters. Set
+``PROMETHEUS_MULTIPROC_DIR`` (both gunicorn.conf.py files do) to have any
+worker answer ``/metrics`` with the sum over all workers.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess
+)
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (.00005, .0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25)
+
+# Route label for requests that matched no route, so unknown paths cannot
+# create unbounded label values
+UNMATCHED_ROUTE = '<unmatched>'
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time to handle a request, up to the response headers',
+    ['route', 'method', 'status'], buckets=LATENCY_BUCKETS)
+REQUESTS_IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'Requests currently being handled', multiprocess_mode='livesum')
+SERIALIZATION_LATENCY = Histogram(
+    'serialization_duration_seconds', 'Time spent encoding response bodies',
+    ['kind'], buckets=FAST_BUCKETS)
+MONGO_COMMAND_LATENCY = Histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command round trip as reported by the driver',
+    ['command', 'outcome'], buckets=LATENCY_BUCKETS)
+MONGO_COMMAND_ERRORS = Counter(
+    'mongodb_command_errors', 'MongoDB commands that failed', ['command'])
+MONGO_POOL_WAIT = Histogram(
+    'mongodb_pool_checkout_wait_seconds', 'Time spent waiting for a pooled MongoDB connection',
+    ['outcome'], buckets=LATENCY_BUCKETS)
+MONGO_POOL_OPEN = Gauge(
+    'mongodb_pool_connections_open', 'MongoDB connections open', multiprocess_mode='livesum')
+MONGO_POOL_CHECKED_OUT = Gauge(
+    'mongodb_pool_connections_checked_out', 'MongoDB connections in use', multiprocess_mode='livesum')
+
+_children = {}
+
+
+def _child(metric, labels):
+    key = (metric, labels)
+    child = _children.get(key)
+    if child is None:
+        child = _children[key] = metric.labels(*labels)
+    return child
+
+
+def observe_request(route, method, status, seconds):
+    _child(REQUEST_LATENCY, (route, method, str(status))).observe(seconds)
+
+
+def observe_serialization(kind, seconds):
+    _child(SERIALIZATION_LATENCY, (kind,)).observe(seconds)
+
+
+class serialization:
+    """``with serialization('page'):`` times the block as one serialization"""
+    __slots__ = ('kind', 'started')
+
+    def __init__(self, kind):
+        self.kind = kind
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        observe_serialization(self.kind, time.perf_counter() - self.started)
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Records every MongoDB command's duration; pass it in ``event_listeners``"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        _child(MONGO_COMMAND_LATENCY, (event.command_name, 'success')).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        _child(MONGO_COMMAND_LATENCY, (event.command_name, 'failure')).observe(event.duration_micros / 1e6)
+        _child(MONGO_COMMAND_ERRORS, (event.command_name,)).inc()
+
+
+command_timer = CommandTimer()
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Connection checkout waits and pool occupancy; pass it in ``event_listeners``.
+
+    pymongo checks a connection out on the thread running the operation
+    (Motor's included), so the wait is timed from a thread-local start.
+    ``snapshot()`` gives this process's totals for /stats.
+    """
+
+    def __init__(self, samples=1000):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.failures = {}
+        self.open = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self._waits = deque(maxlen=samples)
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def _waited(self):
+        started = getattr(self._local, 'started', None)
+        self._local.started = None
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_checked_out(self, event):
+        wait = self._waited()
+        _child(MONGO_POOL_WAIT, ('success',)).observe(wait)
+        MONGO_POOL_CHECKED_OUT.inc()
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self._waits.append(wait)
+
+    def connection_check_out_failed(self, event):
+        _child(MONGO_POOL_WAIT, (event.reason,)).observe(self._waited())
+        with self._lock:
+            self.failures[event.reason] = self.failures.get(event.reason, 0) + 1
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.dec()
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        MONGO_POOL_OPEN.inc()
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        MONGO_POOL_OPEN.dec()
+        with self._lock:
+            self.open -= 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def snapshot(self):
+        """Totals and recent checkout waits, to size pools against concurrency"""
+        with self._lock:
+            waits = sorted(self._waits)
+            stats = {
+                'open': self.open,
+                'checked_out': self.checked_out,
+                'max_checked_out': self.max_checked_out,
+                'checkouts': self.checkouts,
+                'checkout_failures': dict(self.failures),
+            }
+        for pct in (50, 95, 99):
+            index = min(len(waits) - 1, int(len(waits) * pct / 100))
+            stats[f'wait_ms_p{pct}'] = round(waits[index] * 1000, 3) if waits else 0.0
+        stats['wait_ms_max'] = round(waits[-1] * 1000, 3) if waits else 0.0
+        return stats
+
+
+pool_monitor = PoolMonitor()
+
+
+def render():
+    """``(body, content type)`` of the current metrics"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def instrument_flask(app):
+    """Time every request of a Flask app and serve ``GET /metrics``"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('_metrics_started', None)
+        if started is not None:
+            REQUESTS_IN_FLIGHT.dec()
+            rule = request.url_rule
+            observe_request(rule.rule if rule is not None else UNMATCHED_ROUTE,
+                            request.method, response.status_code, time.perf_counter() - started)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus metrics (no auth required)"""
+        body, content_type = render()
+        return Response(body, content_type=content_type)
+
+    return app
+
+
+class ASGIMetricsMiddleware:
+    """Starlette counterpart of instrument_flask, as a pure ASGI middleware.
+
+    The route label comes from the endpoint Starlette's router stores in
+    the scope, so it reads ``/notes/{note_id}``-style templates.
+    """
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.route_paths = {route.endpoint: route.path for route in routes}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                observe_request(self.route_paths.get(scope.get('endpoint'), UNMATCHED_ROUTE),
+                                scope['method'], message['status'], time.perf_counter() - started)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
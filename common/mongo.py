@@ -0,0 +1,68 @@
+"""MongoDB client settings shared by notes-server and results-viewer.
+
+Both services build their per-process client with ``client_options()``,
+so the same environment variables tune either one. Each is passed to the
+client only when it is set; otherwise the option in ``MONGO_URL``'s query
+string, or pymongo's default, applies:
+
+- ``MONGO_COMPRESSORS``: wire compressors to offer, in order of preference,
+  e.g. ``zstd,snappy,zlib`` (default: none). The server uses the first one
+  it also supports. zstd needs the ``zstandard`` package and snappy
+  ``python-snappy``; compressors whose package is missing are left out
+- ``MONGO_ZLIB_LEVEL``: zlib level, -1 to 9
+- ``MONGO_MAX_POOL_SIZE`` / ``MONGO_MIN_POOL_SIZE``: connections per
+  process; the minimum (default 1) is also what warm-up opens before /ready
+- ``MONGO_MAX_IDLE_TIME_MS``: close pooled connections idle this long
+- ``MONGO_WAIT_QUEUE_TIMEOUT_MS``: fail an operation that waited this long
+  for a pooled connection instead of queueing forever
+- ``MONGO_SERVER_SELECTION_TIMEOUT_MS`` / ``MONGO_CONNECT_TIMEOUT_MS``
+
+Checkout waits and pool occupancy are recorded by ``metrics.pool_monitor``.
+"""
+import importlib.util
+import os
+
+from metrics import command_timer, pool_monitor
+
+# Package pymongo needs for each wire compressor (zlib is in the stdlib)
+COMPRESSOR_PACKAGES = {'zstd': 'zstandard', 'snappy': 'snappy', 'zlib': None}
+
+# MongoClient options taken from the environment: variable -> keyword
+CLIENT_OPTION_VARIABLES = {
+    'MONGO_MAX_POOL_SIZE': 'maxPoolSize',
+    'MONGO_MIN_POOL_SIZE': 'minPoolSize',
+    'MONGO_MAX_IDLE_TIME_MS': 'maxIdleTimeMS',
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': 'waitQueueTimeoutMS',
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': 'serverSelectionTimeoutMS',
+    'MONGO_CONNECT_TIMEOUT_MS': 'connectTimeoutMS'
+}
+
+MONGO_COMPRESSORS = os.getenv('MONGO_COMPRESSORS', '')
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 1))
+
+
+def available_compressors(names=MONGO_COMPRESSORS):
+    """The compressors in ``names`` (comma-separated) that can be used here"""
+    compressors = []
+    for name in (name.strip().lower() for name in names.split(',')):
+        if name not in COMPRESSOR_PACKAGES:
+            if name:
+                raise ValueError(f'Unknown MongoDB compressor: {name}')
+            continue
+        package = COMPRESSOR_PACKAGES[name]
+        if package is None or importlib.util.find_spec(package) is not None:
+            compressors.append(name)
+    return compressors
+
+
+def client_options(environ=os.environ):
+    """Keyword arguments for a service's MongoClient or Motor client"""
+    options = {keyword: int(environ[variable]) for variable, keyword in CLIENT_OPTION_VARIABLES.items()
+               if environ.get(variable, '') != ''}
+    options['event_listeners'] = [command_timer, pool_monitor]
+    compressors = available_compressors(environ.get('MONGO_COMPRESSORS', MONGO_COMPRESSORS))
+    if compressors:
+        options['compressors'] = ','.join(compressors)
+        if 'zlib' in compressors and environ.get('MONGO_ZLIB_LEVEL', '') != '':
+            options['zlibCompressionLevel'] = int(environ['MONGO_ZLIB_LEVEL'])
+    return options
@@ -1,96 +1,135 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_httpauth import HTTPBasicAuth
-from pymongo import MongoClient
-from pymongo.errors import PyMongoError
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
 import os
-import json
+import threading
 from bson import ObjectId
 from bson.errors import InvalidId
-from datetime import datetime
+from serializer import dumps_page
+from group_commit import GroupCommitter
+from notes import (
+    MONGO_URL, DB_NAME, COLLECTION_NAME, TOMBSTONE_COLLECTION_NAME, INDEXES, ttl_index_update,
+    NDJSON_MIMETYPE, STREAM_BATCH_SIZE, mongo_client_options,
+    note_cache, check_credentials, utc_now, content_error, build_note, build_note_update,
+    cache_note, cache_entry_current, CACHE_REVALIDATE, CACHE_VERSION_PROJECTION,
+    NOTE_PROJECTION, parse_page_args, parse_projection, wants_streaming,
+    NoteStreamWriter, parse_bulk_operations, BulkPlan, parse_change_token,
+    changes_queries, merge_changes, tombstone_requests, tombstone_expired,
+    TITLE_KEY_FIELD, parse_search_args, prefix_search_query, text_search_pipeline, search_page,
+    GROUP_COMMIT, GROUP_COMMIT_WINDOW, GROUP_COMMIT_MAX_BATCH
+)
+from metrics import instrument_flask, pool_monitor, serialization
+from mongo import MONGO_MIN_POOL_SIZE
 
 app = Flask(__name__)
 auth = HTTPBasicAuth()
+# Request latency/in-flight metrics and GET /metrics
+instrument_flask(app)
 
-# Custom JSON encoder to handle ObjectId and datetime
-class JSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
-
-app.json_encoder = JSONEncoder
-
-# MongoDB connection
-MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017/')
-DB_NAME = os.getenv('DB_NAME', 'notes_db')
-COLLECTION_NAME = 'notes'
-
-try:
-    client = MongoClient(MONGO_URL)
-    db = client[DB_NAME]
-    notes_collection = db[COLLECTION_NAME]
-    # Ensure collection exists by creating an index
-    notes_collection.create_index('title')
-except PyMongoError as e:
-    print(f"Warning: Could not connect to MongoDB: {e}")
-    notes_collection = None
-
-# Basic Auth credentials (in production, use environment variables)
-users = {
-    os.getenv('API_USER', 'admin'): os.getenv('API_PASSWORD', 'password')
-}
+# The MongoDB client is created lazily, once per process. A client must not
+# be shared across fork(), so pre-fork servers (gunicorn) get a fresh one in
+# every worker; see get_collection().
+notes_collection = None
+collection_pid = None
+collection_lock = threading.Lock()
+
+# Set once this process has opened MONGO_MIN_POOL_SIZE connections
+pool_ready = threading.Event()
+pool_warmup_thread = None
 
 @auth.verify_password
 def verify_password(username, password):
-    if username in users and users[username] == password:
-        return username
-    return None
+    return check_credentials(username, password)
 
 def get_collection():
-    """Get or create the collection"""
-    global notes_collection
-    if notes_collection is None:
-        try:
-            client = MongoClient(MONGO_URL)
-            db = client[DB_NAME]
-            notes_collection = db[COLLECTION_NAME]
-            notes_collection.create_index('title')
-        except PyMongoError as e:
-            raise Exception(f"Database connection failed: {e}")
+    """Get the collection, creating this process's MongoDB client on first use"""
+    global notes_collection, collection_pid
+    pid = os.getpid()
+    if notes_collection is None or collection_pid != pid:
+        with collection_lock:
+            if notes_collection is None or collection_pid != pid:
+                try:
+                    client = MongoClient(MONGO_URL, **mongo_client_options())
+                    db = client[DB_NAME]
+                    collection = db[COLLECTION_NAME]
+                    # Ensure collections exist by creating their indexes
+                    for name, keys, options in INDEXES:
+                        try:
+                            db[name].create_index(keys, **options)
+                        except OperationFailure as e:
+                            # A changed TTL is applied to the existing index
+                            command = ttl_index_update(name, keys, options, e)
+                            if command is None:
+                                raise
+                            db.command(command)
+                except PyMongoError as e:
+                    raise Exception(f"Database connection failed: {e}")
+                notes_collection = collection
+                collection_pid = pid
+                pool_ready.clear()
     return notes_collection
 
+# Merges concurrent creates into one insert_many (NOTES_GROUP_COMMIT=1)
+group_committer = (GroupCommitter(get_collection, GROUP_COMMIT_WINDOW, GROUP_COMMIT_MAX_BATCH)
+                   if GROUP_COMMIT else None)
+
+def get_tombstones():
+    """Collection recording deleted note ids for the change feed"""
+    return get_collection().database[TOMBSTONE_COLLECTION_NAME]
+
+def warm_pool():
+    """Open MONGO_MIN_POOL_SIZE connections by running that many pings at once"""
+    try:
+        db = get_collection().database
+        threads = [threading.Thread(target=db.command, args=('ping',))
+                   for _ in range(max(1, MONGO_MIN_POOL_SIZE))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        db.command('ping')
+        pool_ready.set()
+    except Exception as e:
+        print(f"Warning: Could not warm MongoDB pool: {e}")
+
+def start_pool_warmup():
+    """Warm this process's pool in the background (no-op if done or running)"""
+    global pool_warmup_thread
+    if pool_ready.is_set() and collection_pid == os.getpid():
+        return
+    if pool_warmup_thread is not None and pool_warmup_thread.is_alive():
+        return
+    pool_warmup_thread = threading.Thread(target=warm_pool, daemon=True)
+    pool_warmup_thread.start()
 
-def serialize_document(doc):
-    """Convert MongoDB document to JSON-serializable format"""
-    if doc is None:
-        return None
-    
-    if isinstance(doc, dict):
-        result = {}
-        for key, value in doc.items():
-            if key == '_id':
-                result['id'] = str(value)
-            elif isinstance(value, ObjectId):
-                result[key] = str(value)
-            elif isinstance(value, datetime):
-                result[key] = value.isoformat()
-            elif isinstance(value, dict):
-                result[key] = serialize_document(value)
-            elif isinstance(value, list):
-                result[key] = [serialize_document(item) for item in value]
-            else:
-                result[key] = value
-        return result
-    elif isinstance(doc, list):
-        return [serialize_document(item) for item in doc]
-    elif isinstance(doc, ObjectId):
-        return str(doc)
-    elif isinstance(doc, datetime):
-        return doc.isoformat()
-    else:
-        return doc
+
+def note_response(entry, status=200):
+    """Build a note response with ETag/Last-Modified, honoring conditional GETs"""
+    response = Response(entry['body'], status=status, mimetype='application/json')
+    if entry['etag']:
+        response.set_etag(entry['etag'])
+    if entry['last_modified']:
+        response.last_modified = entry['last_modified']
+    if request.method == 'GET':
+        response = response.make_conditional(request)
+    return response
+
+def stream_notes(cursor, limit, ndjson):
+    """Yield a note listing chunk by chunk while iterating the cursor"""
+    writer = NoteStreamWriter(limit, ndjson)
+    try:
+        for note in cursor:
+            if not writer.add(note):
+                break
+            chunk = writer.flush()
+            if chunk:
+                yield chunk
+        chunk = writer.finish()
+        if chunk:
+            yield chunk
+    finally:
+        cursor.close()
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -102,15 +141,126 @@ def health():
     except Exception as e:
         return jsonify({'status': 'unhealthy', 'error': str(e)}), 503
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness check (no auth required): 200 once this worker's pool is warm"""
+    if pool_ready.is_set() and collection_pid == os.getpid():
+        return jsonify({'status': 'ready', 'pid': os.getpid()}), 200
+    start_pool_warmup()
+    return jsonify({'status': 'warming', 'pid': os.getpid()}), 503
+
+@app.route('/stats', methods=['GET'])
+@auth.login_required
+def stats():
+    """In-process counters (cache, MongoDB pool, group commit) for capacity sizing"""
+    stats = {'cache': note_cache.stats(), 'mongo_pool': pool_monitor.snapshot()}
+    if group_committer is not None:
+        stats['group_commit'] = group_committer.stats.snapshot()
+    return jsonify(stats), 200
+
 @app.route('/notes', methods=['GET'])
 @auth.login_required
 def get_notes():
-    """Get all notes"""
+    """Get a page of notes ordered by ID (``?limit=&after=``)
+
+    ``Accept: application/x-ndjson`` or ``?stream=1`` switch to a streamed
+    response that reads the cursor in batches instead of building the
+    whole page in memory; ``limit`` is optional in those modes.
+    """
     try:
+        ndjson = request.accept_mimetypes.best_match(
+            ['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+        streaming = wants_streaming(request.args, ndjson)
+        try:
+            if streaming:
+                limit, after = parse_page_args(request.args, default=None, maximum=None)
+            else:
+                limit, after = parse_page_args(request.args)
+            projection = parse_projection(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
         collection = get_collection()
-        notes = list(collection.find({}))
-        serialized_notes = [serialize_document(note) for note in notes]
-        return jsonify(serialized_notes), 200
+        query = {'_id': {'$gt': after}} if after else {}
+
+        if streaming:
+            cursor = collection.find(query, projection).sort('_id', 1).batch_size(STREAM_BATCH_SIZE)
+            if limit is not None:
+                cursor = cursor.limit(limit + 1)
+            return Response(
+                stream_notes(cursor, limit, ndjson),
+                mimetype=NDJSON_MIMETYPE if ndjson else 'application/json'
+            )
+
+        # Fetch one extra document to know whether another page exists
+        notes = list(collection.find(query, projection).sort('_id', 1).limit(limit + 1))
+        has_more = len(notes) > limit
+        notes = notes[:limit]
+
+        with serialization('page'):
+            body = dumps_page(notes, str(notes[-1]['_id']) if has_more else None)
+        return Response(body, status=200, mimetype='application/json')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/notes/changes', methods=['GET'])
+@auth.login_required
+def get_changes():
+    """Notes created, updated or deleted after a sync token (``?since=&limit=``)
+
+    Without ``since`` the feed starts at the beginning. Returns changed
+    notes, deleted ids and the token for the next call. Answers 410 when
+    the token is older than the tombstone retention and the client has to
+    resync from GET /notes.
+    """
+    try:
+        try:
+            limit, _ = parse_page_args(request.args)
+            since = request.args.get('since')
+            position = parse_change_token(since) if since else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        now = utc_now()
+        if tombstone_expired(position, now):
+            return jsonify({'error': 'Sync token expired, resync required'}), 410
+
+        notes_query, tombstones_query = changes_queries(position, now)
+        notes = list(get_collection().find(notes_query, NOTE_PROJECTION)
+                     .sort([('updated_at', 1), ('_id', 1)]).limit(limit + 1))
+        tombstones = list(get_tombstones().find(tombstones_query)
+                          .sort([('deleted_at', 1), ('_id', 1)]).limit(limit + 1))
+        return jsonify(merge_changes(notes, tombstones, limit, position, now)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/notes/search', methods=['GET'])
+@auth.login_required
+def search_notes():
+    """Search notes by text (``?q=``) or title prefix (``?prefix=``)
+
+    ``q`` uses the text index on title and content and ranks by relevance.
+    ``prefix`` matches the start of the title, ignoring case, in title
+    order. Both page with ``limit``/``after`` like GET /notes and return
+    the same ``{"notes": [...], "next": ...}`` envelope.
+    """
+    try:
+        try:
+            mode, term, limit, after = parse_search_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        collection = get_collection()
+        if mode == 'text':
+            docs = list(collection.aggregate(text_search_pipeline(term, after, limit)))
+        else:
+            docs = list(collection.find(prefix_search_query(term, after), NOTE_PROJECTION)
+                        .sort([(TITLE_KEY_FIELD, 1), ('_id', 1)]).limit(limit + 1))
+
+        notes, next_cursor = search_page(docs, limit, mode)
+        with serialization('page'):
+            body = dumps_page(notes, next_cursor)
+        return Response(body, status=200, mimetype='application/json')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -119,16 +269,26 @@ def get_notes():
 def get_note(note_id):
     """Get a specific note by ID"""
     try:
-        collection = get_collection()
         try:
-            note = collection.find_one({'_id': ObjectId(note_id)})
+            note_id = str(ObjectId(note_id))
         except InvalidId:
             return jsonify({'error': 'Invalid note ID'}), 400
+
+        collection = get_collection()
+        entry = note_cache.get(note_id)
+        if entry is not None and CACHE_REVALIDATE:
+            # The note may have changed through another worker
+            stored = collection.find_one({'_id': ObjectId(note_id)}, CACHE_VERSION_PROJECTION)
+            if not cache_entry_current(entry, stored):
+                note_cache.invalidate(note_id)
+                entry = None
+        if entry is None:
+            note = collection.find_one({'_id': ObjectId(note_id)}, NOTE_PROJECTION)
+            if not note:
+                return jsonify({'error': 'Note not found'}), 404
+            entry = cache_note(note)
         
-        if not note:
-            return jsonify({'error': 'Note not found'}), 404
-        
-        return jsonify(serialize_document(note)), 200
+        return note_response(entry)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -140,21 +300,21 @@ def create_note():
         data = request.get_json()
         if not data or 'title' not in data:
             return jsonify({'error': 'Title is required'}), 400
+        message = content_error(data)
+        if message:
+            return jsonify({'error': message}), 400
         
         collection = get_collection()
-        now = datetime.utcnow()
-        note = {
-            'title': data['title'],
-            'content': data.get('content', ''),
-            'created_at': now,
-            'updated_at': now
-        }
+        note = build_note(data, utc_now())
         
-        result = collection.insert_one(note)
-        # Fetch the inserted document to get the _id
-        inserted_note = collection.find_one({'_id': result.inserted_id})
+        # insert_one/insert_many set note['_id'], so the document can be echoed back as is
+        if group_committer is not None:
+            group_committer.insert(note)
+        else:
+            collection.insert_one(note)
         
-        return jsonify(serialize_document(inserted_note)), 201
+        # Clients typically read a note right after creating it
+        return note_response(cache_note(note), status=201)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -166,28 +326,27 @@ def update_note(note_id):
         data = request.get_json()
         if not data:
             return jsonify({'error': 'Request body is required'}), 400
+        message = content_error(data)
+        if message:
+            return jsonify({'error': message}), 400
         
         collection = get_collection()
         try:
-            update_data = {'updated_at': datetime.utcnow()}
-            if 'title' in data:
-                update_data['title'] = data['title']
-            if 'content' in data:
-                update_data['content'] = data['content']
-            
-            result = collection.update_one(
+            note = collection.find_one_and_update(
                 {'_id': ObjectId(note_id)},
-                {'$set': update_data}
+                build_note_update(data, utc_now()),
+                projection=NOTE_PROJECTION,
+                return_document=ReturnDocument.AFTER
             )
         except InvalidId:
             return jsonify({'error': 'Invalid note ID'}), 400
         
-        if result.matched_count == 0:
+        if note is None:
+            note_cache.invalidate(str(ObjectId(note_id)))
             return jsonify({'error': 'Note not found'}), 404
         
-        note = collection.find_one({'_id': ObjectId(note_id)})
-        
-        return jsonify(serialize_document(note)), 200
+        # Replaces any cached copy of the note
+        return note_response(cache_note(note))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -198,17 +357,67 @@ def delete_note(note_id):
     try:
         collection = get_collection()
         try:
-            result = collection.delete_one({'_id': ObjectId(note_id)})
+            note_oid = ObjectId(note_id)
         except InvalidId:
             return jsonify({'error': 'Invalid note ID'}), 400
+
+        result = collection.delete_one({'_id': note_oid})
+        note_cache.invalidate(str(note_oid))
         
         if result.deleted_count == 0:
             return jsonify({'error': 'Note not found'}), 404
+
+        get_tombstones().bulk_write(tombstone_requests([note_oid], utc_now()))
         
         return jsonify({'message': 'Note deleted successfully'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/notes/_bulk', methods=['POST'])
+@auth.login_required
+def bulk_notes():
+    """Apply a batch of create/update/delete operations in one bulk write
+
+    Body: ``{"operations": [{"op": "create", "title": ..., "content": ...},
+    {"op": "update", "id": ..., "title": ...}, {"op": "delete", "id": ...}]}``.
+    Operations run unordered, so one failure does not stop the rest. The
+    response lists one result per operation, in request order, each with
+    the HTTP status the single-note route would have returned.
+    """
+    try:
+        try:
+            operations = parse_bulk_operations(request.get_json())
+        except ValueError as e:
+            message, status = e.args
+            return jsonify({'error': message}), status
+
+        plan = BulkPlan(operations, utc_now())
+        collection = get_collection()
+
+        target_ids = plan.target_ids()
+        existing = set()
+        if target_ids:
+            existing = {doc['_id'] for doc in collection.find({'_id': {'$in': target_ids}}, {'_id': 1})}
+        requests = plan.requests(existing)
+
+        write_errors = []
+        if requests:
+            try:
+                collection.bulk_write(requests, ordered=False)
+            except BulkWriteError as e:
+                write_errors = e.details.get('writeErrors', [])
+        for note_id in plan.modified_ids():
+            note_cache.invalidate(note_id)
+        deleted_ids = plan.deleted_ids(write_errors)
+        if deleted_ids:
+            get_tombstones().bulk_write(tombstone_requests(deleted_ids, utc_now()), ordered=False)
+
+        return jsonify(plan.finish(write_errors)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
+    # Development server; use gunicorn (see gunicorn.conf.py) in production
+    start_pool_warmup()
     app.run(host='0.0.0.0', port=5000, debug=True)
 
@@ -0,0 +1,426 @@
+"""Asyncio entry point for the Notes API.
+
+Serves the same routes, payloads and basic auth as app.py, but runs on an
+ASGI server with the Motor driver, so a request waiting on MongoDB does not
+hold a thread. Run it with e.g.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000 --workers 4
+
+Each worker process creates its own Motor client on startup and reports
+ready on /ready once MONGO_MIN_POOL_SIZE connections are open.
+"""
+import asyncio
+import base64
+import binascii
+import contextlib
+import os
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, OperationFailure
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.http import http_date, parse_accept_header
+from werkzeug.datastructures import MIMEAccept
+
+from serializer import dumps_page
+from group_commit import AsyncGroupCommitter
+
+from notes import (
+    MONGO_URL, DB_NAME, COLLECTION_NAME, TOMBSTONE_COLLECTION_NAME, INDEXES, ttl_index_update,
+    NDJSON_MIMETYPE, STREAM_BATCH_SIZE, mongo_client_options,
+    note_cache, check_credentials, utc_now, content_error, build_note, build_note_update,
+    cache_note, cache_entry_current, CACHE_REVALIDATE, CACHE_VERSION_PROJECTION,
+    NOTE_PROJECTION, parse_page_args, parse_projection, wants_streaming,
+    NoteStreamWriter, parse_bulk_operations, BulkPlan, parse_change_token,
+    changes_queries, merge_changes, tombstone_requests, tombstone_expired,
+    TITLE_KEY_FIELD, parse_search_args, prefix_search_query, text_search_pipeline, search_page,
+    GROUP_COMMIT, GROUP_COMMIT_WINDOW, GROUP_COMMIT_MAX_BATCH
+)
+from metrics import ASGIMetricsMiddleware, pool_monitor, render as render_metrics, serialization
+from mongo import MONGO_MIN_POOL_SIZE
+
+state = {'collection': None, 'pool_ready': False}
+
+
+def get_collection():
+    return state['collection']
+
+
+# Merges concurrent creates into one insert_many (NOTES_GROUP_COMMIT=1)
+group_committer = (AsyncGroupCommitter(get_collection, GROUP_COMMIT_WINDOW, GROUP_COMMIT_MAX_BATCH)
+                   if GROUP_COMMIT else None)
+
+
+def get_tombstones():
+    return state['collection'].database[TOMBSTONE_COLLECTION_NAME]
+
+
+def error(message, status):
+    return JSONResponse({'error': message}, status_code=status)
+
+
+def login_required(handler):
+    """HTTP basic auth with the same credentials and 401 response as Flask-HTTPAuth"""
+    async def wrapper(request):
+        username = password = None
+        scheme, _, encoded = request.headers.get('authorization', '').partition(' ')
+        if scheme.lower() == 'basic':
+            try:
+                username, _, password = base64.b64decode(encoded).decode('utf-8').partition(':')
+            except (binascii.Error, UnicodeDecodeError):
+                pass
+        if not check_credentials(username, password):
+            return Response('Unauthorized Access', status_code=401,
+                            headers={'WWW-Authenticate': 'Basic realm="Authentication Required"'})
+        return await handler(request)
+    return wrapper
+
+
+def note_response(request, entry, status=200):
+    """Note response with ETag/Last-Modified, answering If-None-Match with 304"""
+    headers = {}
+    if entry['etag']:
+        headers['ETag'] = f'"{entry["etag"]}"'
+    if entry['last_modified']:
+        headers['Last-Modified'] = http_date(entry['last_modified'])
+    if request.method == 'GET' and entry['etag']:
+        if_none_match = request.headers.get('if-none-match', '')
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        if headers['ETag'] in tags or '*' in tags:
+            return Response(status_code=304, headers=headers)
+    return Response(entry['body'], status_code=status, media_type='application/json', headers=headers)
+
+
+async def stream_notes(cursor, limit, ndjson):
+    """Yield a note listing chunk by chunk while iterating the cursor"""
+    writer = NoteStreamWriter(limit, ndjson)
+    try:
+        async for note in cursor:
+            if not writer.add(note):
+                break
+            chunk = writer.flush()
+            if chunk:
+                yield chunk
+        chunk = writer.finish()
+        if chunk:
+            yield chunk
+    finally:
+        await cursor.close()
+
+
+async def health(request):
+    """Health check endpoint (no auth required)"""
+    try:
+        await get_collection().find_one()
+        return JSONResponse({'status': 'healthy', 'database': 'connected'})
+    except Exception as e:
+        return JSONResponse({'status': 'unhealthy', 'error': str(e)}, status_code=503)
+
+
+async def ready(request):
+    """Readiness check (no auth required): 200 once this worker's pool is warm"""
+    if state['pool_ready']:
+        return JSONResponse({'status': 'ready', 'pid': os.getpid()})
+    return JSONResponse({'status': 'warming', 'pid': os.getpid()}, status_code=503)
+
+
+async def metrics(request):
+    """Prometheus metrics (no auth required)"""
+    body, content_type = render_metrics()
+    return Response(body, headers={'Content-Type': content_type})
+
+
+@login_required
+async def stats(request):
+    """In-process counters (cache, MongoDB pool, group commit) for capacity sizing"""
+    stats = {'cache': note_cache.stats(), 'mongo_pool': pool_monitor.snapshot()}
+    if group_committer is not None:
+        stats['group_commit'] = group_committer.stats.snapshot()
+    return JSONResponse(stats)
+
+
+@login_required
+async def get_notes(request):
+    """Get a page of notes ordered by ID (``?limit=&after=``)"""
+    try:
+        accept = parse_accept_header(request.headers.get('accept'), MIMEAccept)
+        ndjson = accept.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+        streaming = wants_streaming(request.query_params, ndjson)
+        try:
+            if streaming:
+                limit, after = parse_page_args(request.query_params, default=None, maximum=None)
+            else:
+                limit, after = parse_page_args(request.query_params)
+            projection = parse_projection(request.query_params)
+        except ValueError as e:
+            return error(str(e), 400)
+
+        collection = get_collection()
+        query = {'_id': {'$gt': after}} if after else {}
+
+        if streaming:
+            cursor = collection.find(query, projection).sort('_id', 1).batch_size(STREAM_BATCH_SIZE)
+            if limit is not None:
+                cursor = cursor.limit(limit + 1)
+            return StreamingResponse(stream_notes(cursor, limit, ndjson),
+                                     media_type=NDJSON_MIMETYPE if ndjson else 'application/json')
+
+        # Fetch one extra document to know whether another page exists
+        notes = await collection.find(query, projection).sort('_id', 1).limit(limit + 1).to_list(length=None)
+        has_more = len(notes) > limit
+        notes = notes[:limit]
+
+        with serialization('page'):
+            body = dumps_page(notes, str(notes[-1]['_id']) if has_more else None)
+        return Response(body, media_type='application/json')
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@login_required
+async def get_changes(request):
+    """Notes created, updated or deleted after a sync token (``?since=&limit=``)"""
+    try:
+        try:
+            limit, _ = parse_page_args(request.query_params)
+            since = request.query_params.get('since')
+            position = parse_change_token(since) if since else None
+        except ValueError as e:
+            return error(str(e), 400)
+
+        now = utc_now()
+        if tombstone_expired(position, now):
+            return error('Sync token expired, resync required', 410)
+
+        notes_query, tombstones_query = changes_queries(position, now)
+        notes, tombstones = await asyncio.gather(
+            get_collection().find(notes_query, NOTE_PROJECTION)
+            .sort([('updated_at', 1), ('_id', 1)]).limit(limit + 1).to_list(length=None),
+            get_tombstones().find(tombstones_query)
+            .sort([('deleted_at', 1), ('_id', 1)]).limit(limit + 1).to_list(length=None),
+        )
+        return JSONResponse(merge_changes(notes, tombstones, limit, position, now))
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@login_required
+async def search_notes(request):
+    """Search notes by text (``?q=``) or title prefix (``?prefix=``)"""
+    try:
+        try:
+            mode, term, limit, after = parse_search_args(request.query_params)
+        except ValueError as e:
+            return error(str(e), 400)
+
+        collection = get_collection()
+        if mode == 'text':
+            cursor = collection.aggregate(text_search_pipeline(term, after, limit))
+        else:
+            cursor = (collection.find(prefix_search_query(term, after), NOTE_PROJECTION)
+                      .sort([(TITLE_KEY_FIELD, 1), ('_id', 1)]).limit(limit + 1))
+        docs = await cursor.to_list(length=None)
+
+        notes, next_cursor = search_page(docs, limit, mode)
+        with serialization('page'):
+            body = dumps_page(notes, next_cursor)
+        return Response(body, media_type='application/json')
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@login_required
+async def create_note(request):
+    """Create a new note"""
+    try:
+        data = await request.json()
+        if not data or 'title' not in data:
+            return error('Title is required', 400)
+        message = content_error(data)
+        if message:
+            return error(message, 400)
+
+        note = build_note(data, utc_now())
+        if group_committer is not None:
+            await group_committer.insert(note)
+        else:
+            await get_collection().insert_one(note)
+        return note_response(request, cache_note(note), status=201)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@login_required
+async def get_note(request):
+    """Get a specific note by ID"""
+    try:
+        try:
+            note_id = str(ObjectId(request.path_params['note_id']))
+        except InvalidId:
+            return error('Invalid note ID', 400)
+
+        entry = note_cache.get(note_id)
+        if entry is not None and CACHE_REVALIDATE:
+            # The note may have changed through another worker
+            stored = await get_collection().find_one({'_id': ObjectId(note_id)}, CACHE_VERSION_PROJECTION)
+            if not cache_entry_current(entry, stored):
+                note_cache.invalidate(note_id)
+                entry = None
+        if entry is None:
+            note = await get_collection().find_one({'_id': ObjectId(note_id)}, NOTE_PROJECTION)
+            if not note:
+                return error('Note not found', 404)
+            entry = cache_note(note)
+
+        return note_response(request, entry)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@login_required
+async def update_note(request):
+    """Update an existing note"""
+    try:
+        data = await request.json()
+        if not data:
+            return error('Request body is required', 400)
+        message = content_error(data)
+        if message:
+            return error(message, 400)
+
+        try:
+            note_id = ObjectId(request.path_params['note_id'])
+        except InvalidId:
+            return error('Invalid note ID', 400)
+
+        note = await get_collection().find_one_and_update(
+            {'_id': note_id},
+            build_note_update(data, utc_now()),
+            projection=NOTE_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if note is None:
+            note_cache.invalidate(str(note_id))
+            return error('Note not found', 404)
+
+        return note_response(request, cache_note(note))
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@login_required
+async def delete_note(request):
+    """Delete a note"""
+    try:
+        try:
+            note_id = ObjectId(request.path_params['note_id'])
+        except InvalidId:
+            return error('Invalid note ID', 400)
+
+        result = await get_collection().delete_one({'_id': note_id})
+        note_cache.invalidate(str(note_id))
+
+        if result.deleted_count == 0:
+            return error('Note not found', 404)
+
+        await get_tombstones().bulk_write(tombstone_requests([note_id], utc_now()))
+
+        return JSONResponse({'message': 'Note deleted successfully'})
+    except Exception as e:
+        return error(str(e), 500)
+
+
+@login_required
+async def bulk_notes(request):
+    """Apply a batch of create/update/delete operations in one bulk write"""
+    try:
+        try:
+            operations = parse_bulk_operations(await request.json())
+        except ValueError as e:
+            message, status = e.args
+            return error(message, status)
+
+        plan = BulkPlan(operations, utc_now())
+        collection = get_collection()
+
+        target_ids = plan.target_ids()
+        existing = set()
+        if target_ids:
+            cursor = collection.find({'_id': {'$in': target_ids}}, {'_id': 1})
+            existing = {doc['_id'] async for doc in cursor}
+        requests = plan.requests(existing)
+
+        write_errors = []
+        if requests:
+            try:
+                await collection.bulk_write(requests, ordered=False)
+            except BulkWriteError as e:
+                write_errors = e.details.get('writeErrors', [])
+        for note_id in plan.modified_ids():
+            note_cache.invalidate(note_id)
+        deleted_ids = plan.deleted_ids(write_errors)
+        if deleted_ids:
+            await get_tombstones().bulk_write(tombstone_requests(deleted_ids, utc_now()), ordered=False)
+
+        return JSONResponse(plan.finish(write_errors))
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def warm_pool(collection):
+    """Open MONGO_MIN_POOL_SIZE connections by running that many pings at once"""
+    db = collection.database
+    while not state['pool_ready']:
+        try:
+            for name, keys, options in INDEXES:
+                try:
+                    await db[name].create_index(keys, **options)
+                except OperationFailure as e:
+                    # A changed TTL is applied to the existing index
+                    command = ttl_index_update(name, keys, options, e)
+                    if command is None:
+                        raise
+                    await db.command(command)
+            await asyncio.gather(*(db.command('ping') for _ in range(max(1, MONGO_MIN_POOL_SIZE))))
+            state['pool_ready'] = True
+        except Exception as e:
+            print(f"Warning: Could not warm MongoDB pool: {e}")
+            await asyncio.sleep(1)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Runs in each worker process, after uvicorn has forked it
+    client = AsyncIOMotorClient(MONGO_URL, **mongo_client_options())
+    collection = client[DB_NAME][COLLECTION_NAME]
+    state['collection'] = collection
+    warmup = asyncio.create_task(warm_pool(collection))
+    yield
+    warmup.cancel()
+    if group_committer is not None:
+        await group_committer.close()
+    client.close()
+
+
+routes = [
+    Route('/health', health, methods=['GET']),
+    Route('/ready', ready, methods=['GET']),
+    Route('/metrics', metrics, methods=['GET']),
+    Route('/stats', stats, methods=['GET']),
+    Route('/notes', get_notes, methods=['GET']),
+    Route('/notes', create_note, methods=['POST']),
+    Route('/notes/_bulk', bulk_notes, methods=['POST']),
+    Route('/notes/changes', get_changes, methods=['GET']),
+    Route('/notes/search', search_notes, methods=['GET']),
+    Route('/notes/{note_id}', get_note, methods=['GET']),
+    Route('/notes/{note_id}', update_note, methods=['PUT']),
+    Route('/notes/{note_id}', delete_note, methods=['DELETE']),
+]
+
+app = Starlette(routes=routes, lifespan=lifespan,
+                middleware=[Middleware(ASGIMetricsMiddleware, routes=routes)])
@@ -0,0 +1,31 @@
+"""One-off migration: set ``title_lower`` on notes written before prefix search existed.
+
+Notes without it are not found by ``GET /notes/search?prefix=``. Run this
+once after upgrading, from a checkout or inside the image, with the same
+MONGO_URL/DB_NAME as the server. It works in batches, can be rerun, and
+is safe while the API is serving:
+
+    python backfill_title_keys.py
+"""
+from pymongo import MongoClient
+
+from notes import (
+    MONGO_URL, DB_NAME, COLLECTION_NAME, TITLE_KEY_MISSING, TITLE_KEY_BACKFILL_BATCH,
+    mongo_client_options, title_key_backfill_requests
+)
+
+
+def backfill_title_keys(collection):
+    """Set ``title_lower`` on every note missing it; returns how many were updated"""
+    updated = 0
+    while True:
+        docs = list(collection.find(TITLE_KEY_MISSING, {'title': 1}).limit(TITLE_KEY_BACKFILL_BATCH))
+        if not docs:
+            return updated
+        collection.bulk_write(title_key_backfill_requests(docs), ordered=False)
+        updated += len(docs)
+
+
+if __name__ == '__main__':
+    collection = MongoClient(MONGO_URL, **mongo_client_options())[DB_NAME][COLLECTION_NAME]
+    print(f"Set title_lower on {backfill_title_keys(collection)} notes")
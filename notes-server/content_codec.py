@@ -0,0 +1,67 @@
+"""Compressed storage of large note bodies.
+
+A packed note has no ``content`` field; it stores instead:
+
+- ``content_z``: the zlib-compressed UTF-8 body (BSON binary)
+- ``content_len``: the body's length in characters
+- ``content_preview``: its first characters, enough for ``view=summary``
+- ``content_terms``: each distinct whitespace-separated word of the body,
+  lower-cased, once; the text index covers it, so ``?q=`` still finds
+  the note (phrases in the body do not match, and each word counts once
+  towards the score)
+
+``pack_content`` decides per body, so packed and plain notes live side by
+side in one collection. ``unpack_content`` turns a packed document back
+into the plain note schema; serializer.py calls it, so a body is only
+inflated when a response carries it in full.
+"""
+import zlib
+
+COMPRESSED_FIELD = 'content_z'
+LENGTH_FIELD = 'content_len'
+PREVIEW_FIELD = 'content_preview'
+TERMS_FIELD = 'content_terms'
+PACKED_FIELDS = (COMPRESSED_FIELD, LENGTH_FIELD, PREVIEW_FIELD, TERMS_FIELD)
+
+
+def pack_content(content, min_bytes, preview_length, level=6):
+    """Fields storing ``content``: packed if its UTF-8 is ``min_bytes`` or
+    larger and compresses smaller (search terms included), ``{'content':
+    content}`` otherwise"""
+    if type(content) is str and len(content) * 4 >= min_bytes:
+        raw = content.encode('utf-8')
+        if len(raw) >= min_bytes:
+            packed = zlib.compress(raw, level)
+            terms = search_terms(content)
+            if len(packed) + len(terms) < len(raw):
+                return {COMPRESSED_FIELD: packed, LENGTH_FIELD: len(content),
+                        PREVIEW_FIELD: content[:preview_length], TERMS_FIELD: terms}
+    return {'content': content}
+
+
+def search_terms(content):
+    """The distinct words of ``content``, lower-cased, in order of first use.
+
+    Words are split on whitespace only, so the text index tokenizes each
+    one as it would in the full body.
+    """
+    return ' '.join(dict.fromkeys(content.lower().split()))
+
+
+def content_unset(fields):
+    """``$unset`` of the stored body fields that ``fields`` does not replace"""
+    return {field: '' for field in ('content',) + PACKED_FIELDS if field not in fields}
+
+
+def unpack_content(doc):
+    """``doc`` with a packed body back in ``content`` (same key position);
+    documents without one are returned as they are"""
+    if COMPRESSED_FIELD not in doc:
+        return doc
+    note = {}
+    for key, value in doc.items():
+        if key == COMPRESSED_FIELD:
+            note['content'] = zlib.decompress(value).decode('utf-8')
+        elif key not in PACKED_FIELDS:
+            note[key] = value
+    return note
@@ -0,0 +1,227 @@
+"""Group commit for note creation.
+
+Concurrent ``POST /notes`` requests each hand their document to a
+committer instead of calling ``insert_one``. A single flusher per process
+collects documents for up to ``window`` seconds after the first one
+arrives (or until ``max_batch`` are waiting), writes them with one
+unordered ``insert_many`` and wakes every waiting request with its own
+result: the inserted id, or the write error MongoDB reported for that
+document. While a batch is being written the next one is already forming,
+so under load batches fill up without waiting for the window.
+
+``GroupCommitter`` runs the flusher on a thread (app.py);
+``AsyncGroupCommitter`` runs it as an asyncio task (asgi_app.py).
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+
+
+def batch_errors(count, exc):
+    """Map the outcome of one ``insert_many`` onto its ``count`` documents.
+
+    Returns one entry per document: None if it was written, otherwise the
+    exception to raise for it. With an unordered insert, a BulkWriteError
+    only concerns the documents listed in ``writeErrors``; any other
+    exception fails the whole batch.
+    """
+    if exc is None:
+        return [None] * count
+    if not isinstance(exc, BulkWriteError):
+        return [exc] * count
+    errors = [None] * count
+    for error in exc.details.get('writeErrors', []):
+        error_class = DuplicateKeyError if error.get('code') == 11000 else WriteError
+        errors[error['index']] = error_class(error.get('errmsg', 'Write failed'), error.get('code'), error)
+    return errors
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, int(round(pct / 100 * len(values))) - 1))]
+
+
+class GroupCommitStats:
+    """Counters plus the last ``samples`` batch sizes and latencies"""
+
+    def __init__(self, window, max_batch, samples=1000):
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.documents = 0
+        self.failed_documents = 0
+        self._sizes = deque(maxlen=samples)
+        self._flush_ms = deque(maxlen=samples)
+        self._wait_ms = deque(maxlen=samples)
+
+    def record(self, size, flush_seconds, wait_seconds, failed):
+        """Account for one flushed batch; ``wait_seconds`` holds one entry per document"""
+        with self._lock:
+            self.batches += 1
+            self.documents += size
+            self.failed_documents += failed
+            self._sizes.append(size)
+            self._flush_ms.append(flush_seconds * 1000)
+            self._wait_ms.extend(wait * 1000 for wait in wait_seconds)
+
+    def snapshot(self):
+        """Configuration, totals and recent percentiles for /stats"""
+        with self._lock:
+            sizes, flush_ms, wait_ms = list(self._sizes), list(self._flush_ms), list(self._wait_ms)
+            return {
+                'window_ms': self.window * 1000,
+                'max_batch': self.max_batch,
+                'batches': self.batches,
+                'documents': self.documents,
+                'failed_documents': self.failed_documents,
+                'avg_batch_size': round(self.documents / self.batches, 2) if self.batches else 0.0,
+                'batch_size_p50': _percentile(sizes, 50),
+                'batch_size_max': max(sizes, default=0),
+                'flush_ms_p50': round(_percentile(flush_ms, 50), 3),
+                'flush_ms_p95': round(_percentile(flush_ms, 95), 3),
+                'wait_ms_p50': round(_percentile(wait_ms, 50), 3),
+                'wait_ms_p95': round(_percentile(wait_ms, 95), 3)
+            }
+
+
+class GroupCommitter:
+    """Thread-based committer; ``insert`` blocks the calling request thread.
+
+    The flusher thread is started lazily in the process that first inserts,
+    so the committer can be created before a pre-fork server forks.
+    """
+
+    def __init__(self, get_collection, window, max_batch):
+        self._get_collection = get_collection
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.stats = GroupCommitStats(window, self.max_batch)
+        self._cond = threading.Condition()
+        self._pending = []
+        self._thread = None
+        self._pid = None
+
+    def insert(self, doc):
+        """Write ``doc`` with the next batch and return its ``_id``.
+
+        Raises the write error MongoDB reported for this document.
+        """
+        future = Future()
+        with self._cond:
+            self._ensure_flusher()
+            self._pending.append((doc, future, time.perf_counter()))
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        return future.result()
+
+    def _ensure_flusher(self):
+        pid = os.getpid()
+        if self._pid != pid or not self._thread.is_alive():
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = self._pending[0][2] + self.window
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            exc = None
+            try:
+                self._get_collection().insert_many([doc for doc, _, _ in batch], ordered=False)
+            except Exception as e:
+                exc = e
+            finished = time.perf_counter()
+            errors = batch_errors(len(batch), exc)
+            for (doc, future, _), error in zip(batch, errors):
+                if error is None:
+                    future.set_result(doc['_id'])
+                else:
+                    future.set_exception(error)
+            self.stats.record(len(batch), finished - started, [finished - queued for _, _, queued in batch],
+                              sum(1 for error in errors if error is not None))
+
+
+class AsyncGroupCommitter:
+    """asyncio counterpart of GroupCommitter; the flusher is a task on the running loop"""
+
+    def __init__(self, get_collection, window, max_batch):
+        self._get_collection = get_collection
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.stats = GroupCommitStats(window, self.max_batch)
+        self._pending = []
+        self._ready = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task = None
+
+    async def insert(self, doc):
+        """Write ``doc`` with the next batch and return its ``_id``"""
+        future = asyncio.get_running_loop().create_future()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._pending.append((doc, future, time.perf_counter()))
+        self._ready.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return await future
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            await self._ready.wait()
+            remaining = self._pending[0][2] + self.window - time.perf_counter()
+            if len(self._pending) < self.max_batch and remaining > 0:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            if not self._pending:
+                self._ready.clear()
+            if len(self._pending) < self.max_batch:
+                self._full.clear()
+
+            started = time.perf_counter()
+            exc = None
+            try:
+                await self._get_collection().insert_many([doc for doc, _, _ in batch], ordered=False)
+            except Exception as e:
+                exc = e
+            finished = time.perf_counter()
+            errors = batch_errors(len(batch), exc)
+            for (doc, future, _), error in zip(batch, errors):
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(doc['_id'])
+                else:
+                    future.set_exception(error)
+            self.stats.record(len(batch), finished - started, [finished - queued for _, _, queued in batch],
+                              sum(1 for error in errors if error is not None))
@@ -0,0 +1,618 @@
+"""Notes API logic shared by the WSGI (app.py) and ASGI (asgi_app.py) servers.
+
+Nothing in here depends on Flask or on a particular MongoDB driver, so both
+entry points build documents, parse arguments and shape responses the same way.
+"""
+import os
+import sys
+import json
+import base64
+import binascii
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime, timedelta
+from pymongo import InsertOne, UpdateOne, DeleteOne
+from cache import NoteCache
+from content_codec import COMPRESSED_FIELD, LENGTH_FIELD, PREVIEW_FIELD, TERMS_FIELD, content_unset, pack_content
+from serializer import VERSION_FIELD, serialize_document, encode_note, dumps_note
+
+# Modules shared with results-viewer sit next to this file in the image and
+# in ../common in a checkout
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+from metrics import serialization
+from mongo import client_options
+
+# MongoDB connection
+MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017/')
+DB_NAME = os.getenv('DB_NAME', 'notes_db')
+COLLECTION_NAME = 'notes'
+TOMBSTONE_COLLECTION_NAME = 'notes_tombstones'
+
+# Pagination for GET /notes
+DEFAULT_PAGE_SIZE = int(os.getenv('NOTES_PAGE_SIZE', 50))
+MAX_PAGE_SIZE = int(os.getenv('NOTES_MAX_PAGE_SIZE', 500))
+
+# Streaming listings (NDJSON / chunked JSON)
+NDJSON_MIMETYPE = 'application/x-ndjson'
+STREAM_BATCH_SIZE = int(os.getenv('NOTES_STREAM_BATCH_SIZE', 500))
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Field selection for listings (?fields=, ?view=summary)
+NOTE_FIELDS = ('title', 'content', 'created_at', 'updated_at')
+SUMMARY_CONTENT_LENGTH = int(os.getenv('NOTES_SUMMARY_LENGTH', 200))
+
+# Compression of large bodies at rest (NOTES_COMPRESS_CONTENT=1): bodies of
+# NOTES_COMPRESS_MIN_BYTES or more are stored zlib-compressed with their
+# length and a SUMMARY_CONTENT_LENGTH preview (see content_codec.py). Notes
+# written either way are read alike, so the setting can change at any time.
+# Text search (?q=) matches a compressed body through its distinct words;
+# quoted phrases only match its title.
+COMPRESS_CONTENT = os.getenv('NOTES_COMPRESS_CONTENT', '0').lower() in ('1', 'true')
+COMPRESS_MIN_BYTES = int(os.getenv('NOTES_COMPRESS_MIN_BYTES', 4096))
+COMPRESS_LEVEL = int(os.getenv('NOTES_COMPRESS_LEVEL', 6))
+
+# Change feed (GET /notes/changes). Tombstones of deleted notes are kept for
+# NOTES_TOMBSTONE_TTL seconds; older sync tokens need a full resync. Changes
+# younger than NOTES_CHANGES_SETTLE_MS are held back so a write that picked
+# its timestamp but has not committed yet cannot slip behind a token.
+TOMBSTONE_TTL = int(os.getenv('NOTES_TOMBSTONE_TTL', 7 * 24 * 3600))
+CHANGES_SETTLE = timedelta(milliseconds=int(os.getenv('NOTES_CHANGES_SETTLE_MS', 2000)))
+
+# Search (GET /notes/search). ``title_lower`` holds the lower-cased title so
+# case-insensitive prefix matches become index range scans.
+TITLE_KEY_FIELD = 'title_lower'
+# Compressed bodies are searched through their distinct words (content_codec.py)
+TEXT_INDEX_WEIGHTS = {'title': 5, 'content': 1, TERMS_FIELD: 1}
+# Notes written before ``title_lower`` existed are backfilled in batches by
+# backfill_title_keys.py, run once after upgrading (not on worker startup)
+TITLE_KEY_MISSING = {TITLE_KEY_FIELD: {'$exists': False}}
+TITLE_KEY_BACKFILL_BATCH = 1000
+
+# Reads of whole notes leave out the search terms kept for compressed bodies
+NOTE_PROJECTION = {TERMS_FIELD: 0}
+
+# Indexes per collection: (collection name, keys, options)
+INDEXES = [
+    (COLLECTION_NAME, [(TITLE_KEY_FIELD, 1), ('_id', 1)], {}),
+    (COLLECTION_NAME, [('title', 'text'), ('content', 'text'), (TERMS_FIELD, 'text')],
+     {'weights': TEXT_INDEX_WEIGHTS, 'name': 'notes_text'}),
+    (COLLECTION_NAME, [('updated_at', 1), ('_id', 1)], {}),
+    (TOMBSTONE_COLLECTION_NAME, [('deleted_at', 1), ('_id', 1)], {}),
+    (TOMBSTONE_COLLECTION_NAME, 'deleted_at', {'expireAfterSeconds': TOMBSTONE_TTL}),
+]
+# create_index errors for an index that exists with other options
+# (IndexOptionsConflict, IndexKeySpecsConflict)
+INDEX_CONFLICT_CODES = (85, 86)
+
+# Group commit for POST /notes (NOTES_GROUP_COMMIT=1): concurrent creates
+# are merged into one insert_many per window or per max batch
+GROUP_COMMIT = os.getenv('NOTES_GROUP_COMMIT', '0').lower() in ('1', 'true')
+GROUP_COMMIT_WINDOW = float(os.getenv('NOTES_GROUP_COMMIT_WINDOW_MS', 2)) / 1000
+GROUP_COMMIT_MAX_BATCH = int(os.getenv('NOTES_GROUP_COMMIT_MAX_BATCH', 100))
+
+# Largest number of operations accepted by POST /notes/_bulk
+BULK_MAX_OPERATIONS = int(os.getenv('NOTES_BULK_MAX_OPERATIONS', 1000))
+
+# Read-through cache for GET /notes/<id> (NOTES_CACHE_SIZE=0 disables it).
+# Each process has its own cache and only sees its own writes, so a hit is
+# served only once a lookup of the note's ``version`` (a counter every write
+# increments; ``updated_at`` is only millisecond-precise) confirms it is
+# current, and writes through other workers show at once. That lookup is
+# one round-trip per hit: the cache saves reading and encoding the body, not
+# the trip to MongoDB. NOTES_CACHE_REVALIDATE=0 skips it, which is only safe
+# when a single process serves the API.
+note_cache = NoteCache(
+    max_size=int(os.getenv('NOTES_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('NOTES_CACHE_TTL', 30))
+)
+CACHE_REVALIDATE = os.getenv('NOTES_CACHE_REVALIDATE', '1').lower() in ('1', 'true')
+CACHE_VERSION_PROJECTION = {VERSION_FIELD: 1}
+
+# Basic Auth credentials (in production, use environment variables)
+users = {
+    os.getenv('API_USER', 'admin'): os.getenv('API_PASSWORD', 'password')
+}
+
+def check_credentials(username, password):
+    """Return the username if the credentials are valid, None otherwise"""
+    if username in users and users[username] == password:
+        return username
+    return None
+
+
+def mongo_client_options():
+    """Keyword arguments for the per-process MongoClient/Motor client (see common/mongo.py)"""
+    return client_options()
+
+
+def utc_now():
+    """Current UTC time truncated to the millisecond precision MongoDB stores"""
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+def title_key(title):
+    """Value stored in ``title_lower`` for a title"""
+    return title.lower() if isinstance(title, str) else ''
+
+def content_fields(content):
+    """Stored fields for a note body: ``content``, or its packed form"""
+    if not COMPRESS_CONTENT:
+        return {'content': content}
+    return pack_content(content, COMPRESS_MIN_BYTES, SUMMARY_CONTENT_LENGTH, COMPRESS_LEVEL)
+
+def content_error(data):
+    """Client-facing message if a payload's ``content`` is not a string.
+
+    ``view=summary`` cuts bodies with string operators inside MongoDB, so a
+    stored number or object would fail every listing page holding it.
+    """
+    if 'content' in data and not isinstance(data['content'], str):
+        return 'content must be a string'
+    return None
+
+def build_note(data, now):
+    """Build a new note document from a request payload"""
+    return {
+        'title': data['title'],
+        **content_fields(data.get('content', '')),
+        'created_at': now,
+        'updated_at': now,
+        TITLE_KEY_FIELD: title_key(data['title']),
+        VERSION_FIELD: 1
+    }
+
+def build_note_update(data, now):
+    """Build the update document for a note update payload"""
+    update_data = {'updated_at': now}
+    update = {'$set': update_data, '$inc': {VERSION_FIELD: 1}}
+    if 'title' in data:
+        update_data['title'] = data['title']
+        update_data[TITLE_KEY_FIELD] = title_key(data['title'])
+    if 'content' in data:
+        fields = content_fields(data['content'])
+        update_data.update(fields)
+        # Drop the body's other stored form
+        update['$unset'] = content_unset(fields)
+    return update
+
+def cache_note(note):
+    """Serialize a note once and keep it with its validators in the cache"""
+    updated_at = note.get('updated_at')
+    # Notes written before the counter existed count as version 0
+    version = note.get(VERSION_FIELD, 0)
+    with serialization('note'):
+        body = dumps_note(note)
+    entry = {
+        'body': body,
+        'etag': (f"{note['_id']}-{updated_at.strftime('%Y%m%d%H%M%S%f')}-{version}"
+                 if isinstance(updated_at, datetime) else None),
+        'last_modified': updated_at if isinstance(updated_at, datetime) else None,
+        'version': version
+    }
+    note_cache.set(str(note['_id']), entry)
+    return entry
+
+def cache_entry_current(entry, stored):
+    """True if a cached entry matches ``stored``, the note's CACHE_VERSION_PROJECTION (None if deleted)"""
+    return stored is not None and stored.get(VERSION_FIELD, 0) == entry['version']
+
+def parse_page_args(args, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parse ``limit``/``after`` query parameters for keyset pagination.
+
+    Returns a ``(limit, after)`` tuple where ``after`` is an ObjectId or None.
+    ``limit`` is None when no ``default``/``maximum`` applies and the client
+    did not ask for one. Raises ValueError with a client-facing message on
+    bad input.
+    """
+    limit = args.get('limit', default)
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise ValueError('limit must be an integer')
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        if maximum is not None:
+            limit = min(limit, maximum)
+
+    after = args.get('after')
+    if after:
+        try:
+            after = ObjectId(after)
+        except InvalidId:
+            raise ValueError('Invalid cursor')
+    else:
+        after = None
+    return limit, after
+
+def parse_projection(args):
+    """Build the MongoDB projection for ``?fields=`` and ``?view=summary``.
+
+    ``fields`` is a comma separated subset of NOTE_FIELDS (``id`` is always
+    returned). ``view=summary`` cuts ``content`` down to
+    SUMMARY_CONTENT_LENGTH characters inside MongoDB with ``$substrCP`` and
+    adds ``content_length``, so full bodies never leave the database;
+    compressed notes give their stored preview and length instead.
+    Returns NOTE_PROJECTION when the whole note is wanted. Raises
+    ValueError on bad input.
+    """
+    fields = args.get('fields')
+    view = args.get('view', 'full')
+    if view not in ('full', 'summary'):
+        raise ValueError('view must be full or summary')
+
+    if fields:
+        selected = [field.strip() for field in fields.split(',') if field.strip() and field.strip() != 'id']
+        unknown = [field for field in selected if field not in NOTE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    elif view == 'summary':
+        selected = list(NOTE_FIELDS)
+    else:
+        return NOTE_PROJECTION
+
+    projection = {field: 1 for field in selected}
+    if view == 'summary' and 'content' in projection:
+        # Notes stored before content_error() checked writes may hold other types
+        content = {'$cond': [{'$eq': [{'$type': '$content'}, 'string']}, '$content',
+                             {'$ifNull': [f'${PREVIEW_FIELD}', '']}]}
+        projection['content'] = {'$substrCP': [content, 0, SUMMARY_CONTENT_LENGTH]}
+        projection['content_length'] = {'$ifNull': [f'${LENGTH_FIELD}', {'$strLenCP': content}]}
+    elif 'content' in projection:
+        # Compressed bodies, unpacked by the serializer
+        projection[COMPRESSED_FIELD] = 1
+    if not projection:
+        # Only ids were asked for
+        projection['_id'] = 1
+    return projection
+
+def encode_search_cursor(value, object_id):
+    """Opaque search cursor for the position (sort value, _id)"""
+    raw = json.dumps([value, str(object_id)], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_search_cursor(cursor, value_type):
+    """Return the ``(value, ObjectId)`` position of a search cursor.
+
+    Raises ValueError if the cursor is malformed or its sort value is not
+    a ``value_type``.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, object_id = json.loads(raw)
+        if isinstance(value, bool) or not isinstance(value, value_type):
+            raise ValueError
+        return value, ObjectId(object_id)
+    except (ValueError, TypeError, InvalidId, binascii.Error):
+        raise ValueError('Invalid cursor')
+
+def parse_search_args(args):
+    """Parse ``q``/``prefix`` plus the ``limit``/``after`` page arguments.
+
+    Returns ``(mode, term, limit, after)``: mode is ``'text'`` for ``?q=``
+    and ``'prefix'`` for ``?prefix=``, ``after`` the decoded cursor
+    position or None. Raises ValueError with a client-facing message on
+    bad input.
+    """
+    q = args.get('q', '').strip()
+    prefix = args.get('prefix', '')
+    if bool(q) == bool(prefix):
+        raise ValueError('Pass exactly one of q or prefix')
+    limit, _ = parse_page_args({'limit': args.get('limit', DEFAULT_PAGE_SIZE)})
+    mode, term = ('text', q) if q else ('prefix', title_key(prefix))
+    after = args.get('after')
+    after = decode_search_cursor(after, (int, float) if q else str) if after else None
+    return mode, term, limit, after
+
+def keyset_after(field, position, descending=False):
+    """Query for documents after ``position`` on (field, _id)"""
+    value, object_id = position
+    return {'$or': [
+        {field: {'$lt' if descending else '$gt': value}},
+        {field: value, '_id': {'$gt': object_id}}
+    ]}
+
+def prefix_search_query(prefix, after=None):
+    """Case-insensitive title prefix match as a range on ``title_lower``.
+
+    MongoDB compares strings by code point, so the prefix with its last
+    character incremented is the exclusive upper bound. Sort on
+    (``title_lower``, ``_id``) to walk the compound index.
+    """
+    bounds = {'$gte': prefix}
+    if ord(prefix[-1]) < 0x10FFFF:
+        bounds['$lt'] = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    query = {TITLE_KEY_FIELD: bounds}
+    if after is not None:
+        query = {'$and': [query, keyset_after(TITLE_KEY_FIELD, after)]}
+    return query
+
+def text_search_pipeline(q, after, limit):
+    """Aggregation ranking text index matches by relevance, ties by _id.
+
+    The text score cannot be filtered in a find, so the cursor position is
+    applied after ``$addFields``. Fetches ``limit + 1`` to detect a next page.
+    """
+    pipeline = [
+        {'$match': {'$text': {'$search': q}}},
+        {'$addFields': {'_score': {'$meta': 'textScore'}}},
+    ]
+    if after is not None:
+        pipeline.append({'$match': keyset_after('_score', after, descending=True)})
+    pipeline += [
+        {'$sort': {'_score': -1, '_id': 1}},
+        {'$limit': limit + 1},
+        {'$project': NOTE_PROJECTION},
+    ]
+    return pipeline
+
+def search_page(docs, limit, mode):
+    """Trim ``limit + 1`` search results to a page and its next cursor"""
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    scores = [doc.pop('_score', None) for doc in docs]
+    next_cursor = None
+    if has_more:
+        last = docs[-1]
+        value = scores[-1] if mode == 'text' else last.get(TITLE_KEY_FIELD)
+        next_cursor = encode_search_cursor(value, last['_id'])
+    return docs, next_cursor
+
+def ttl_index_update(name, keys, options, error):
+    """``collMod`` command giving an existing TTL index ``options``' expiry.
+
+    For the ``error`` create_index raised when the index exists with another
+    ``expireAfterSeconds`` (NOTES_TOMBSTONE_TTL was changed); None when the
+    error is anything else.
+    """
+    if getattr(error, 'code', None) not in INDEX_CONFLICT_CODES or 'expireAfterSeconds' not in options:
+        return None
+    key_pattern = {keys: 1} if isinstance(keys, str) else dict(keys)
+    return {'collMod': name, 'index': {'keyPattern': key_pattern,
+                                       'expireAfterSeconds': options['expireAfterSeconds']}}
+
+def title_key_backfill_requests(docs):
+    """Updates setting ``title_lower`` on notes written before it existed"""
+    return [UpdateOne({'_id': doc['_id']}, {'$set': {TITLE_KEY_FIELD: title_key(doc.get('title'))}})
+            for doc in docs]
+
+def wants_streaming(args, ndjson):
+    """True if the listing should be streamed rather than paged in memory"""
+    return ndjson or args.get('stream', '').lower() in ('1', 'true')
+
+
+class NoteStreamWriter:
+    """Encodes a note listing incrementally for streamed responses.
+
+    NDJSON mode emits one serialized note per line. Otherwise the output is
+    the same ``{"notes": [...], "next": ...}`` envelope as the paged
+    listing. Output is buffered up to STREAM_CHUNK_BYTES so each chunk
+    carries many notes. ``add`` returns False once ``limit`` notes have
+    been written and the note passed in only proves there is a next page.
+    """
+
+    def __init__(self, limit, ndjson):
+        self.limit = limit
+        self.ndjson = ndjson
+        self.count = 0
+        self.last_id = None
+        self.next_cursor = None
+        self._buffer = [] if ndjson else ['{"notes":[']
+        self._buffered = 0
+
+    def add(self, note):
+        if self.limit is not None and self.count == self.limit:
+            self.next_cursor = self.last_id
+            return False
+        line = encode_note(note)
+        if self.ndjson:
+            line += '\n'
+        elif self.count:
+            line = ',' + line
+        self._buffer.append(line)
+        self._buffered += len(line)
+        self.count += 1
+        self.last_id = str(note['_id'])
+        return True
+
+    def flush(self, force=False):
+        """Return buffered output once a chunk is full (or when forced)"""
+        if not self._buffer or (not force and self._buffered < STREAM_CHUNK_BYTES):
+            return None
+        chunk = ''.join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        return chunk
+
+    def finish(self):
+        if not self.ndjson:
+            self._buffer.append('],"next":%s}' % json.dumps(self.next_cursor))
+        return self.flush(force=True)
+
+
+def change_token(time, object_id):
+    """Opaque position in the change feed: ``<epoch ms>-<object id>``"""
+    millis = (time - datetime(1970, 1, 1)) // timedelta(milliseconds=1)
+    return f'{millis}-{object_id}'
+
+def parse_change_token(token):
+    """Return the ``(time, ObjectId)`` position of a change token.
+
+    Raises ValueError if the token is malformed.
+    """
+    try:
+        millis, object_id = token.split('-', 1)
+        return datetime(1970, 1, 1) + timedelta(milliseconds=int(millis)), ObjectId(object_id)
+    except (ValueError, InvalidId):
+        raise ValueError('Invalid change token')
+
+def settled_after(field, position, settled):
+    """Query for documents after ``position`` on (field, _id), up to ``settled``"""
+    query = {field: {'$lte': settled}}
+    if position is not None:
+        time, object_id = position
+        query = {'$and': [query, {'$or': [
+            {field: {'$gt': time}},
+            {field: time, '_id': {'$gt': object_id}}
+        ]}]}
+    return query
+
+# Sorts after every real ObjectId, so a token at (time, LAST_OBJECT_ID)
+# covers everything written up to ``time``
+LAST_OBJECT_ID = ObjectId('f' * 24)
+
+def changes_queries(position, now):
+    """Queries for notes changed and notes deleted after ``position``.
+
+    Both are bounded by ``now - CHANGES_SETTLE`` and meant to be sorted on
+    (time, _id) ascending with the page limit + 1.
+    """
+    settled = now - CHANGES_SETTLE
+    return settled_after('updated_at', position, settled), settled_after('deleted_at', position, settled)
+
+def tombstone_requests(note_ids, now):
+    """Upserts recording that ``note_ids`` were deleted at ``now``"""
+    return [UpdateOne({'_id': note_id}, {'$set': {'deleted_at': now}}, upsert=True)
+            for note_id in note_ids]
+
+def tombstone_expired(position, now):
+    """True if tombstones after ``position`` may already have been purged"""
+    return position is not None and position[0] < now - timedelta(seconds=TOMBSTONE_TTL)
+
+def merge_changes(notes, tombstones, limit, position, now):
+    """Merge both (time, _id) ordered result sets into one change page.
+
+    Each list holds at most ``limit + 1`` documents, read by
+    changes_queries(position, now). Returns the response body: changed
+    notes, deleted ids, the token to pass as ``since`` next time and
+    whether more changes are already waiting. Once the feed is drained
+    the token moves up to the settle bound, so a client polling an idle
+    feed keeps a fresh token instead of one that ages into a 410.
+    """
+    entries = [(note['updated_at'], note['_id'], note, False) for note in notes]
+    entries += [(tombstone['deleted_at'], tombstone['_id'], tombstone, True) for tombstone in tombstones]
+    entries.sort(key=lambda entry: (entry[0], entry[1]))
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    if has_more:
+        position = (entries[-1][0], entries[-1][1])
+    else:
+        # Everything up to the settle bound has been returned; never move
+        # back if this worker's clock is behind the one that made the token
+        drained = (now - CHANGES_SETTLE, LAST_OBJECT_ID)
+        position = drained if position is None else max(position, drained)
+    changed = [serialize_document(document) for _, _, document, deleted in entries if not deleted]
+    deleted = [{'id': str(document['_id']), 'deleted_at': document['deleted_at'].isoformat()}
+               for _, _, document, is_deleted in entries if is_deleted]
+    return {
+        'changed': changed,
+        'deleted': deleted,
+        'next': change_token(*position),
+        'has_more': has_more
+    }
+
+def parse_bulk_operations(data):
+    """Validate a bulk payload and return its operations.
+
+    Raises ValueError with ``(message, status)`` arguments on bad input.
+    """
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('operations must be a non-empty list', 400)
+    if len(operations) > BULK_MAX_OPERATIONS:
+        raise ValueError(f'At most {BULK_MAX_OPERATIONS} operations per request', 413)
+    return operations
+
+
+class BulkPlan:
+    """Turns bulk operations into pymongo write requests and maps the
+    outcome back to one result per operation, in request order.
+
+    Usage: look up ``target_ids()``, pass the ids that exist to
+    ``requests(existing)``, run those requests as one unordered
+    ``bulk_write`` and hand any ``writeErrors`` to ``finish``.
+    """
+
+    def __init__(self, operations, now):
+        self.results = [None] * len(operations)
+        # (request index, op, document id, pymongo request)
+        self.pending = []
+        self.to_write = []
+        self.notes = {}
+        for index, item in enumerate(operations):
+            op = item.get('op') if isinstance(item, dict) else None
+            if op == 'create':
+                message = 'Title is required' if 'title' not in item else content_error(item)
+                if message:
+                    self.results[index] = {'index': index, 'op': op, 'status': 400, 'error': message}
+                    continue
+                note = build_note(item, now)
+                note['_id'] = ObjectId()
+                self.notes[index] = note
+                self.pending.append((index, op, note['_id'], InsertOne(note)))
+            elif op in ('update', 'delete'):
+                message = content_error(item) if op == 'update' else None
+                if message:
+                    self.results[index] = {'index': index, 'op': op, 'status': 400, 'error': message}
+                    continue
+                try:
+                    note_id = ObjectId(item.get('id'))
+                except (InvalidId, TypeError):
+                    self.results[index] = {'index': index, 'op': op, 'status': 400, 'error': 'Invalid note ID'}
+                    continue
+                if op == 'update':
+                    request_op = UpdateOne({'_id': note_id}, build_note_update(item, now))
+                else:
+                    request_op = DeleteOne({'_id': note_id})
+                self.pending.append((index, op, note_id, request_op))
+            else:
+                self.results[index] = {'index': index, 'op': op, 'status': 400,
+                                       'error': 'op must be one of create, update, delete'}
+
+    def target_ids(self):
+        """IDs of the notes that updates and deletes refer to.
+
+        bulk_write only reports aggregate match counts, so callers look
+        these up (one query for the whole batch) to report 404s.
+        """
+        return [note_id for _, op, note_id, _ in self.pending if op != 'create']
+
+    def requests(self, existing):
+        """Write requests for every operation whose target exists"""
+        self.to_write = []
+        for entry in self.pending:
+            index, op, note_id, _ = entry
+            if op != 'create' and note_id not in existing:
+                self.results[index] = {'index': index, 'op': op, 'id': str(note_id), 'status': 404,
+                                       'error': 'Note not found'}
+            else:
+                self.to_write.append(entry)
+        return [request_op for _, _, _, request_op in self.to_write]
+
+    def modified_ids(self):
+        """String IDs of existing notes the batch updated or deleted"""
+        return [str(note_id) for _, op, note_id, _ in self.to_write if op != 'create']
+
+    def deleted_ids(self, write_errors=()):
+        """ObjectIds of the notes the batch deleted successfully"""
+        failed = {error['index'] for error in write_errors}
+        return [note_id for position, (_, op, note_id, _) in enumerate(self.to_write)
+                if op == 'delete' and position not in failed]
+
+    def finish(self, write_errors=()):
+        """Build the response body given bulk_write's ``writeErrors``"""
+        errors_by_position = {error['index']: error for error in write_errors}
+        results = self.results
+        for position, (index, op, note_id, _) in enumerate(self.to_write):
+            if position in errors_by_position:
+                results[index] = {'index': index, 'op': op, 'id': str(note_id), 'status': 500,
+                                  'error': errors_by_position[position].get('errmsg', 'Write failed')}
+            elif op == 'create':
+                results[index] = {'index': index, 'op': op, 'id': str(note_id), 'status': 201,
+                                  'note': serialize_document(self.notes[index])}
+            else:
+                results[index] = {'index': index, 'op': op, 'id': str(note_id), 'status': 200}
+
+        errors = sum(1 for result in results if result['status'] >= 400)
+        return {'results': results, 'errors': errors}
@@ -0,0 +1,140 @@
+"""JSON serialization of note documents.
+
+``serialize_document`` is the generic converter: it walks any document and
+turns ObjectIds and datetimes into strings so the result can go through a
+JSON encoder. The ``dumps_*`` functions write JSON for notes directly. The
+exact note schema (``_id``, ``title``, ``content``, ``created_at``,
+``updated_at``) is filled into a fixed template with one type check and a
+C-level string escape per field. Documents with other fields (projections,
+extra keys) are encoded field by field, and only values that are not
+plain strings or datetimes go through ``serialize_document``. Internal
+fields (``title_lower``, kept for prefix search, and ``version``, the write
+counter the note cache revalidates on) are never written out.
+Notes stored with a compressed body (see content_codec.py) are unpacked
+first and come out exactly like plain ones.
+"""
+import json
+from json.encoder import encode_basestring
+from bson import ObjectId
+from datetime import datetime
+
+from content_codec import COMPRESSED_FIELD, LENGTH_FIELD, PREVIEW_FIELD, unpack_content
+
+_generic_dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+# Pre-encoded '"key":' prefixes for the note schema
+_KNOWN_KEYS = {
+    key: encode_basestring(key) + ':'
+    for key in ('title', 'content', 'created_at', 'updated_at')
+}
+
+# Incremented by every write of a note (see notes.cache_entry_current)
+VERSION_FIELD = 'version'
+
+# Stored for search indexes, summaries and the cache only, left out of every response
+INTERNAL_FIELDS = frozenset(['title_lower', VERSION_FIELD, LENGTH_FIELD, PREVIEW_FIELD])
+
+
+def serialize_document(doc):
+    """Convert MongoDB document to JSON-serializable format"""
+    if doc is None:
+        return None
+
+    if isinstance(doc, dict):
+        if COMPRESSED_FIELD in doc:
+            doc = unpack_content(doc)
+        result = {}
+        for key, value in doc.items():
+            if key in INTERNAL_FIELDS:
+                continue
+            if key == '_id':
+                result['id'] = str(value)
+            elif isinstance(value, ObjectId):
+                result[key] = str(value)
+            elif isinstance(value, datetime):
+                result[key] = value.isoformat()
+            elif isinstance(value, dict):
+                result[key] = serialize_document(value)
+            elif isinstance(value, list):
+                result[key] = [serialize_document(item) for item in value]
+            else:
+                result[key] = value
+        return result
+    elif isinstance(doc, list):
+        return [serialize_document(item) for item in doc]
+    elif isinstance(doc, ObjectId):
+        return str(doc)
+    elif isinstance(doc, datetime):
+        return doc.isoformat()
+    else:
+        return doc
+
+
+def _encode_value(value):
+    value_type = type(value)
+    if value_type is str:
+        return encode_basestring(value)
+    if value_type is datetime:
+        return '"' + value.isoformat() + '"'
+    return _generic_dumps(serialize_document(value))
+
+
+_NOTE_TEMPLATE = '{"id":"%s","title":%s,"content":%s,"created_at":"%s","updated_at":"%s"}'
+
+
+def encode_note(doc):
+    """Return a note document as a JSON string (``_id`` becomes ``id``)"""
+    if COMPRESSED_FIELD in doc:
+        doc = unpack_content(doc)
+    # Fast path: exactly the note schema with the expected types
+    if len(doc) == 5 + ('title_lower' in doc) + (VERSION_FIELD in doc):
+        try:
+            note_id = doc['_id']
+            title = doc['title']
+            content = doc['content']
+            created_at = doc['created_at']
+            updated_at = doc['updated_at']
+        except KeyError:
+            pass
+        else:
+            if (type(note_id) is ObjectId and type(title) is str and type(content) is str
+                    and type(created_at) is datetime and type(updated_at) is datetime):
+                created = created_at.isoformat()
+                # Notes that were never updated share one timestamp
+                updated = created if updated_at == created_at else updated_at.isoformat()
+                return _NOTE_TEMPLATE % (note_id.binary.hex(), encode_basestring(title),
+                                         encode_basestring(content), created, updated)
+    return _encode_fields(doc)
+
+
+def _encode_fields(doc):
+    """Encode any document field by field, falling back to serialize_document"""
+    parts = []
+    for key, value in doc.items():
+        if key in INTERNAL_FIELDS:
+            continue
+        if key == '_id':
+            parts.append('"id":"' + str(value) + '"' if type(value) is ObjectId
+                         else '"id":' + _generic_dumps(str(value)))
+            continue
+        prefix = _KNOWN_KEYS.get(key)
+        if prefix is None:
+            prefix = encode_basestring(key) + ':'
+        parts.append(prefix + _encode_value(value))
+    return '{' + ','.join(parts) + '}'
+
+
+def dumps_note(doc):
+    """Encode one note as UTF-8 JSON bytes"""
+    return encode_note(doc).encode('utf-8')
+
+
+def dumps_notes(docs):
+    """Encode a list of notes as a UTF-8 JSON array"""
+    return ('[' + ','.join([encode_note(doc) for doc in docs]) + ']').encode('utf-8')
+
+
+def dumps_page(docs, next_cursor):
+    """Encode a listing page as ``{"notes": [...], "next": ...}``"""
+    return ('{"notes":[' + ','.join([encode_note(doc) for doc in docs]) + '],"next":'
+            + _generic_dumps(next_cursor) + '}').encode('utf-8')
@@ -0,0 +1,577 @@
+"""Python load generator that replays the script.js scenario.
+
+Each iteration runs the same flow as ``NotesApiClient`` in script.js:
+create a note, get it, update it, list notes, delete it and, with
+``--bulk-size``, bulk-create and bulk-delete a batch. Only the standard
+library is needed (``uvloop`` is used when installed).
+
+Two load models:
+
+- closed (``--vus``): N virtual users run iterations back to back, like
+  k6's default executor;
+- open (``--rate``): iterations start at a fixed arrival rate, like k6's
+  ``constant-arrival-rate``, with at most ``--max-vus`` in flight.
+
+Latencies go into an HDR-style histogram (two significant digits over any
+range). Coordinated omission is corrected: in the open model a request's
+latency is measured from when its iteration was scheduled to start, so time
+spent queued behind a slow server counts; in the closed model
+``--expected-interval-ms`` back-fills the samples a stalled VU did not
+send, as HdrHistogram's ``recordValueWithExpectedInterval`` does.
+
+HTTP/1.1 requests go over a pool of keep-alive connections per process.
+One Python process tops out at a few thousand requests per second;
+``--processes`` splits the VUs or the arrival rate over several and
+merges their histograms.
+
+The summary is printed and can be written (``--summary-export``) or sent
+to results-viewer (``--results-url``) in the ``k6_results`` shape.
+
+    python performance-tests/loadgen.py --vus 200 --duration 30 --think-time 0 --processes 4
+    python performance-tests/loadgen.py --rate 2000 --max-vus 500 --duration 30 \\
+        --results-url http://localhost:8080 --test-id notes-crud
+"""
+import argparse
+import asyncio
+import base64
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+import urllib.request
+from datetime import datetime
+from urllib.parse import quote, urlsplit
+
+try:
+    import uvloop
+except ImportError:
+    # The standard event loop works, with less headroom per process
+    uvloop = None
+
+# Same configuration as script.js
+BASE_URL = os.getenv('BASE_URL', 'http://localhost:5000')
+API_USER = os.getenv('API_USER', 'admin')
+API_PASSWORD = os.getenv('API_PASSWORD', 'password')
+THINK_TIME = float(os.getenv('THINK_TIME', '1'))
+BULK_SIZE = int(os.getenv('BULK_SIZE', '0'))
+
+# script.js thresholds: metric -> (summary value, limit)
+THRESHOLDS = {
+    'http_req_duration': [('p(95)', 500), ('p(99)', 1000)],
+    'http_req_failed': [('rate', 0.01)],
+}
+# Exit status when a threshold is crossed, as k6 uses
+THRESHOLDS_FAILED_EXIT = 99
+
+TREND_PERCENTILES = {'med': 50, 'p(90)': 90, 'p(95)': 95, 'p(99)': 99}
+REQUEST_TIMEOUT = 60
+
+
+class Histogram:
+    """HDR-style histogram of microsecond values.
+
+    Values below 256 are counted exactly; above, each power of two is split
+    into 128 buckets, so a recorded value is off by less than 1/128.
+    """
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def _index(value):
+        shift = value.bit_length() - 8
+        if shift <= 0:
+            return value
+        return (shift << 7) + (value >> shift)
+
+    @staticmethod
+    def _value(index):
+        """Midpoint of the values counted at ``index``"""
+        if index < 256:
+            return index
+        shift = (index >> 7) - 1
+        low = (index - (shift << 7)) << shift
+        return low + ((1 << shift) - 1) / 2
+
+    def record(self, micros):
+        value = max(0, int(micros))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def record_corrected(self, micros, expected_interval):
+        """Record ``micros`` plus the samples a stall of that length hid"""
+        self.record(micros)
+        if expected_interval > 0:
+            missing = micros - expected_interval
+            while missing >= expected_interval:
+                self.record(missing)
+                missing -= expected_interval
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentile(self, pct):
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._value(index), self.max)
+        return self.max
+
+    def trend_values(self):
+        """k6 trend ``values`` in milliseconds"""
+        values = {'avg': self.total / self.count / 1000 if self.count else 0,
+                  'min': (self.min or 0) / 1000, 'max': (self.max or 0) / 1000}
+        for label, pct in TREND_PERCENTILES.items():
+            values[label] = self.percentile(pct) / 1000
+        return values
+
+
+class HttpConnection:
+    """One keep-alive HTTP/1.1 connection"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        # False until a byte of the current response has been read
+        self.responded = False
+
+    async def request(self, data):
+        """Send a prepared request; returns ``(status, body, keep_alive)``"""
+        self.responded = False
+        self.writer.write(data)
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        self.responded = True
+        status = int(head[9:12])
+        lower = head.lower()
+        keep_alive = head.startswith(b'HTTP/1.1') and b'\r\nconnection: close' not in lower
+        start = lower.find(b'\r\ncontent-length:')
+        if start >= 0:
+            end = lower.index(b'\r\n', start + 2)
+            body = await self.reader.readexactly(int(lower[start + 17:end]))
+        elif b'\r\ntransfer-encoding: chunked' in lower:
+            body = await self._read_chunked()
+        else:
+            body = await self.reader.read()
+            keep_alive = False
+        return status, body, keep_alive
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            if not size:
+                await self.reader.readuntil(b'\r\n')
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+    def close(self):
+        self.writer.close()
+
+
+def stale(conn, error):
+    """True if ``error`` means ``conn`` was closed by the server before it
+    answered, so the request can be sent again on a new connection"""
+    if conn.responded:
+        return False
+    return not isinstance(error, asyncio.IncompleteReadError) or not error.partial
+
+
+class ConnectionPool:
+    """Up to ``size`` keep-alive connections to one server, reused LIFO"""
+
+    def __init__(self, base_url, size, username, password):
+        url = urlsplit(base_url)
+        if url.scheme != 'http':
+            raise ValueError('loadgen speaks plain http only')
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.prefix = url.path.rstrip('/')
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+        credentials = base64.b64encode(f'{username}:{password}'.encode()).decode()
+        self._headers = (f'Host: {url.netloc}\r\nAuthorization: Basic {credentials}\r\n'
+                         f'Accept: application/json\r\n').encode()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def prepare(self, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        head = f'{method} {self.prefix}{path} HTTP/1.1\r\n'.encode() + self._headers
+        if payload is not None:
+            head += b'Content-Type: application/json\r\n'
+        return head + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body
+
+    async def request(self, method, path, payload=None):
+        """``(status, body)``; a stale kept-alive connection is retried once"""
+        data = self.prepare(method, path, payload)
+        async with self._slots:
+            conn = self._idle.pop() if self._idle else None
+            try:
+                if conn is not None:
+                    try:
+                        status, body, keep_alive = await asyncio.wait_for(conn.request(data), REQUEST_TIMEOUT)
+                    except (TimeoutError, asyncio.TimeoutError):
+                        # A slow response is a sample, not a stale connection
+                        raise
+                    except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError) as e:
+                        if not stale(conn, e):
+                            raise
+                        # The server closed the idle connection
+                        conn.close()
+                        conn = None
+                if conn is None:
+                    conn = await self._connect()
+                    status, body, keep_alive = await asyncio.wait_for(conn.request(data), REQUEST_TIMEOUT)
+            except BaseException:
+                if conn is not None:
+                    conn.close()
+                raise
+            if keep_alive:
+                self._idle.append(conn)
+            else:
+                conn.close()
+        self.bytes_sent += len(data)
+        self.bytes_received += len(body)
+        return status, body
+
+    async def _connect(self):
+        return HttpConnection(*await asyncio.open_connection(self.host, self.port))
+
+    def close(self):
+        for conn in self._idle:
+            conn.close()
+        self._idle = []
+
+
+class Recorder:
+    """Per-process request metrics, merged across processes at the end"""
+
+    def __init__(self):
+        self.durations = Histogram()
+        self.by_name = {}
+        self.requests = 0
+        self.failed = 0
+        self.iterations = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def observe(self, name, micros, ok, expected_interval=0):
+        histogram = self.by_name.get(name)
+        if histogram is None:
+            histogram = self.by_name[name] = Histogram()
+        histogram.record_corrected(micros, expected_interval)
+        self.durations.record_corrected(micros, expected_interval)
+        self.requests += 1
+        if not ok:
+            self.failed += 1
+
+    def merge(self, other):
+        self.durations.merge(other.durations)
+        for name, histogram in other.by_name.items():
+            self.by_name.setdefault(name, Histogram()).merge(histogram)
+        self.requests += other.requests
+        self.failed += other.failed
+        self.iterations += other.iterations
+        self.bytes_sent += other.bytes_sent
+        self.bytes_received += other.bytes_received
+        return self
+
+
+class Scenario:
+    """The script.js iteration against one connection pool"""
+
+    def __init__(self, pool, recorder, think_time, bulk_size, expected_interval_ms):
+        self.pool = pool
+        self.recorder = recorder
+        self.think_time = think_time
+        self.bulk_size = bulk_size
+        self.expected_interval = expected_interval_ms * 1000
+
+    async def call(self, name, expected_status, method, path, payload=None, started=None):
+        """Time one request; ``started`` backdates it to its intended start"""
+        if started is None:
+            started = time.perf_counter()
+        try:
+            status, body = await self.pool.request(method, path, payload)
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+            status, body = 0, b''
+        self.recorder.observe(name, (time.perf_counter() - started) * 1e6, status == expected_status,
+                              self.expected_interval)
+        if status != expected_status:
+            return None
+        try:
+            return json.loads(body) if body else {}
+        except ValueError:
+            return None
+
+    async def think(self):
+        if self.think_time > 0:
+            await asyncio.sleep(self.think_time)
+
+    async def iteration(self, vu, iteration, started=None):
+        created = await self.call('create', 201, 'POST', '/notes', {
+            'title': f'Note {vu}-{iteration}',
+            'content': f'This is test note content created by virtual user {vu} in iteration {iteration}'
+        }, started)
+        note_id = created.get('id') if created else None
+        await self.think()
+        if note_id:
+            await self.call('get', 200, 'GET', f'/notes/{note_id}')
+            await self.think()
+            await self.call('update', 200, 'PUT', f'/notes/{note_id}', {
+                'title': f'Updated Note {vu}-{iteration}',
+                'content': f'Updated content for note {note_id}'
+            })
+            await self.think()
+            await self.call('list', 200, 'GET', '/notes')
+            await self.think()
+            await self.call('delete', 200, 'DELETE', f'/notes/{note_id}')
+            await self.think()
+            if self.bulk_size > 0:
+                await self.bulk(vu, iteration)
+        self.recorder.iterations += 1
+
+    async def bulk(self, vu, iteration):
+        result = await self.call('bulk_create', 200, 'POST', '/notes/_bulk', {'operations': [
+            {'op': 'create', 'title': f'Bulk Note {vu}-{iteration}-{i}',
+             'content': f'Bulk note {i} created by virtual user {vu} in iteration {iteration}'}
+            for i in range(self.bulk_size)
+        ]})
+        ids = [item['id'] for item in (result or {}).get('results', []) if item.get('status') == 201]
+        await self.think()
+        if ids:
+            await self.call('bulk_delete', 200, 'POST', '/notes/_bulk',
+                            {'operations': [{'op': 'delete', 'id': note_id} for note_id in ids]})
+            await self.think()
+
+
+async def closed_model(scenario, first_vu, vus, deadline):
+    async def vu_loop(vu):
+        iteration = 0
+        while time.perf_counter() < deadline:
+            await scenario.iteration(vu, iteration)
+            iteration += 1
+
+    await asyncio.gather(*(vu_loop(vu) for vu in range(first_vu, first_vu + vus)))
+
+
+async def open_model(scenario, rate, max_vus, start, deadline, phase, stride):
+    """Start iteration ``phase + k * stride`` at ``start + (phase + k * stride) / rate``"""
+    slots = asyncio.Semaphore(max_vus)
+    tasks = set()
+
+    async def run(number, intended):
+        try:
+            await scenario.iteration(number % max_vus + 1, number, started=intended)
+        finally:
+            slots.release()
+
+    number = phase
+    while True:
+        intended = start + number / rate
+        if intended >= deadline:
+            break
+        delay = intended - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # When every VU is busy the next iteration waits here; its latency
+        # still counts from ``intended``
+        await slots.acquire()
+        task = asyncio.create_task(run(number, intended))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        number += stride
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+def split(total, parts, index):
+    """Share ``index`` of ``total`` split as evenly as possible into ``parts``"""
+    return total // parts + (1 if index < total % parts else 0)
+
+
+async def run_process(args, index, start_at):
+    recorder = Recorder()
+    if args.rate:
+        max_vus = max(1, split(args.max_vus, args.processes, index))
+    else:
+        max_vus = split(args.vus, args.processes, index)
+    pool = ConnectionPool(args.base_url, args.connections or max_vus, API_USER, API_PASSWORD)
+    scenario = Scenario(pool, recorder, args.think_time, args.bulk_size, args.expected_interval_ms)
+
+    # Processes agree on a wall-clock start, then each works on its own clock
+    await asyncio.sleep(max(0.0, start_at - time.time()))
+    start = time.perf_counter()
+    deadline = start + args.duration
+    if args.rate:
+        await open_model(scenario, args.rate, max_vus, start, deadline, index, args.processes)
+    elif max_vus:
+        first_vu = 1 + sum(split(args.vus, args.processes, i) for i in range(index))
+        await closed_model(scenario, first_vu, max_vus, deadline)
+    pool.close()
+    recorder.bytes_sent = pool.bytes_sent
+    recorder.bytes_received = pool.bytes_received
+    return recorder
+
+
+def process_main(args, index, start_at):
+    if uvloop is not None:
+        uvloop.install()
+    return asyncio.run(run_process(args, index, start_at))
+
+
+def run(args):
+    """Run the load and return ``(merged Recorder, elapsed seconds)``"""
+    start_at = time.time() + 0.5
+    if args.processes == 1:
+        recorders = [process_main(args, 0, start_at)]
+    else:
+        with multiprocessing.Pool(args.processes) as workers:
+            recorders = workers.starmap(process_main, [(args, i, start_at) for i in range(args.processes)])
+    elapsed = time.time() - start_at
+    recorder = recorders[0]
+    for other in recorders[1:]:
+        recorder.merge(other)
+    return recorder, elapsed
+
+
+def build_summary(recorder, seconds, args):
+    """k6 ``handleSummary`` data, the shape results-viewer stores in ``k6_results``"""
+    def counter(count):
+        return {'type': 'counter', 'contains': 'default',
+                'values': {'count': count, 'rate': count / seconds if seconds else 0}}
+
+    metrics = {
+        'http_reqs': counter(recorder.requests),
+        'http_req_duration': {'type': 'trend', 'contains': 'time', 'values': recorder.durations.trend_values()},
+        # As in k6, ``passes`` counts failed requests
+        'http_req_failed': {'type': 'rate', 'contains': 'default', 'values': {
+            'rate': recorder.failed / recorder.requests if recorder.requests else 0,
+            'passes': recorder.failed, 'fails': recorder.requests - recorder.failed}},
+        'iterations': counter(recorder.iterations),
+        'data_sent': counter(recorder.bytes_sent),
+        'data_received': counter(recorder.bytes_received),
+        'vus_max': {'type': 'gauge', 'contains': 'default', 'values': {
+            'value': args.max_vus if args.rate else args.vus}},
+    }
+    for name, histogram in sorted(recorder.by_name.items()):
+        metrics[f'http_req_duration{{name:{name}}}'] = {
+            'type': 'trend', 'contains': 'time', 'values': histogram.trend_values()}
+    for metric, limits in THRESHOLDS.items():
+        values = metrics[metric]['values']
+        metrics[metric]['thresholds'] = {f'{stat}<{limit:g}': {'ok': values[stat] < limit}
+                                         for stat, limit in limits}
+    return {
+        'metrics': metrics,
+        'state': {'testRunDurationMs': seconds * 1000, 'isStdOutTTY': sys.stdout.isatty()},
+        'options': {
+            'executor': 'constant-arrival-rate' if args.rate else 'constant-vus',
+            'rate': args.rate, 'vus': args.vus, 'maxVUs': args.max_vus, 'duration': f'{args.duration:g}s',
+            'thinkTime': args.think_time, 'bulkSize': args.bulk_size, 'processes': args.processes,
+            'expectedIntervalMs': args.expected_interval_ms,
+        },
+        'generator': 'loadgen.py',
+        'time': datetime.utcnow().isoformat() + 'Z'
+    }
+
+
+def print_summary(summary):
+    metrics = summary['metrics']
+    print()
+    for name, metric in metrics.items():
+        values = metric['values']
+        if metric['type'] == 'trend':
+            text = ' '.join(f'{key}={values[key]:.2f}ms' for key in ('avg', 'min', 'med', 'max', 'p(90)', 'p(95)', 'p(99)'))
+        elif metric['type'] == 'counter':
+            text = f"{values['count']} {values['rate']:.1f}/s"
+        elif metric['type'] == 'rate':
+            text = f"{values['rate'] * 100:.2f}% ({values['passes']} of {values['passes'] + values['fails']})"
+        else:
+            text = str(values['value'])
+        marks = ''.join(' ✓' if result['ok'] else ' ✗' for result in metric.get('thresholds', {}).values())
+        print(f'  {name + marks:.<48} {text}')
+    print()
+
+
+def post_results(summary, results_url, test_id):
+    url = f"{results_url.rstrip('/')}/api/results"
+    if test_id:
+        url += f'?test_id={quote(test_id)}'
+    request = urllib.request.Request(url, data=json.dumps(summary).encode(),
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default=BASE_URL)
+    model = parser.add_mutually_exclusive_group()
+    model.add_argument('--vus', type=int, default=10, help='closed model: virtual users (default)')
+    model.add_argument('--rate', type=float, help='open model: iterations started per second')
+    parser.add_argument('--max-vus', type=int, default=100, help='open model: iterations in flight at most')
+    parser.add_argument('--duration', type=float, default=10, help='seconds')
+    parser.add_argument('--think-time', type=float, default=THINK_TIME, help='seconds between requests')
+    parser.add_argument('--bulk-size', type=int, default=BULK_SIZE)
+    parser.add_argument('--expected-interval-ms', type=float, default=0,
+                        help='closed model: back-fill samples for stalls longer than this')
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--connections', type=int, default=0,
+                        help='keep-alive connections per process (default: one per VU)')
+    parser.add_argument('--summary-export', help='write the summary JSON to this file')
+    parser.add_argument('--results-url', help='results-viewer URL to POST the summary to')
+    parser.add_argument('--test-id', help='test_id of the run in results-viewer')
+    args = parser.parse_args(argv)
+    if args.processes < 1 or args.duration <= 0 or (args.rate is not None and args.rate <= 0):
+        parser.error('--processes, --duration and --rate must be positive')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    model = f'{args.rate:g} iterations/s, up to {args.max_vus} VUs' if args.rate else f'{args.vus} VUs'
+    print(f'loadgen: {model} for {args.duration:g}s against {args.base_url} '
+          f'({args.processes} process{"es" if args.processes > 1 else ""})')
+    recorder, elapsed = run(args)
+    summary = build_summary(recorder, elapsed, args)
+    print_summary(summary)
+
+    if args.summary_export:
+        with open(args.summary_export, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if args.results_url:
+        stored = post_results(summary, args.results_url, args.test_id)
+        print(f"Stored as {stored['test_id']} ({args.results_url.rstrip('/')}/view/{stored['id']})")
+
+    crossed = [name for name, metric in summary['metrics'].items()
+               for result in metric.get('thresholds', {}).values() if not result['ok']]
+    return THRESHOLDS_FAILED_EXIT if crossed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -78,16 +78,22 @@ export class NotesApiClient {
   }
 
   /**
-   * Lists all notes
-   * @returns {array} - Array of notes
+   * Lists a page of notes
+   * @param {number} [limit] - Page size (server default if omitted)
+   * @param {string} [after] - Cursor returned as `next` by the previous page
+   * @returns {object|null} - Page object ({ notes, next }) if successful, null otherwise
    */
-  listNotes() {
-    const res = http.get(`${this.baseUrl}/notes`, this.authParams);
+  listNotes(limit, after) {
+    const params = [];
+    if (limit) params.push(`limit=${limit}`);
+    if (after) params.push(`after=${after}`);
+    const query = params.length ? `?${params.join('&')}` : '';
+    const res = http.get(`${this.baseUrl}/notes${query}`, this.authParams);
     const body = parseBody(res);
 
     check(res, {
       'list notes status is 200': (r) => r.status === 200,
-      'list notes returns array': () => Array.isArray(body),
+      'list notes returns array': () => Array.isArray(body?.notes),
     });
 
     return body;
@@ -107,4 +113,44 @@ export class NotesApiClient {
 
     return success;
   }
+
+  /**
+   * Applies a batch of create/update/delete operations in one request
+   * @param {array} operations - Items like { op: 'create', title, content },
+   *   { op: 'update', id, title, content } or { op: 'delete', id }
+   * @returns {array|null} - Per-operation results if successful, null otherwise
+   */
+  bulk(operations) {
+    const res = http.post(`${this.baseUrl}/notes/_bulk`, JSON.stringify({ operations }), this.authParams);
+    const body = parseBody(res);
+
+    if (!check(res, {
+      'bulk status is 200': (r) => r.status === 200,
+      'bulk has no item errors': () => body?.errors === 0,
+    })) {
+      console.error(`Bulk request failed: ${res.status} - ${res.body}`);
+    }
+
+    return body?.results ?? null;
+  }
+
+  /**
+   * Creates several notes in one request
+   * @param {array} notes - Array of { title, content }
+   * @returns {array} - IDs of the notes that were created
+   */
+  bulkCreateNotes(notes) {
+    const results = this.bulk(notes.map((note) => ({ op: 'create', ...note })));
+    return (results || []).filter((r) => r.status === 201).map((r) => r.id);
+  }
+
+  /**
+   * Deletes several notes in one request
+   * @param {array} noteIds - Note IDs
+   * @returns {boolean} - True if every note was deleted
+   */
+  bulkDeleteNotes(noteIds) {
+    const results = this.bulk(noteIds.map((id) => ({ op: 'delete', id })));
+    return results !== null && results.every((r) => r.status === 200);
+  }
 }
@@ -8,6 +8,7 @@ const BASE_URL = __ENV.BASE_URL || 'http://localhost:5000';
 const API_USER = __ENV.API_USER || 'admin';
 const API_PASSWORD = __ENV.API_PASSWORD || 'password';
 const THINK_TIME = parseFloat(__ENV.THINK_TIME || '1');
+const BULK_SIZE = parseInt(__ENV.BULK_SIZE || '0', 10); // notes per bulk request, 0 disables the bulk step
 
 export const options = {
   stages: [
@@ -53,6 +54,24 @@ export default function () {
   // Delete the note
   apiClient.deleteNote(noteId);
   sleep(THINK_TIME);
+
+  // Bulk create and delete a batch of notes
+  if (BULK_SIZE > 0) {
+    const batch = [];
+    for (let i = 0; i < BULK_SIZE; i++) {
+      batch.push({
+        title: `Bulk Note ${__VU}-${__ITER}-${i}`,
+        content: `Bulk note ${i} created by virtual user ${__VU} in iteration ${__ITER}`,
+      });
+    }
+    const bulkIds = apiClient.bulkCreateNotes(batch);
+    sleep(THINK_TIME);
+
+    if (bulkIds.length > 0) {
+      apiClient.bulkDeleteNotes(bulkIds);
+      sleep(THINK_TIME);
+    }
+  }
 }
 
 // Results handler
@@ -1,44 +1,157 @@
-from flask import Flask, render_template_string, jsonify
-from pymongo import MongoClient
+from flask import Flask, Response, jsonify, request
+from werkzeug.exceptions import HTTPException
+from pymongo import MongoClient, UpdateOne
 from pymongo.errors import PyMongoError
 import os
+import base64
+import binascii
+import sys
 import json
-from datetime import datetime
+import hashlib
+import threading
+import zlib
+from datetime import datetime, timedelta, timezone
 from bson import ObjectId
 from bson.errors import InvalidId
 
+try:
+    import zstandard
+except ImportError:
+    # zstd downloads are offered only when the package is installed
+    zstandard = None
+
+# Modules shared with notes-server sit next to this file in the image and
+# in ../common in a checkout
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+from metrics import instrument_flask, serialization
+from mongo import MONGO_MIN_POOL_SIZE, client_options
+from ingest import BodyTooLarge, IngestError, ingest, iter_lines
+from trends import REGRESSION_THRESHOLD, TREND_MAX_RUNS, TREND_RUNS, compute_trends
+from retention import EXPIRE_FIELD, Compactor
+
 app = Flask(__name__)
+# Request latency/in-flight metrics and GET /metrics
+instrument_flask(app)
 
 # MongoDB connection for test results
 MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017/')
 DB_NAME = os.getenv('DB_NAME', 'notes_db')
 RESULTS_COLLECTION_NAME = 'k6_results'
+# Per-run time buckets written by POST /api/results (see ingest.py)
+SERIES_COLLECTION_NAME = 'k6_series'
 PORT = int(os.getenv('PORT', 8080))
 
-# Connect to MongoDB
-try:
-    client = MongoClient(MONGO_URL)
-    db = client[DB_NAME]
-    results_collection = db[RESULTS_COLLECTION_NAME]
-    # Create index if it doesn't exist
-    results_collection.create_index('timestamp', background=True)
-except PyMongoError as e:
-    print(f"Warning: Could not connect to MongoDB: {e}")
-    results_collection = None
+# The list views only read these fields. ``viewer_summary`` is materialized
+# from the k6 ``metrics`` tree when the result is stored; results saved before
+# it existed get theirs from backfill_summaries.py, or on first read by a list
+# view (find_summaries). It is never part of a viewed or downloaded document.
+SUMMARY_FIELD = 'viewer_summary'
+SUMMARY_PROJECTION = {'test_id': 1, 'timestamp': 1, SUMMARY_FIELD: 1}
+
+# Downloads: JSON layouts (?format=), streamed in chunks of this many bytes
+DOWNLOAD_FORMATS = {
+    'pretty': {'indent': 2},
+    'compact': {'separators': (',', ':')}
+}
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+DOWNLOAD_ENCODINGS = ['zstd', 'gzip'] if zstandard is not None else ['gzip']
+
+# Detail tree: children returned per /api/results/<id>/node request
+NODE_PAGE_SIZE = 200
+NODE_MAX_PAGE_SIZE = 1000
+
+# Keyset pagination for /api/results, newest first on (timestamp, _id)
+RESULTS_SORT = [('timestamp', -1), ('_id', -1)]
+# Timestamp types in RESULTS_SORT order: (query matching the type, test)
+TIMESTAMP_TYPES = [
+    ({'timestamp': {'$type': 'date'}}, lambda value: isinstance(value, datetime)),
+    ({'timestamp': {'$type': 'string'}}, lambda value: isinstance(value, str)),
+    ({'timestamp': {'$type': 'number'}},
+     lambda value: isinstance(value, (int, float)) and not isinstance(value, bool)),
+    ({'timestamp': None}, lambda value: value is None),
+]
+DEFAULT_PAGE_SIZE = int(os.getenv('RESULTS_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.getenv('RESULTS_MAX_PAGE_SIZE', 1000))
+
+# The MongoDB client is created lazily, once per process. A client must not
+# be shared across fork(), so pre-fork servers (gunicorn) get a fresh one in
+# every worker; see get_results_collection().
+results_collection = None
+collection_pid = None
+collection_lock = threading.Lock()
+
+# Set once this process has opened MONGO_MIN_POOL_SIZE connections
+pool_ready = threading.Event()
+pool_warmup_thread = None
+
+# (ETag, HTML) of the last index page this process rendered; see index()
+index_cache = (None, None)
+# (ETag, trends) per (test_id, runs, threshold); see cached_trends()
+trends_cache = {}
+TRENDS_CACHE_SIZE = 100
 
 def get_results_collection():
-    """Get or create the results collection"""
-    global results_collection
-    if results_collection is None:
-        try:
-            client = MongoClient(MONGO_URL)
-            db = client[DB_NAME]
-            results_collection = db[RESULTS_COLLECTION_NAME]
-            results_collection.create_index('timestamp', background=True)
-        except PyMongoError as e:
-            raise Exception(f"Database connection failed: {e}")
+    """Get the results collection, creating this process's MongoDB client on first use"""
+    global results_collection, collection_pid
+    pid = os.getpid()
+    if results_collection is None or collection_pid != pid:
+        with collection_lock:
+            if results_collection is None or collection_pid != pid:
+                try:
+                    # Pool, timeouts and wire compression: see common/mongo.py
+                    client = MongoClient(MONGO_URL, **client_options())
+                    db = client[DB_NAME]
+                    collection = db[RESULTS_COLLECTION_NAME]
+                    # Create index if it doesn't exist; serves timestamp
+                    # ranges and the (timestamp, _id) page order
+                    collection.create_index(RESULTS_SORT, background=True)
+                    db[SERIES_COLLECTION_NAME].create_index([('run_id', 1), ('start', 1)], background=True)
+                    # Compacted results and their series expire at
+                    # ``expire_at`` (see retention.py)
+                    collection.create_index(EXPIRE_FIELD, expireAfterSeconds=0, background=True)
+                    db[SERIES_COLLECTION_NAME].create_index(EXPIRE_FIELD, expireAfterSeconds=0, background=True)
+                except PyMongoError as e:
+                    raise Exception(f"Database connection failed: {e}")
+                results_collection = collection
+                collection_pid = pid
+                pool_ready.clear()
     return results_collection
 
+def get_series_collection():
+    return get_results_collection().database[SERIES_COLLECTION_NAME]
+
+def discard_series(run_id):
+    """Delete the series of a run whose result was not stored"""
+    try:
+        get_series_collection().delete_many({'run_id': run_id})
+    except Exception as e:
+        print(f"Warning: Could not delete series of run {run_id}: {e}")
+
+def warm_pool():
+    """Open MONGO_MIN_POOL_SIZE connections by running that many pings at once"""
+    try:
+        db = get_results_collection().database
+        threads = [threading.Thread(target=db.command, args=('ping',))
+                   for _ in range(max(1, MONGO_MIN_POOL_SIZE))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        db.command('ping')
+        pool_ready.set()
+    except Exception as e:
+        print(f"Warning: Could not warm MongoDB pool: {e}")
+
+def start_pool_warmup():
+    """Warm this process's pool in the background (no-op if done or running)"""
+    global pool_warmup_thread
+    if pool_ready.is_set() and collection_pid == os.getpid():
+        return
+    if pool_warmup_thread is not None and pool_warmup_thread.is_alive():
+        return
+    pool_warmup_thread = threading.Thread(target=warm_pool, daemon=True)
+    pool_warmup_thread.start()
+
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="en">
@@ -167,6 +280,7 @@ HTML_TEMPLATE = """
 <body>
     <div class="container">
         <div class="refresh-btn">
+            <a href="/trends" class="btn btn-primary">📈 Trends</a>
             <a href="/" class="btn btn-primary">🔄 Refresh</a>
         </div>
         <h1>📊 K6 Performance Test Results</h1>
@@ -257,15 +371,28 @@ DETAIL_TEMPLATE = """
             text-decoration: none;
             border-radius: 4px;
         }
-        pre {
+        .tree {
             background: #2c3e50;
             color: #ecf0f1;
             padding: 20px;
             border-radius: 6px;
             overflow-x: auto;
+            font-family: Menlo, Consolas, monospace;
             font-size: 14px;
             line-height: 1.6;
         }
+        .tree ul { list-style: none; padding-left: 20px; }
+        .tree > ul { padding-left: 0; }
+        .toggle { cursor: pointer; user-select: none; }
+        .toggle::before { content: '▸ '; color: #95a5a6; }
+        .toggle.open::before { content: '▾ '; }
+        .key { color: #8ecae6; }
+        .string { color: #a8e6a1; }
+        .number { color: #f4d35e; }
+        .literal { color: #f28482; }
+        .count { color: #95a5a6; }
+        .more { cursor: pointer; color: #3498db; }
+        .error { color: #f28482; }
     </style>
 </head>
 <body>
@@ -274,32 +401,503 @@ DETAIL_TEMPLATE = """
             <h1>📄 {{ filename }}</h1>
             <a href="/" class="back-btn">← Back to List</a>
         </div>
-        <pre id="json-content">{{ json_data }}</pre>
+        <div class="tree" id="tree"></div>
     </div>
     <script>
-        // Pretty print JSON
-        try {
-            const data = JSON.parse(document.getElementById('json-content').textContent);
-            document.getElementById('json-content').textContent = JSON.stringify(data, null, 2);
-        } catch (e) {
-            // Already formatted or invalid JSON
+        // Each level is fetched from the node API the first time it is expanded
+        const nodeUrl = {{ node_url|tojson }};
+
+        function pointer(parent, key) {
+            return parent + '/' + key.replace(/~/g, '~0').replace(/\\//g, '~1');
         }
+
+        async function fetchNode(path, offset) {
+            const response = await fetch(nodeUrl + '?path=' + encodeURIComponent(path) + '&offset=' + offset);
+            const body = await response.json();
+            if (!response.ok) throw new Error(body.error || response.statusText);
+            return body;
+        }
+
+        function scalar(node) {
+            const span = document.createElement('span');
+            if (node.type === 'string') {
+                span.className = 'string';
+                span.textContent = JSON.stringify(node.value);
+            } else if (['bool', 'null'].includes(node.type)) {
+                span.className = 'literal';
+                span.textContent = JSON.stringify(node.value);
+            } else if (['int', 'long', 'double', 'decimal'].includes(node.type)) {
+                span.className = 'number';
+                span.textContent = node.value;
+            } else {
+                span.className = 'string';
+                span.textContent = String(node.value);
+            }
+            return span;
+        }
+
+        function appendChildren(list, path, node) {
+            for (const child of node.children) {
+                list.appendChild(renderNode(pointer(path, child.key), child));
+            }
+            const shown = node.offset + node.children.length;
+            if (shown < node.size) {
+                const more = document.createElement('li');
+                more.className = 'more';
+                more.textContent = '… ' + (node.size - shown) + ' more';
+                more.onclick = async () => {
+                    more.textContent = 'loading…';
+                    try {
+                        const page = await fetchNode(path, shown);
+                        more.remove();
+                        appendChildren(list, path, page);
+                    } catch (e) {
+                        more.textContent = e.message;
+                    }
+                };
+                list.appendChild(more);
+            }
+        }
+
+        function renderNode(path, node) {
+            const item = document.createElement('li');
+            const label = document.createElement('span');
+            if (node.key !== undefined) {
+                const key = document.createElement('span');
+                key.className = 'key';
+                key.textContent = JSON.stringify(node.key) + ': ';
+                label.appendChild(key);
+            }
+            item.appendChild(label);
+            if (node.type !== 'object' && node.type !== 'array') {
+                label.appendChild(scalar(node));
+                return item;
+            }
+            const count = document.createElement('span');
+            count.className = 'count';
+            count.textContent = node.type === 'array' ? '[' + node.size + ']' : '{' + node.size + '}';
+            label.appendChild(count);
+            if (!node.size) return item;
+
+            label.classList.add('toggle');
+            const list = document.createElement('ul');
+            list.hidden = true;
+            item.appendChild(list);
+            let loaded = false;
+            label.onclick = async () => {
+                if (!loaded) {
+                    loaded = true;
+                    try {
+                        appendChildren(list, path, node.children ? node : await fetchNode(path, 0));
+                    } catch (e) {
+                        loaded = false;
+                        list.innerHTML = '<li class="error"></li>';
+                        list.firstChild.textContent = e.message;
+                    }
+                }
+                list.hidden = !list.hidden;
+                label.classList.toggle('open', !list.hidden);
+            };
+            return item;
+        }
+
+        (async () => {
+            const tree = document.getElementById('tree');
+            try {
+                const root = await fetchNode('', 0);
+                const list = document.createElement('ul');
+                const item = renderNode('', root);
+                list.appendChild(item);
+                tree.appendChild(list);
+                item.firstChild.click();
+            } catch (e) {
+                tree.innerHTML = '<span class="error"></span>';
+                tree.firstChild.textContent = 'Error loading result: ' + e.message;
+            }
+        })();
     </script>
 </body>
 </html>
 """
 
+TRENDS_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>K6 Performance Trends</title>
+    <style>
+        * { margin: 0; padding: 0; box-sizing: border-box; }
+        body {
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, Cantarell, sans-serif;
+            background: #f5f5f5;
+            padding: 20px;
+            color: #333;
+        }
+        .container {
+            max-width: 1200px;
+            margin: 0 auto;
+            background: white;
+            border-radius: 8px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+            padding: 30px;
+        }
+        .header {
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+            margin-bottom: 30px;
+            border-bottom: 3px solid #3498db;
+            padding-bottom: 10px;
+        }
+        h1 { color: #2c3e50; }
+        h2 { color: #2c3e50; font-size: 18px; margin: 25px 0 10px; }
+        .back-btn {
+            padding: 10px 20px;
+            background: #3498db;
+            color: white;
+            text-decoration: none;
+            border-radius: 4px;
+        }
+        .note { color: #6c757d; font-size: 14px; }
+        table { width: 100%; border-collapse: collapse; font-size: 14px; }
+        th, td { padding: 8px 10px; border-bottom: 1px solid #dee2e6; text-align: right; }
+        th:first-child, td:first-child { text-align: left; }
+        th { color: #6c757d; font-size: 12px; text-transform: uppercase; }
+        tr.regressed { background: #fdecea; }
+        .flag { color: #c0392b; font-weight: 600; }
+        .badge { color: white; background: #c0392b; border-radius: 4px; padding: 2px 8px; font-size: 12px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>📈 K6 Performance Trends</h1>
+            <a href="/" class="back-btn">← Back to List</a>
+        </div>
+        <p class="note">Last {{ trends.runs }} runs per test. A run is flagged when its p95 rises, or its
+        throughput falls, more than {{ trends.threshold }}% from the median of the older runs shown.</p>
+        {% for test in trends.tests %}
+        <h2>{{ test.test_id }} {% if test.regressed %}<span class="badge">regressed</span>{% endif %}</h2>
+        <table>
+            <tr><th>Run</th><th>p50 ms</th><th>p95 ms</th><th>p99 ms</th><th>p95 Δ</th><th>req/s</th><th>req/s Δ</th><th>Errors</th></tr>
+            {% for run in test.runs %}
+            <tr class="{{ 'regressed' if run.regressions }}">
+                <td><a href="/view/{{ run.id }}">{{ (run.date or '')[:19]|replace('T', ' ') }}</a></td>
+                <td>{{ '%.1f'|format(run.p50) if run.p50 is not none else 'N/A' }}</td>
+                <td>{{ '%.1f'|format(run.p95) if run.p95 is not none else 'N/A' }}</td>
+                <td>{{ '%.1f'|format(run.p99) if run.p99 is not none else 'N/A' }}</td>
+                <td class="{{ 'flag' if 'p95' in run.regressions }}">{{ '%+.1f%%'|format(run.p95_change) if run.p95_change is not none else '' }}</td>
+                <td>{{ '%.1f'|format(run.rps) if run.rps is not none else 'N/A' }}</td>
+                <td class="{{ 'flag' if 'rps' in run.regressions }}">{{ '%+.1f%%'|format(run.rps_change) if run.rps_change is not none else '' }}</td>
+                <td>{{ '%.2f%%'|format(run.error_rate) if run.error_rate is not none else 'N/A' }}</td>
+            </tr>
+            {% endfor %}
+        </table>
+        {% else %}
+        <p class="note">No test results found.</p>
+        {% endfor %}
+    </div>
+</body>
+</html>
+"""
+
+# Compiled once; render_template_string would recompile on every request
+HTML_PAGE = app.jinja_env.from_string(HTML_TEMPLATE)
+DETAIL_PAGE = app.jinja_env.from_string(DETAIL_TEMPLATE)
+TRENDS_PAGE = app.jinja_env.from_string(TRENDS_TEMPLATE)
+
+def producer_metrics(summary):
+    """Headline metrics of a producer-written ``summary``, missing ones as 0"""
+    return {key: summary.get(key, 0) for key in ('http_reqs', 'avg_duration', 'p95_duration', 'error_rate')}
+
+def summarize_result(result_doc):
+    """Compact summary of a k6 result.
+
+    Holds the headline metrics, the JSON size reported by /api/results,
+    the byte length of each download format (for Range requests) and a
+    digest of the content (for ETags).
+    """
+    summary = {}
+    m = result_doc.get('metrics')
+    if isinstance(result_doc.get('summary'), dict):
+        # Summary written by the producer; it wins over the metrics tree
+        summary = producer_metrics(result_doc['summary'])
+    elif isinstance(m, dict):
+        if 'http_reqs' in m and 'values' in m['http_reqs']:
+            summary['http_reqs'] = int(m['http_reqs']['values'].get('count', 0))
+        if 'http_req_duration' in m and 'values' in m['http_req_duration']:
+            values = m['http_req_duration']['values']
+            summary['avg_duration'] = values.get('avg', 0)
+            summary['p95_duration'] = values.get('p(95)', 0)
+        if 'http_req_failed' in m and 'values' in m['http_req_failed']:
+            summary['error_rate'] = m['http_req_failed']['values'].get('rate', 0) * 100
+    stored = {key: value for key, value in result_doc.items() if key != SUMMARY_FIELD}
+    summary['size'] = len(json.dumps(stored, default=str))
+    encoded = {fmt: json.dumps(stored, default=str, **options).encode('utf-8')
+               for fmt, options in DOWNLOAD_FORMATS.items()}
+    summary['lengths'] = {fmt: len(body) for fmt, body in encoded.items()}
+    summary['digest'] = hashlib.sha1(encoded['compact']).hexdigest()
+    return summary
+
+def store_summaries(collection, docs):
+    """Compute and save the summary of full result documents, in place"""
+    for doc in docs:
+        doc[SUMMARY_FIELD] = summarize_result(doc)
+    collection.bulk_write([UpdateOne({'_id': doc['_id']}, {'$set': {SUMMARY_FIELD: doc[SUMMARY_FIELD]}})
+                           for doc in docs], ordered=False)
+
+# Compacts old results in the background; see retention.py
+compactor = Compactor(get_results_collection, get_series_collection, summarize_result, SUMMARY_FIELD)
+
+def start_retention():
+    """Start this process's compaction loop (no-op if disabled or running)"""
+    compactor.start()
+
+def encode_chunks(doc, fmt):
+    """Yield the JSON of ``doc`` as UTF-8 chunks of about DOWNLOAD_CHUNK_BYTES"""
+    encoder = json.JSONEncoder(default=str, **DOWNLOAD_FORMATS[fmt])
+    buffer, size = [], 0
+    for piece in encoder.iterencode(doc):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= DOWNLOAD_CHUNK_BYTES:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+def compress_chunks(chunks, encoding):
+    """Compress a chunk stream with ``gzip`` or ``zstd`` as it is produced"""
+    if encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def parse_json_pointer(pointer):
+    """Split an RFC 6901 JSON pointer (``/metrics/http_reqs``) into its keys.
+
+    ``''`` is the whole document. Raises ValueError for anything else that
+    does not start with ``/``.
+    """
+    if pointer == '':
+        return []
+    if not pointer.startswith('/'):
+        raise ValueError('path must be a JSON pointer starting with /')
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+def node_expression(tokens):
+    """Aggregation expression for the value at ``tokens`` in the result.
+
+    Keys are read with ``$getField`` so k6 metric names containing dots or
+    braces work; numeric tokens also index into arrays. A path that does
+    not exist evaluates to missing.
+    """
+    expr = {'$unsetField': {'field': SUMMARY_FIELD, 'input': '$$ROOT'}}
+    for token in tokens:
+        by_key = {'$cond': [{'$eq': [{'$type': '$$parent'}, 'object']},
+                            {'$getField': {'field': {'$literal': token}, 'input': '$$parent'}},
+                            '$$REMOVE']}
+        if token.isdigit() and (token == '0' or not token.startswith('0')):
+            step = {'$cond': [{'$isArray': '$$parent'}, {'$arrayElemAt': ['$$parent', int(token)]}, by_key]}
+        else:
+            step = by_key
+        expr = {'$let': {'vars': {'parent': expr}, 'in': step}}
+    return expr
+
+def describe_value(value, key=None, children=None):
+    """Expression describing one value without its contents.
+
+    Gives its BSON ``type``, the ``value`` itself for scalars and the
+    number of entries as ``size`` for objects and arrays. ``children`` is
+    the ``(offset, limit)`` window of entries to describe one level down.
+    """
+    node_type = {'$type': '$$value'}
+    described = {
+        'type': node_type,
+        'value': {'$cond': [{'$in': [node_type, ['object', 'array', 'missing']]}, '$$REMOVE', '$$value']},
+        'size': {'$switch': {'branches': [
+            {'case': {'$eq': [node_type, 'object']}, 'then': {'$size': {'$objectToArray': '$$value'}}},
+            {'case': {'$isArray': '$$value'}, 'then': {'$size': '$$value'}}
+        ], 'default': '$$REMOVE'}}
+    }
+    if key is not None:
+        described['key'] = key
+    if children is not None:
+        offset, limit = children
+        described['children'] = {'$switch': {'branches': [
+            {'case': {'$eq': [node_type, 'object']}, 'then': {'$map': {
+                'input': {'$slice': [{'$objectToArray': '$$value'}, offset, limit]},
+                'as': 'entry',
+                'in': describe_value('$$entry.v', key='$$entry.k')}}},
+            {'case': {'$isArray': '$$value'}, 'then': {'$map': {
+                'input': {'$range': [offset, {'$min': [{'$size': '$$value'}, offset + limit]}]},
+                'as': 'index',
+                'in': describe_value({'$arrayElemAt': ['$$value', '$$index']}, key={'$toString': '$$index'})}}}
+        ], 'default': '$$REMOVE'}}
+    return {'$let': {'vars': {'value': value}, 'in': described}}
+
+def node_pipeline(result_oid, tokens, offset, limit):
+    """Pipeline returning one node of a result and its direct children only"""
+    return [
+        {'$match': {'_id': result_oid}},
+        {'$project': {'_id': 0, 'node': describe_value(node_expression(tokens), children=(offset, limit))}}
+    ]
+
+def results_cursor(timestamp, object_id):
+    """Opaque page cursor: ``<timestamp>-<object id>`` of the last result.
+
+    A datetime is written as epoch ms. Older producers stored strings or
+    numbers, or no timestamp at all; those get a type prefix so paging
+    goes on through them.
+    """
+    if isinstance(timestamp, datetime):
+        value = str((timestamp - datetime(1970, 1, 1)) // timedelta(milliseconds=1))
+    elif isinstance(timestamp, str):
+        value = 's' + base64.urlsafe_b64encode(timestamp.encode('utf-8')).decode('ascii').rstrip('=')
+    elif isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        value = f'n{timestamp!r}'
+    else:
+        value = 'z'
+    return f'{value}-{object_id}'
+
+def parse_results_cursor(after):
+    """``(timestamp, object id)`` of a results_cursor(); raises ValueError"""
+    try:
+        value, object_id = after.rsplit('-', 1)
+        object_id = ObjectId(object_id)
+        if value == 'z':
+            return None, object_id
+        if value.startswith('s'):
+            encoded = value[1:] + '=' * (-len(value[1:]) % 4)
+            return base64.urlsafe_b64decode(encoded).decode('utf-8'), object_id
+        if value.startswith('n'):
+            number = value[1:]
+            return (int(number) if number.lstrip('-').isdigit() else float(number)), object_id
+        return datetime(1970, 1, 1) + timedelta(milliseconds=int(value)), object_id
+    except (ValueError, InvalidId, binascii.Error, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+def results_position(timestamp, object_id):
+    """Query for the results after (timestamp, object_id) in RESULTS_SORT order.
+
+    MongoDB sorts timestamps of different types by type (dates, then
+    strings, numbers and null or missing ones) and ``$lt`` only compares
+    values of one type, so every later type is added whole.
+    """
+    rank = next(i for i, (_, matches) in enumerate(TIMESTAMP_TYPES) if matches(timestamp))
+    clauses = [] if timestamp is None else [{'timestamp': {'$lt': timestamp}}]
+    clauses.append({'timestamp': timestamp, '_id': {'$lt': object_id}})
+    clauses += [query for query, _ in TIMESTAMP_TYPES[rank + 1:]]
+    return {'$or': clauses}
+
+def parse_results_args(args):
+    """Parse ``limit``, ``after``, ``from`` and ``to`` for /api/results.
+
+    Returns ``(query, limit)``. ``from``/``to`` are ISO 8601 UTC times
+    (``from`` inclusive, ``to`` exclusive). Raises ValueError with a
+    client-facing message on bad input.
+    """
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    bounds = {}
+    for name, operator in (('from', '$gte'), ('to', '$lt')):
+        if args.get(name):
+            try:
+                value = datetime.fromisoformat(args[name].replace('Z', '+00:00'))
+            except ValueError:
+                raise ValueError(f'{name} must be an ISO 8601 date or time')
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            bounds[operator] = value
+    query = {'timestamp': bounds} if bounds else {}
+
+    after = args.get('after')
+    if after:
+        position = results_position(*parse_results_cursor(after))
+        query = {'$and': [query, position]} if query else position
+    return query, limit
+
+def index_etag(collection):
+    """ETag for the index page: changes whenever a result is added or removed.
+
+    Made from the newest result's (timestamp, _id), found through the
+    sort index, and the collection's metadata count.
+    """
+    newest = collection.find_one({}, {'timestamp': 1}, sort=RESULTS_SORT)
+    count = collection.estimated_document_count()
+    marker = f"{newest.get('timestamp')}|{newest['_id']}|{count}" if newest else 'empty'
+    return hashlib.sha1(marker.encode()).hexdigest()[:20]
+
+def parse_trend_args(args):
+    """``(test_id, runs, threshold)`` from /trends and /api/trends query args"""
+    runs = int(args.get('runs', TREND_RUNS))
+    if not 1 <= runs <= TREND_MAX_RUNS:
+        raise ValueError(f'runs must be between 1 and {TREND_MAX_RUNS}')
+    threshold = float(args.get('threshold', REGRESSION_THRESHOLD))
+    if not threshold >= 0:
+        raise ValueError('threshold must be a percentage >= 0')
+    return args.get('test_id') or None, runs, threshold
+
+def cached_trends(collection, test_id, runs, threshold):
+    """``(ETag, trends)``, recomputed only when index_etag() changes"""
+    etag = index_etag(collection)
+    key = (test_id, runs, threshold)
+    cached = trends_cache.get(key)
+    if cached is not None and cached[0] == etag:
+        return cached
+    trends = compute_trends(collection, get_series_collection(), runs, threshold, test_id)
+    if len(trends_cache) >= TRENDS_CACHE_SIZE:
+        trends_cache.clear()
+    trends_cache[key] = (etag, trends)
+    return etag, trends
+
+def find_summaries(collection, query=None, limit=100):
+    """Newest results matching ``query``, with only the fields the list views need.
+
+    Results without a materialized summary are read in full once, in one
+    query, and get theirs stored.
+    """
+    docs = list(collection.find(query or {}, SUMMARY_PROJECTION).sort(RESULTS_SORT).limit(limit))
+    missing = [doc['_id'] for doc in docs if SUMMARY_FIELD not in doc]
+    if missing:
+        full_docs = list(collection.find({'_id': {'$in': missing}}))
+        store_summaries(collection, full_docs)
+        summaries = {doc['_id']: doc[SUMMARY_FIELD] for doc in full_docs}
+        for doc in docs:
+            if doc['_id'] in summaries:
+                doc[SUMMARY_FIELD] = summaries[doc['_id']]
+    return docs
+
 def extract_metrics(result_doc):
     """Extract key metrics from test result document"""
     metrics = {}
     
-    # Try to get from summary first (pre-computed)
-    if 'summary' in result_doc:
-        summary = result_doc['summary']
-        metrics['http_reqs'] = summary.get('http_reqs', 0)
-        metrics['avg_duration'] = int(summary.get('avg_duration', 0))
-        metrics['p95_duration'] = int(summary.get('p95_duration', 0))
-        metrics['error_rate'] = f"{summary.get('error_rate', 0):.2f}"
+    # Try to get from summary first (materialized, or written by the producer)
+    summary = result_doc.get(SUMMARY_FIELD)
+    if summary is None and isinstance(result_doc.get('summary'), dict):
+        summary = producer_metrics(result_doc['summary'])
+    if summary is not None:
+        if 'http_reqs' in summary:
+            metrics['http_reqs'] = summary['http_reqs']
+        if 'avg_duration' in summary:
+            metrics['avg_duration'] = int(summary['avg_duration'])
+        if 'p95_duration' in summary:
+            metrics['p95_duration'] = int(summary['p95_duration'])
+        if 'error_rate' in summary:
+            metrics['error_rate'] = f"{summary['error_rate']:.2f}"
     # Fallback to extracting from metrics
     elif 'metrics' in result_doc:
         m = result_doc['metrics']
@@ -315,120 +913,346 @@ def extract_metrics(result_doc):
     
     return metrics
 
+@app.route('/ready')
+def ready():
+    """Readiness check: 200 once this worker's MongoDB pool is warm"""
+    if pool_ready.is_set() and collection_pid == os.getpid():
+        return jsonify({'status': 'ready', 'pid': os.getpid()}), 200
+    start_pool_warmup()
+    return jsonify({'status': 'warming', 'pid': os.getpid()}), 503
+
 @app.route('/')
 def index():
-    """List all test results from MongoDB"""
+    """List all test results from MongoDB
+
+    The page only changes when a result arrives or is removed, so each
+    process keeps the last rendered page with its index_etag(): a refresh
+    costs one indexed query and, with If-None-Match, gets a 304.
+    """
+    global index_cache
     try:
         collection = get_results_collection()
-        # Get latest 100 results, sorted by timestamp
-        db_results = list(collection.find().sort('timestamp', -1).limit(100))
-        
-        results = []
-        for result in db_results:
-            result_id = str(result['_id'])
-            test_id = result.get('test_id', result_id)
-            timestamp = result.get('timestamp', datetime.utcnow())
-            
-            # Format date
-            if isinstance(timestamp, datetime):
-                date_str = timestamp.strftime('%Y-%m-%d %H:%M:%S')
-            else:
-                date_str = str(timestamp)
-            
-            # Extract metrics
-            metrics = extract_metrics(result)
-            
-            results.append({
-                'id': result_id,
-                'filename': test_id,
-                'date': date_str,
-                'metrics': metrics if metrics else None
-            })
-        
-        return render_template_string(HTML_TEMPLATE, results=results)
+        etag = index_etag(collection)
+        cached_etag, page = index_cache
+        if cached_etag != etag:
+            page = render_index(collection)
+            index_cache = (etag, page)
+
+        response = Response(page, mimetype='text/html')
+        response.set_etag(etag)
+        # Let browsers keep the page but revalidate it on every visit
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         return f"Error loading results: {str(e)}", 500
 
+def render_index(collection):
+    """Render the index page from the latest 100 results"""
+    db_results = find_summaries(collection)
+    
+    results = []
+    for result in db_results:
+        result_id = str(result['_id'])
+        test_id = result.get('test_id', result_id)
+        timestamp = result.get('timestamp', datetime.utcnow())
+        
+        # Format date
+        if isinstance(timestamp, datetime):
+            date_str = timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            date_str = str(timestamp)
+        
+        # Extract metrics
+        metrics = extract_metrics(result)
+        
+        results.append({
+            'id': result_id,
+            'filename': test_id,
+            'date': date_str,
+            'metrics': metrics if metrics else None
+        })
+    
+    with serialization('results_page'):
+        page = HTML_PAGE.render(results=results)
+    return page
+
 @app.route('/view/<result_id>')
 def view_result(result_id):
-    """View detailed JSON result from MongoDB"""
+    """View a result as a tree whose levels load on demand"""
     try:
         collection = get_results_collection()
         try:
-            result = collection.find_one({'_id': ObjectId(result_id)})
+            result = collection.find_one({'_id': ObjectId(result_id)}, {'test_id': 1})
         except InvalidId:
             return "Invalid result ID", 400
         
         if not result:
             return "Result not found", 404
         
-        # Convert ObjectId to string for JSON serialization
-        result['_id'] = str(result['_id'])
-        
         # Get test_id or use _id as filename
         filename = result.get('test_id', result_id)
         
-        json_str = json.dumps(result, indent=2, default=str)
-        return render_template_string(DETAIL_TEMPLATE, filename=filename, json_data=json_str)
+        with serialization('result_page'):
+            page = DETAIL_PAGE.render(filename=filename, node_url=f'/api/results/{result_id}/node')
+        return page
     except Exception as e:
         return f"Error reading result: {str(e)}", 500
 
+@app.route('/api/results/<result_id>/node')
+def result_node(result_id):
+    """One node of a result, addressed by a JSON pointer
+
+    ``?path=/metrics/http_req_duration`` selects the node (default: the
+    whole result). Returns its ``type``, its ``value`` if it is a scalar,
+    or its ``size`` and the ``children`` from ``?offset=`` (up to
+    ``?limit=``) if it is an object or array; children are described the
+    same way but without their own children. MongoDB extracts the node,
+    so a large result is never sent to the viewer whole. Needs MongoDB
+    5.0 or newer ($getField).
+    """
+    try:
+        try:
+            result_oid = ObjectId(result_id)
+        except InvalidId:
+            return jsonify({'error': 'Invalid result ID'}), 400
+        path = request.args.get('path', '')
+        try:
+            tokens = parse_json_pointer(path)
+            offset = int(request.args.get('offset', 0))
+            limit = int(request.args.get('limit', NODE_PAGE_SIZE))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if offset < 0 or not 1 <= limit <= NODE_MAX_PAGE_SIZE:
+            return jsonify({'error': f'offset must be >= 0 and limit between 1 and {NODE_MAX_PAGE_SIZE}'}), 400
+
+        collection = get_results_collection()
+        docs = list(collection.aggregate(node_pipeline(result_oid, tokens, offset, limit)))
+        if not docs:
+            return jsonify({'error': 'Result not found'}), 404
+        node = docs[0]['node']
+        if node['type'] == 'missing':
+            return jsonify({'error': f'No value at {path}'}), 404
+        node['path'] = path
+        if 'children' in node:
+            node['offset'] = offset
+
+        with serialization('result_node'):
+            body = json.dumps(node, default=str)
+        return Response(body, mimetype='application/json')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/download/<result_id>')
 def download_result(result_id):
-    """Download JSON result from MongoDB"""
+    """Download JSON result from MongoDB
+
+    The JSON is encoded and sent in chunks, so the whole string never sits
+    in memory. ``?format=compact`` drops the indentation. The body is
+    compressed with zstd or gzip when Accept-Encoding allows it;
+    uncompressed downloads honor Range. Responses carry an ETag from the
+    result's summary, so If-None-Match is answered with 304 without
+    reading the document.
+    """
     try:
+        fmt = request.args.get('format', 'pretty')
+        if fmt not in DOWNLOAD_FORMATS:
+            return f"format must be one of {', '.join(DOWNLOAD_FORMATS)}", 400
+
         collection = get_results_collection()
         try:
-            result = collection.find_one({'_id': ObjectId(result_id)})
+            result_oid = ObjectId(result_id)
         except InvalidId:
             return "Invalid result ID", 400
-        
+
+        result = collection.find_one({'_id': result_oid}, {'test_id': 1, SUMMARY_FIELD: 1})
         if not result:
             return "Result not found", 404
-        
-        # Convert ObjectId to string
-        result['_id'] = str(result['_id'])
-        
+        full_result = None
+        if SUMMARY_FIELD not in result:
+            full_result = collection.find_one({'_id': result_oid})
+            if not full_result:
+                return "Result not found", 404
+            store_summaries(collection, [full_result])
+            result = full_result
+        summary = result[SUMMARY_FIELD]
+
         # Get test_id for filename
         filename = result.get('test_id', result_id)
         if not filename.endswith('.json'):
             filename += '.json'
-        
-        from flask import Response
-        json_str = json.dumps(result, indent=2, default=str)
-        return Response(
-            json_str,
+
+        def generate():
+            doc = full_result if full_result is not None else collection.find_one({'_id': result_oid})
+            if doc is None:
+                return
+            doc.pop(SUMMARY_FIELD, None)
+            # Convert ObjectId to string
+            doc['_id'] = str(doc['_id'])
+            yield from encode_chunks(doc, fmt)
+
+        encoding = request.accept_encodings.best_match(DOWNLOAD_ENCODINGS, default='identity')
+        etag = f"{summary['digest']}-{fmt}"
+        body = generate()
+        if encoding != 'identity':
+            etag += f'-{encoding}'
+            body = compress_chunks(body, encoding)
+
+        response = Response(
+            body,
             mimetype='application/json',
             headers={'Content-Disposition': f'attachment; filename={filename}.json'}
         )
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        if encoding != 'identity':
+            response.content_encoding = encoding
+            return response.make_conditional(request)
+        length = summary['lengths'][fmt]
+        response.accept_ranges = 'bytes'
+        response.content_length = length
+        return response.make_conditional(request, accept_ranges=True, complete_length=length)
+    except HTTPException:
+        # 416 for unsatisfiable ranges
+        raise
     except Exception as e:
         return f"Error downloading result: {str(e)}", 500
 
 @app.route('/api/results')
 def api_results():
-    """API endpoint to get list of results from MongoDB"""
+    """API endpoint to get a page of results from MongoDB, newest first
+
+    ``?limit=&after=`` page through the results; ``?from=&to=`` restrict
+    them to a time range. Returns ``{"results": [...], "next": <cursor or
+    null>}``; pass ``next`` as ``after`` to fetch the following page.
+    """
     try:
+        try:
+            query, limit = parse_results_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
         collection = get_results_collection()
-        db_results = list(collection.find().sort('timestamp', -1).limit(100))
+        # Fetch one extra result to know whether another page exists
+        db_results = find_summaries(collection, query, limit + 1)
+        next_cursor = None
+        if len(db_results) > limit:
+            db_results = db_results[:limit]
+            last = db_results[-1]
+            next_cursor = results_cursor(last.get('timestamp'), last['_id'])
         
-        results = []
-        for result in db_results:
-            result_id = str(result['_id'])
-            test_id = result.get('test_id', result_id)
-            timestamp = result.get('timestamp', datetime.utcnow())
+        with serialization('results_list'):
+            results = []
+            for result in db_results:
+                result_id = str(result['_id'])
+                test_id = result.get('test_id', result_id)
+                timestamp = result.get('timestamp', datetime.utcnow())
+                
+                results.append({
+                    'id': result_id,
+                    'filename': test_id,
+                    'date': timestamp.isoformat() if isinstance(timestamp, datetime) else str(timestamp),
+                    'size': result.get(SUMMARY_FIELD, {}).get('size', 0)
+                })
             
-            results.append({
-                'id': result_id,
-                'filename': test_id,
-                'date': timestamp.isoformat() if isinstance(timestamp, datetime) else str(timestamp),
-                'size': len(json.dumps(result, default=str))
-            })
-        
-        return jsonify(results)
+            response = jsonify({'results': results, 'next': next_cursor})
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/trends')
+def trends_page():
+    """p50/p95/p99, throughput and error rate of recent runs per test, with regressions flagged"""
+    try:
+        try:
+            test_id, runs, threshold = parse_trend_args(request.args)
+        except ValueError as e:
+            return str(e), 400
+        etag, trends = cached_trends(get_results_collection(), test_id, runs, threshold)
+        with serialization('trends_page'):
+            page = TRENDS_PAGE.render(trends=trends)
+        response = Response(page, mimetype='text/html')
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    except Exception as e:
+        return f"Error loading trends: {str(e)}", 500
+
+@app.route('/api/trends')
+def api_trends():
+    """Trends of the last ``?runs=`` runs of every test_id (or ``?test_id=``)
+
+    Returns ``{"runs", "threshold", "tests": [{"test_id", "regressed",
+    "runs": [...]}]}`` with runs newest first. Each run has ``p50``,
+    ``p95``, ``p99`` (ms), ``rps``, ``error_rate`` (%), its change against
+    the older runs and the ``regressions`` past ``?threshold=`` percent.
+    Cached until a run is added or removed.
+    """
+    try:
+        try:
+            test_id, runs, threshold = parse_trend_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        etag, trends = cached_trends(get_results_collection(), test_id, runs, threshold)
+        with serialization('trends'):
+            response = jsonify(trends)
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/results', methods=['POST'])
+def ingest_result():
+    """Store a k6 run sent as a summary or as a ``k6 --out json`` point stream
+
+    The body is read as a stream, so point streams of any size ingest in
+    bounded memory; gzip bodies are accepted, and bodies larger than
+    RESULTS_MAX_BODY_BYTES once decompressed get 413. ``?test_id=`` names the run
+    (default: ``k6-<timestamp>``). Returns 201 with the new result's id.
+
+    Series documents are written while the body is read; unless the result
+    itself is stored, they are deleted again, whatever stopped the upload.
+    """
+    run_id = ObjectId()
+    stored = False
+    try:
+        lines = iter_lines(request.stream, request.headers.get('Content-Encoding'))
+        source, doc = ingest(lines, run_id, get_series_collection())
+        doc['_id'] = run_id
+        doc['test_id'] = request.args.get('test_id') or f"k6-{doc['timestamp']:%Y%m%d-%H%M%S}"
+        doc['source'] = source
+        doc[SUMMARY_FIELD] = summarize_result(doc)
+        get_results_collection().insert_one(doc)
+        stored = True
+        return jsonify({'id': str(run_id), 'test_id': doc['test_id'], 'source': source,
+                        'series': doc.get('series')}), 201
+    except BodyTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except IngestError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if not stored:
+            discard_series(run_id)
+
+@app.route('/api/retention')
+def api_retention():
+    """Compaction settings, the last pass and bytes reclaimed so far
+
+    ``totals`` adds up every pass: results compacted and the BSON bytes of
+    results and series before and after, with ``bytes_reclaimed`` the
+    difference.
+    """
+    try:
+        return jsonify(compactor.status())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    # Development server; use gunicorn (see gunicorn.conf.py) in production
+    start_pool_warmup()
+    start_retention()
     app.run(host='0.0.0.0', port=PORT, debug=False)
 
 
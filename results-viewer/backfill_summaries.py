@@ -0,0 +1,39 @@
+"""One-off migration: store the list-view summary of results saved before it existed.
+
+The index page and ``GET /api/results`` otherwise compute a missing
+summary on first read, which reads the whole document and encodes it in
+every download format on the request path. Run this once after upgrading,
+from a checkout or inside the image, with the same MONGO_URL/DB_NAME as
+the viewer. It works in batches, can be rerun, and is safe while the
+viewer is serving:
+
+    python backfill_summaries.py
+"""
+from pymongo import MongoClient
+
+from app import (
+    MONGO_URL, DB_NAME, RESULTS_COLLECTION_NAME, SUMMARY_FIELD, client_options, store_summaries
+)
+
+BATCH = 100
+
+
+def backfill_summaries(collection, batch=BATCH):
+    """Store ``viewer_summary`` on every result missing it; returns how many were updated"""
+    updated = 0
+    last_id = None
+    while True:
+        query = {SUMMARY_FIELD: {'$exists': False}}
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+        docs = list(collection.find(query).sort('_id', 1).limit(batch))
+        if not docs:
+            return updated
+        store_summaries(collection, docs)
+        updated += len(docs)
+        last_id = docs[-1]['_id']
+
+
+if __name__ == '__main__':
+    collection = MongoClient(MONGO_URL, **client_options())[DB_NAME][RESULTS_COLLECTION_NAME]
+    print(f"Stored the summary of {backfill_summaries(collection)} results")
@@ -0,0 +1,41 @@
+"""Production server settings: gunicorn -c gunicorn.conf.py app:app
+
+Runs WEB_CONCURRENCY pre-forked worker processes (default: one per CPU),
+each with WEB_THREADS threads. The app module is imported once in the
+master and shared copy-on-write; every worker then creates its own MongoDB
+client on first use and warms its pool right after startup, so /ready only
+answers 200 from a worker whose pool is open. Each worker also runs the
+result compaction loop; a lease lets one pass run at a time.
+"""
+import multiprocessing
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.getenv('WEB_THREADS', 4))
+worker_class = 'gthread'
+preload_app = True
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+keepalive = 5
+accesslog = None
+
+# Workers write their metrics to files here so /metrics can sum over all of
+# them. This runs before the app (and prometheus_client) is imported; files
+# left by a previous run would otherwise be added to this one's.
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='prometheus-'))
+os.makedirs(metrics_dir, exist_ok=True)
+for name in os.listdir(metrics_dir):
+    if name.endswith('.db'):
+        os.remove(os.path.join(metrics_dir, name))
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    from app import start_pool_warmup, start_retention
+    start_pool_warmup()
+    start_retention()
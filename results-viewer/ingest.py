@@ -0,0 +1,376 @@
+"""k6 result ingestion for ``POST /api/results``.
+
+Accepts either document k6 can write:
+
+- a summary, from ``k6 run --summary-export=summary.json`` or a
+  ``handleSummary`` JSON dump; its metrics are normalized to the
+  ``{"type": ..., "values": {...}}`` shape the viewer reads;
+- the raw point stream of ``k6 run --out json=out.json``: one JSON object
+  per line, ``Metric`` declarations followed by ``Point`` samples.
+
+The point stream is read in fixed-size chunks and folded into
+``BUCKET_SECONDS``-wide buckets per metric: counts, sums, min/max and, for
+trends, a mergeable ``LatencySketch``. A bucket is written to the series
+collection once points are more than ``BUCKET_GRACE_SECONDS`` past its
+end, so memory stays bounded by the number of metrics, not by the size of
+the upload. A point that arrives after its bucket was written opens a new
+document for the same ``start``; readers merge documents per ``start``.
+Run-wide totals are kept alongside and become the run's k6-style summary.
+
+Tags are not kept: series and summary are per metric name.
+"""
+import json
+import os
+import zlib
+from datetime import datetime, timezone
+
+from sketch import LatencySketch
+
+BUCKET_SECONDS = int(os.getenv('RESULTS_BUCKET_SECONDS', 10))
+BUCKET_GRACE_SECONDS = 30
+SERIES_WRITE_BATCH = 100
+READ_CHUNK_BYTES = 64 * 1024
+MAX_LINE_BYTES = 1024 * 1024
+# Largest upload accepted, counted after gzip decompression
+MAX_BODY_BYTES = int(os.getenv('RESULTS_MAX_BODY_BYTES', 1024 ** 3))
+SUMMARY_MAX_BYTES = 16 * 1024 * 1024
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Trend percentiles reported in the run summary, as in k6's end-of-test summary
+SUMMARY_PERCENTILES = {'med': 0.5, 'p(90)': 0.9, 'p(95)': 0.95}
+
+POINT_STREAM = 'k6-json'
+SUMMARY = 'summary'
+
+
+class IngestError(ValueError):
+    """The upload is not a k6 summary or point stream"""
+
+
+class BodyTooLarge(IngestError):
+    """The upload, decompressed, is larger than ``MAX_BODY_BYTES``"""
+
+
+def body_pieces(stream, content_encoding=None):
+    """A request body in pieces of at most ``READ_CHUNK_BYTES``, decompressed.
+
+    Gzip bodies (``Content-Encoding: gzip``, or an ``out.json.gz`` written
+    by k6 and sent as is) are inflated on the fly, at most
+    ``READ_CHUNK_BYTES`` of output per call, so a small body that inflates
+    to gigabytes never sits in memory at once.
+    """
+    if content_encoding not in (None, '', 'identity', 'gzip'):
+        raise IngestError(f'Unsupported Content-Encoding: {content_encoding}')
+    decompressor = None
+    first = True
+    while True:
+        chunk = stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        if first:
+            first = False
+            if content_encoding == 'gzip' or chunk[:2] == GZIP_MAGIC:
+                decompressor = zlib.decompressobj(wbits=31)
+        if decompressor is None:
+            yield chunk
+            continue
+        while chunk:
+            yield decompressor.decompress(chunk, READ_CHUNK_BYTES)
+            chunk = decompressor.unconsumed_tail
+    if decompressor is not None:
+        yield decompressor.flush()
+
+
+def iter_lines(stream, content_encoding=None, max_bytes=None):
+    """Lines of a request body, read ``READ_CHUNK_BYTES`` at a time.
+
+    Raises BodyTooLarge once the (decompressed) body passes ``max_bytes``
+    (default ``MAX_BODY_BYTES``).
+    A line may be as long as a whole summary (``--summary-export`` writes
+    one line); ingest() holds point stream lines to ``MAX_LINE_BYTES``.
+    """
+    if max_bytes is None:
+        max_bytes = MAX_BODY_BYTES
+    size = 0
+    pending = []
+    pending_size = 0
+    for piece in body_pieces(stream, content_encoding):
+        size += len(piece)
+        if size > max_bytes:
+            raise BodyTooLarge(f'Body larger than {max_bytes} bytes')
+        lines = piece.split(b'\n')
+        if len(lines) > 1:
+            pending.append(lines[0])
+            yield b''.join(pending)
+            yield from lines[1:-1]
+            pending = []
+            pending_size = 0
+        pending.append(lines[-1])
+        pending_size += len(lines[-1])
+        if pending_size > SUMMARY_MAX_BYTES:
+            raise IngestError(f'Line longer than {SUMMARY_MAX_BYTES} bytes')
+    if pending_size:
+        yield b''.join(pending)
+
+
+def to_millis(moment):
+    """``moment`` truncated to milliseconds, the precision BSON stores.
+
+    Summaries (download lengths, digests) are computed before the insert,
+    so every stored datetime must already be what reads will return.
+    """
+    return moment.replace(microsecond=moment.microsecond // 1000 * 1000)
+
+
+def utc_datetime(seconds):
+    """Naive UTC datetime for a POSIX timestamp, as pymongo returns them"""
+    return to_millis(datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None))
+
+
+class MetricStats:
+    """Running aggregate of one metric's points, per bucket or per run"""
+    __slots__ = ('kind', 'count', 'total', 'min', 'max', 'last', 'nonzero', 'sketch')
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+        self.nonzero = 0
+        self.sketch = LatencySketch() if kind == 'trend' else None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self.last = value
+        if value:
+            self.nonzero += 1
+        if self.sketch is not None:
+            self.sketch.add(value)
+
+    def merge(self, other):
+        """Fold in ``other``, a later or concurrent aggregate of the same metric"""
+        if not other.count:
+            return self
+        self.count += other.count
+        self.total += other.total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.last = other.last
+        self.nonzero += other.nonzero
+        if self.sketch is not None and other.sketch is not None:
+            self.sketch.merge(other.sketch)
+        return self
+
+    def to_doc(self, name):
+        doc = {'name': name, 'type': self.kind, 'count': self.count, 'sum': self.total,
+               'min': self.min, 'max': self.max, 'last': self.last, 'nonzero': self.nonzero}
+        if self.sketch is not None:
+            doc['sketch'] = self.sketch.to_doc()
+        return doc
+
+    @classmethod
+    def from_doc(cls, doc):
+        stats = cls(doc['type'])
+        stats.count = doc['count']
+        stats.total = doc['sum']
+        stats.min = doc['min']
+        stats.max = doc['max']
+        stats.last = doc.get('last')
+        stats.nonzero = doc.get('nonzero', 0)
+        if 'sketch' in doc:
+            stats.sketch = LatencySketch.from_doc(doc['sketch'])
+        return stats
+
+    def values(self, seconds):
+        """k6 summary ``values`` for this metric over ``seconds`` of run time"""
+        if self.kind == 'counter':
+            return {'count': self.total, 'rate': self.total / seconds if seconds > 0 else 0.0}
+        if self.kind == 'rate':
+            return {'rate': self.nonzero / self.count if self.count else 0.0,
+                    'passes': self.nonzero, 'fails': self.count - self.nonzero}
+        if self.kind == 'gauge':
+            return {'value': self.last, 'min': self.min, 'max': self.max}
+        values = {'avg': self.total / self.count if self.count else 0.0, 'min': self.min, 'max': self.max}
+        for label, q in SUMMARY_PERCENTILES.items():
+            values[label] = self.sketch.quantile(q) if self.sketch is not None else None
+        return values
+
+
+class PointStreamIngest:
+    """Folds a ``k6 --out json`` stream into series documents and run totals"""
+
+    def __init__(self, run_id, series_collection, bucket_seconds=BUCKET_SECONDS):
+        self.run_id = run_id
+        self.series = series_collection
+        self.bucket_seconds = bucket_seconds
+        self.kinds = {}
+        self.totals = {}
+        self.buckets = {}
+        self.first = None
+        self.last = None
+        self.points = 0
+        self.documents = 0
+        self._unwritten = []
+
+    def add(self, entry):
+        entry_type = entry.get('type')
+        if entry_type == 'Metric':
+            data = entry.get('data') or {}
+            self.kinds[entry.get('metric', data.get('name'))] = data.get('type', 'trend')
+        elif entry_type == 'Point':
+            data = entry.get('data') or {}
+            try:
+                timestamp = datetime.fromisoformat(data['time']).timestamp()
+                value = float(data['value'])
+            except (KeyError, TypeError, ValueError):
+                raise IngestError(f'Invalid point: {entry}')
+            self.add_point(entry.get('metric'), timestamp, value)
+
+    def add_point(self, name, timestamp, value):
+        kind = self.kinds.get(name, 'trend')
+        start = int(timestamp // self.bucket_seconds) * self.bucket_seconds
+        bucket = self.buckets.get(start)
+        if bucket is None:
+            bucket = self.buckets[start] = {}
+            self._write_settled(timestamp)
+        stats = bucket.get(name)
+        if stats is None:
+            stats = bucket[name] = MetricStats(kind)
+        stats.add(value)
+        totals = self.totals.get(name)
+        if totals is None:
+            totals = self.totals[name] = MetricStats(kind)
+        totals.add(value)
+        self.points += 1
+        if self.first is None or timestamp < self.first:
+            self.first = timestamp
+        if self.last is None or timestamp > self.last:
+            self.last = timestamp
+
+    def _write_settled(self, now):
+        cutoff = now - self.bucket_seconds - BUCKET_GRACE_SECONDS
+        for start in [start for start in self.buckets if start <= cutoff]:
+            self._queue(start, self.buckets.pop(start))
+        if len(self._unwritten) >= SERIES_WRITE_BATCH:
+            self._write()
+
+    def _queue(self, start, bucket):
+        self._unwritten.append({
+            'run_id': self.run_id,
+            'start': utc_datetime(start),
+            'seconds': self.bucket_seconds,
+            'metrics': [stats.to_doc(name) for name, stats in bucket.items()]
+        })
+
+    def _write(self):
+        if self._unwritten:
+            self.series.insert_many(self._unwritten, ordered=False)
+            self.documents += len(self._unwritten)
+            self._unwritten = []
+
+    def finish(self):
+        """Write the remaining buckets and return the run's summary metrics"""
+        for start in sorted(self.buckets):
+            self._queue(start, self.buckets[start])
+        self.buckets = {}
+        self._write()
+        seconds = self.last - self.first if self.points else 0.0
+        return {name: {'type': stats.kind, 'contains': 'time' if stats.kind == 'trend' else 'default',
+                       'values': stats.values(seconds)}
+                for name, stats in self.totals.items()}
+
+
+def summary_metric(name, metric):
+    """One ``--summary-export`` metric in handleSummary's ``{type, values}`` shape"""
+    if not isinstance(metric, dict):
+        raise IngestError(f'Invalid metric {name}')
+    if 'values' in metric:
+        return metric
+    values = {key: value for key, value in metric.items() if key != 'thresholds'}
+    if 'passes' in metric:
+        kind = 'rate'
+        values['rate'] = values.pop('value', 0)
+    elif 'count' in metric:
+        kind = 'counter'
+    elif 'avg' in metric:
+        kind = 'trend'
+    else:
+        kind = 'gauge'
+    normalized = {'type': kind, 'values': values}
+    if 'thresholds' in metric:
+        normalized['thresholds'] = metric['thresholds']
+    return normalized
+
+
+def summary_document(summary):
+    """Result fields from a k6 summary document"""
+    if not isinstance(summary, dict) or not isinstance(summary.get('metrics'), dict):
+        raise IngestError('Expected a k6 summary with a "metrics" object')
+    doc = {key: value for key, value in summary.items() if key in ('root_group', 'state', 'options')}
+    doc['metrics'] = {name: summary_metric(name, metric) for name, metric in summary['metrics'].items()}
+    return doc
+
+
+def ingest(lines, run_id, series_collection):
+    """Read an upload and return ``(format, result fields)``.
+
+    The format is detected from the first line: a ``Metric`` or ``Point``
+    object means a point stream, anything else is read as one summary
+    document of at most ``SUMMARY_MAX_BYTES``. Series documents of a point
+    stream are written as the stream is read.
+    """
+    lines = (line for line in lines if line.strip())
+    first = next(lines, None)
+    if first is None:
+        raise IngestError('Empty body')
+    try:
+        entry = json.loads(first)
+    except ValueError:
+        entry = None
+
+    if isinstance(entry, dict) and entry.get('type') in ('Metric', 'Point'):
+        run = PointStreamIngest(run_id, series_collection)
+        run.add(entry)
+        for line in lines:
+            if len(line) > MAX_LINE_BYTES:
+                raise IngestError(f'Line longer than {MAX_LINE_BYTES} bytes')
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                raise IngestError(f'Invalid JSON line: {line[:200]!r}')
+            if isinstance(entry, dict):
+                run.add(entry)
+        metrics = run.finish()
+        if not run.points:
+            raise IngestError('The point stream holds no points')
+        return POINT_STREAM, {
+            'timestamp': utc_datetime(run.last),
+            'started': utc_datetime(run.first),
+            'metrics': metrics,
+            'series': {'bucket_seconds': run.bucket_seconds, 'documents': run.documents,
+                       'points': run.points}
+        }
+
+    if entry is None:
+        body = bytearray(first)
+        for line in lines:
+            body += b'\n'
+            body += line
+            if len(body) > SUMMARY_MAX_BYTES:
+                raise IngestError(f'Summary larger than {SUMMARY_MAX_BYTES} bytes')
+        try:
+            entry = json.loads(bytes(body))
+        except ValueError:
+            raise IngestError('Body is neither a k6 summary nor a k6 JSON point stream')
+    elif next(lines, None) is not None:
+        raise IngestError('Unexpected data after the summary document')
+    doc = summary_document(entry)
+    doc['timestamp'] = to_millis(datetime.utcnow())
+    return SUMMARY, doc
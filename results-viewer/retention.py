@@ -0,0 +1,268 @@
+"""Compaction and expiry of old k6 results, so storage stays flat.
+
+Every ``RESULTS_COMPACT_INTERVAL`` seconds one process compacts the results
+whose ``timestamp`` is more than ``RESULTS_COMPACT_AFTER_DAYS`` old:
+
+- the result document keeps its top-level scalars (``test_id``,
+  ``timestamp``, ``source``, CI metadata), each metric's type, values and
+  thresholds, the producer's ``summary`` and ``series`` info, and the pass
+  and fail totals of ``root_group``'s checks; ``root_group``, ``options``,
+  ``state``, ``setup_data`` and other nested fields are dropped;
+- the run's series buckets (see ingest.py) are merged into
+  ``RESULTS_ROLLUP_SECONDS``-wide ones. Sketches merge exactly, so the
+  trends of a compacted run do not change.
+
+Compacted results and their series get an ``expire_at`` of ``timestamp``
+plus ``RESULTS_RETENTION_DAYS``, which the TTL indexes on both collections
+act on. Results without a date ``timestamp`` are left alone.
+
+Gunicorn workers (and replicas) all run the loop, but a lease document in
+``k6_jobs`` lets only one of them run a pass at a time. The BSON bytes
+before and after are recorded on each compacted result's summary and
+added up in the lease document; ``/api/retention`` reports them.
+"""
+import os
+import random
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+
+import bson
+from pymongo.errors import DuplicateKeyError
+
+from ingest import SERIES_WRITE_BATCH, MetricStats, utc_datetime
+
+COMPACT_AFTER_DAYS = float(os.getenv('RESULTS_COMPACT_AFTER_DAYS', 7))
+# 0 keeps results forever
+RETENTION_DAYS = float(os.getenv('RESULTS_RETENTION_DAYS', 90))
+ROLLUP_SECONDS = int(os.getenv('RESULTS_ROLLUP_SECONDS', 300))
+# 0 turns the job off
+COMPACT_INTERVAL = int(os.getenv('RESULTS_COMPACT_INTERVAL', 3600))
+COMPACT_BATCH = 50
+# Longest a worker waits before its first pass, so workers started
+# together do not all race for the lease
+COMPACT_START_JITTER = 60
+
+JOBS_COLLECTION_NAME = 'k6_jobs'
+LEASE_ID = 'retention'
+EXPIRE_FIELD = 'expire_at'
+# Marks series documents written by a rollup
+ROLLUP_FIELD = 'rollup'
+# Result fields kept whole; other nested fields are dropped
+KEPT_FIELDS = ('metrics', 'series', 'summary')
+KEPT_METRIC_FIELDS = ('type', 'contains', 'values', 'thresholds')
+OLDEST_FIRST = [('timestamp', 1), ('_id', 1)]
+
+
+def bson_size(doc):
+    return len(bson.encode(doc))
+
+
+def members(value):
+    """Entries of a k6 group's ``checks``/``groups``: a list (handleSummary) or a dict (--summary-export)"""
+    if isinstance(value, dict):
+        value = value.values()
+    return [entry for entry in value or [] if isinstance(entry, dict)]
+
+
+def check_totals(group, totals=None):
+    """Passes and fails of all checks in a k6 ``root_group`` tree"""
+    if totals is None:
+        totals = {'passes': 0, 'fails': 0}
+    for check in members(group.get('checks')):
+        totals['passes'] += check.get('passes', 0)
+        totals['fails'] += check.get('fails', 0)
+    for subgroup in members(group.get('groups')):
+        check_totals(subgroup, totals)
+    return totals
+
+
+def compact_metric(metric):
+    return {key: value for key, value in metric.items()
+            if key in KEPT_METRIC_FIELDS or not isinstance(value, (dict, list))}
+
+
+def compact_document(doc):
+    """The fields of a result worth keeping once it is old"""
+    compact = {}
+    for key, value in doc.items():
+        if key == 'metrics' and isinstance(value, dict):
+            compact[key] = {name: compact_metric(metric) for name, metric in value.items()
+                            if isinstance(metric, dict)}
+        elif key == 'root_group' and isinstance(value, dict):
+            compact['checks'] = check_totals(value)
+        elif key in KEPT_FIELDS or not isinstance(value, (dict, list)):
+            compact[key] = value
+    return compact
+
+
+def bucket_start(start, seconds):
+    epoch = int(start.replace(tzinfo=timezone.utc).timestamp())
+    return epoch // seconds * seconds
+
+
+def rollup_series(series_collection, run_id, seconds=ROLLUP_SECONDS):
+    """Merge a run's series buckets into ``seconds``-wide ones.
+
+    Returns the document counts and BSON bytes before and after, or None
+    if the run has no series finer than ``seconds``. Rolled-up documents
+    are written before the originals are deleted; ones left by an
+    interrupted pass are replaced.
+    """
+    raw = {'run_id': run_id, ROLLUP_FIELD: {'$exists': False}}
+    first = series_collection.find_one(raw, {'seconds': 1})
+    if first is None or first.get('seconds', 0) >= seconds:
+        return None
+    series_collection.delete_many({'run_id': run_id, ROLLUP_FIELD: True})
+
+    report = {'documents_before': 0, 'bytes_before': 0, 'documents_after': 0, 'bytes_after': 0}
+    pending = []
+
+    def queue(start, bucket):
+        doc = {'run_id': run_id, 'start': utc_datetime(start), 'seconds': seconds,
+               'metrics': [stats.to_doc(name) for name, stats in bucket.items()], ROLLUP_FIELD: True}
+        report['documents_after'] += 1
+        report['bytes_after'] += bson_size(doc)
+        pending.append(doc)
+        if len(pending) >= SERIES_WRITE_BATCH:
+            series_collection.insert_many(pending, ordered=False)
+            pending.clear()
+
+    start, bucket = None, {}
+    for doc in series_collection.find(raw).sort('start', 1):
+        report['documents_before'] += 1
+        report['bytes_before'] += bson_size(doc)
+        doc_start = bucket_start(doc['start'], seconds)
+        if doc_start != start:
+            if bucket:
+                queue(start, bucket)
+            start, bucket = doc_start, {}
+        for metric in doc.get('metrics') or []:
+            stats = MetricStats.from_doc(metric)
+            if metric['name'] in bucket:
+                bucket[metric['name']].merge(stats)
+            else:
+                bucket[metric['name']] = stats
+    if bucket:
+        queue(start, bucket)
+    if pending:
+        series_collection.insert_many(pending, ordered=False)
+    series_collection.delete_many(raw)
+    return report
+
+
+class Compactor:
+    """Periodic compaction of the results collection; see the module docstring.
+
+    ``summarize(doc)`` computes the summary stored in ``summary_field``,
+    which is rebuilt for the compacted document and also carries the
+    ``compacted`` record of bytes before and after.
+    """
+
+    def __init__(self, get_results_collection, get_series_collection, summarize, summary_field,
+                 interval=COMPACT_INTERVAL):
+        self.get_results_collection = get_results_collection
+        self.get_series_collection = get_series_collection
+        self.summarize = summarize
+        self.summary_field = summary_field
+        self.interval = interval
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self._thread = None
+
+    def jobs_collection(self):
+        return self.get_results_collection().database[JOBS_COLLECTION_NAME]
+
+    def acquire_lease(self, now):
+        """Hold the job's lease for one interval; False if another process holds it"""
+        try:
+            self.jobs_collection().find_one_and_update(
+                {'_id': LEASE_ID, '$or': [{'until': {'$lt': now}}, {'owner': self.owner}]},
+                {'$set': {'owner': self.owner, 'until': now + timedelta(seconds=max(self.interval, 60))}},
+                upsert=True)
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def compact(self, doc, now):
+        """Replace one result and its series by their compact forms; returns the bytes record"""
+        results = self.get_results_collection()
+        series = self.get_series_collection()
+        compacted = {'at': now, 'bytes_before': bson_size(doc), 'bytes_after': 0}
+        compact = compact_document(doc)
+        rolled = rollup_series(series, doc['_id']) if doc.get('series') else None
+        if rolled is not None:
+            compact['series'] = dict(compact.get('series') or {}, bucket_seconds=ROLLUP_SECONDS,
+                                     documents=rolled['documents_after'])
+            compacted['series_bytes_before'] = rolled['bytes_before']
+            compacted['series_bytes_after'] = rolled['bytes_after']
+        if RETENTION_DAYS > 0:
+            compact[EXPIRE_FIELD] = doc['timestamp'] + timedelta(days=RETENTION_DAYS)
+            series.update_many({'run_id': doc['_id']}, {'$set': {EXPIRE_FIELD: compact[EXPIRE_FIELD]}})
+
+        compact[self.summary_field] = dict(self.summarize(compact), compacted=compacted)
+        # Same encoded width as the placeholder, so the size stays exact
+        compacted['bytes_after'] = bson_size(compact)
+        results.replace_one({'_id': doc['_id']}, compact)
+        return compacted
+
+    def run_pass(self, now=None):
+        """Compact every result past the age limit; None if another process holds the lease"""
+        now = now or datetime.utcnow()
+        if not self.acquire_lease(now):
+            return None
+        results = self.get_results_collection()
+        query = {'timestamp': {'$lt': now - timedelta(days=COMPACT_AFTER_DAYS)},
+                 f'{self.summary_field}.compacted': {'$exists': False}}
+        report = {'results': 0, 'bytes_before': 0, 'bytes_after': 0,
+                  'series_bytes_before': 0, 'series_bytes_after': 0}
+        while True:
+            docs = list(results.find(query).sort(OLDEST_FIRST).limit(COMPACT_BATCH))
+            if not docs:
+                break
+            for doc in docs:
+                compacted = self.compact(doc, now)
+                report['results'] += 1
+                for key in ('bytes_before', 'bytes_after', 'series_bytes_before', 'series_bytes_after'):
+                    report[key] += compacted.get(key, 0)
+            # Renew the lease; stop if a pass elsewhere has taken over
+            if not self.acquire_lease(datetime.utcnow()):
+                break
+        report['bytes_reclaimed'] = (report['bytes_before'] - report['bytes_after']
+                                     + report['series_bytes_before'] - report['series_bytes_after'])
+        self.jobs_collection().update_one(
+            {'_id': LEASE_ID},
+            {'$set': {'last_pass': dict(report, at=now, owner=self.owner)},
+             '$inc': {f'totals.{key}': value for key, value in report.items()}})
+        return report
+
+    def status(self):
+        """Settings, the last pass and running totals, for /api/retention"""
+        job = self.jobs_collection().find_one({'_id': LEASE_ID}) or {}
+        return {
+            'compact_after_days': COMPACT_AFTER_DAYS,
+            'retention_days': RETENTION_DAYS or None,
+            'rollup_seconds': ROLLUP_SECONDS,
+            'interval': self.interval,
+            'last_pass': job.get('last_pass'),
+            'totals': job.get('totals', {})
+        }
+
+    def _run(self):
+        wait = threading.Event().wait
+        wait(random.uniform(0, min(self.interval, COMPACT_START_JITTER)))
+        while True:
+            try:
+                report = self.run_pass()
+                if report and report['results']:
+                    print(f"Compacted {report['results']} results, reclaimed {report['bytes_reclaimed']} bytes")
+            except Exception as e:
+                print(f"Warning: Result compaction failed: {e}")
+            wait(self.interval)
+
+    def start(self):
+        """Run passes in a background thread of this process (no-op if disabled or running)"""
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self._thread = threading.Thread(target=self._run, name='result-compaction', daemon=True)
+        self._thread.start()
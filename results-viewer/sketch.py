@@ -0,0 +1,93 @@
+"""Mergeable latency sketch for k6 trend metrics.
+
+A ``LatencySketch`` keeps a count per logarithmic bin, so any quantile it
+returns is within ``RELATIVE_ACCURACY`` of the true value whatever the
+distribution (the DDSketch scheme). Sketches of different time buckets or
+runs merge by adding bin counts, which is what lets the ingestion API keep
+10-second buckets and still answer run-wide or day-wide percentiles.
+
+Values <= ``MIN_VALUE`` (k6 durations are in ms, so 1 ns) share one zero
+bin. When a sketch holds more than ``MAX_BINS`` bins the lowest ones are
+folded together; with the defaults that only happens beyond a 1 : 10^17
+range of values.
+"""
+import math
+
+RELATIVE_ACCURACY = 0.01
+MIN_VALUE = 1e-6
+MAX_BINS = 2048
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+class LatencySketch:
+    """Quantile sketch with ``add``, ``merge`` and ``quantile``"""
+    __slots__ = ('bins', 'zero_count', 'count')
+
+    def __init__(self):
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value, weight=1):
+        if value <= MIN_VALUE:
+            self.zero_count += weight
+        else:
+            index = math.ceil(math.log(value) / _LOG_GAMMA)
+            self.bins[index] = self.bins.get(index, 0) + weight
+            if len(self.bins) > MAX_BINS:
+                self._collapse()
+        self.count += weight
+
+    def merge(self, other):
+        for index, weight in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + weight
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(self.bins) > MAX_BINS:
+            self._collapse()
+        return self
+
+    def _collapse(self):
+        indexes = sorted(self.bins)
+        folded = indexes[:len(indexes) - MAX_BINS + 1]
+        weight = sum(self.bins.pop(index) for index in folded)
+        self.bins[folded[-1]] = weight
+
+    def quantile(self, q):
+        """Value at quantile ``q`` (0..1), or None if the sketch is empty"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                return 2 * _GAMMA ** index / (_GAMMA + 1)
+        return 2 * _GAMMA ** max(self.bins) / (_GAMMA + 1)
+
+    def to_doc(self):
+        """Compact form for MongoDB: dense counts from the lowest bin index"""
+        doc = {'n': self.count}
+        if self.zero_count:
+            doc['zero'] = self.zero_count
+        if self.bins:
+            low = min(self.bins)
+            counts = [0] * (max(self.bins) - low + 1)
+            for index, weight in self.bins.items():
+                counts[index - low] = weight
+            doc['offset'] = low
+            doc['counts'] = counts
+        return doc
+
+    @classmethod
+    def from_doc(cls, doc):
+        sketch = cls()
+        sketch.count = doc.get('n', 0)
+        sketch.zero_count = doc.get('zero', 0)
+        low = doc.get('offset', 0)
+        sketch.bins = {low + i: weight for i, weight in enumerate(doc.get('counts', [])) if weight}
+        return sketch
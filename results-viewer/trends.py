@@ -0,0 +1,140 @@
+"""Cross-run trends for ``/api/trends`` and ``/trends``.
+
+For every ``test_id`` the last N runs get p50/p95/p99 latency, throughput
+and error rate. Latency percentiles of runs ingested as a point stream come
+from merging the run's stored bucket sketches (see ingest.py); runs that
+only have a summary fall back to the percentiles k6 reported, so p99 is
+missing for them unless the summary had it.
+
+A run's numbers never change once it is stored, so they are computed once
+per process and kept in ``run_cache``; sketches of the runs not yet cached
+are read ``SERIES_BATCH_RUNS`` runs per query.
+
+Each run is compared with the median of the older runs in the window. A
+p95 above, or a throughput below, that baseline by more than the threshold
+(in percent) flags the run as a regression.
+"""
+import os
+from collections import OrderedDict
+from datetime import datetime
+from statistics import median
+
+from sketch import LatencySketch
+
+TREND_RUNS = int(os.getenv('RESULTS_TREND_RUNS', 10))
+TREND_MAX_RUNS = 100
+REGRESSION_THRESHOLD = float(os.getenv('RESULTS_REGRESSION_THRESHOLD', 10))
+# Newest results read when grouping runs by test_id
+TREND_SCAN_LIMIT = 5000
+SERIES_BATCH_RUNS = 50
+RUN_CACHE_SIZE = 10000
+
+LATENCY_METRIC = 'http_req_duration'
+TREND_PERCENTILES = {'p50': 0.5, 'p95': 0.95, 'p99': 0.99}
+# Percentiles a k6 summary may hold, for runs without sketches
+SUMMARY_PERCENTILES = {'p50': 'med', 'p95': 'p(95)', 'p99': 'p(99)'}
+
+RUN_PROJECTION = {
+    'test_id': 1, 'timestamp': 1, 'series': 1,
+    'metrics.http_req_duration.values': 1,
+    'metrics.http_reqs.values': 1,
+    'metrics.http_req_failed.values': 1
+}
+
+run_cache = OrderedDict()
+
+
+def metric_values(doc, name):
+    metric = (doc.get('metrics') or {}).get(name)
+    return metric.get('values') or {} if isinstance(metric, dict) else {}
+
+
+def run_sketches(series_collection, run_ids):
+    """Merged latency sketch per run id, for runs that have series"""
+    sketches = {}
+    for i in range(0, len(run_ids), SERIES_BATCH_RUNS):
+        batch = run_ids[i:i + SERIES_BATCH_RUNS]
+        cursor = series_collection.find(
+            {'run_id': {'$in': batch}},
+            {'run_id': 1, 'metrics': {'$elemMatch': {'name': LATENCY_METRIC}}})
+        for doc in cursor:
+            for metric in doc.get('metrics') or []:
+                if 'sketch' in metric:
+                    sketch = sketches.setdefault(doc['run_id'], LatencySketch())
+                    sketch.merge(LatencySketch.from_doc(metric['sketch']))
+    return sketches
+
+
+def run_stats(doc, sketch):
+    """Trend numbers of one run"""
+    durations = metric_values(doc, LATENCY_METRIC)
+    timestamp = doc.get('timestamp')
+    stats = {'id': str(doc['_id']),
+             'date': timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp}
+    for label, q in TREND_PERCENTILES.items():
+        if sketch is not None and sketch.count:
+            stats[label] = sketch.quantile(q)
+        else:
+            stats[label] = durations.get(SUMMARY_PERCENTILES[label])
+    stats['rps'] = metric_values(doc, 'http_reqs').get('rate')
+    failed = metric_values(doc, 'http_req_failed').get('rate')
+    stats['error_rate'] = failed * 100 if failed is not None else None
+    stats['from_sketch'] = sketch is not None and sketch.count > 0
+    return stats
+
+
+def cached_run_stats(series_collection, docs):
+    """run_stats() of ``docs``, reading sketches only for runs not cached yet"""
+    missing = [doc for doc in docs if doc['_id'] not in run_cache]
+    if missing:
+        sketches = run_sketches(series_collection, [doc['_id'] for doc in missing if doc.get('series')])
+        for doc in missing:
+            run_cache[doc['_id']] = run_stats(doc, sketches.get(doc['_id']))
+    stats = []
+    for doc in docs:
+        run_cache.move_to_end(doc['_id'])
+        stats.append(dict(run_cache[doc['_id']]))
+    while len(run_cache) > RUN_CACHE_SIZE:
+        run_cache.popitem(last=False)
+    return stats
+
+
+def percent_change(value, baseline):
+    if value is None or not baseline:
+        return None
+    return (value - baseline) / baseline * 100
+
+
+def flag_regressions(runs, threshold):
+    """Compare each run (newest first) with the median of the older runs"""
+    for i, run in enumerate(runs):
+        older = runs[i + 1:]
+        p95s = [r['p95'] for r in older if r['p95'] is not None]
+        rates = [r['rps'] for r in older if r['rps'] is not None]
+        run['p95_change'] = percent_change(run['p95'], median(p95s)) if p95s else None
+        run['rps_change'] = percent_change(run['rps'], median(rates)) if rates else None
+        run['regressions'] = []
+        if run['p95_change'] is not None and run['p95_change'] > threshold:
+            run['regressions'].append('p95')
+        if run['rps_change'] is not None and run['rps_change'] < -threshold:
+            run['regressions'].append('rps')
+    return runs
+
+
+def compute_trends(results_collection, series_collection, runs=TREND_RUNS,
+                   threshold=REGRESSION_THRESHOLD, test_id=None):
+    """Trends of the last ``runs`` runs per test_id, most recently run test first"""
+    query = {'test_id': test_id} if test_id is not None else {}
+    cursor = results_collection.find(query, RUN_PROJECTION).sort(
+        [('timestamp', -1), ('_id', -1)]).limit(TREND_SCAN_LIMIT)
+    groups = OrderedDict()
+    for doc in cursor:
+        group = groups.setdefault(doc.get('test_id', str(doc['_id'])), [])
+        if len(group) < runs:
+            group.append(doc)
+
+    tests = []
+    for name, docs in groups.items():
+        stats = flag_regressions(cached_run_stats(series_collection, docs), threshold)
+        tests.append({'test_id': name, 'regressed': bool(stats[0]['regressions']), 'runs': stats})
+    return {'runs': runs, 'threshold': threshold, 'tests': tests}
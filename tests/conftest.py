@@ -0,0 +1,41 @@
+"""Both services in-process against mongomock, one empty database per test.
+
+    pip install -r tests/requirements.txt
+    python -m pytest tests
+"""
+import os
+import sys
+from base64 import b64encode
+
+import mongomock
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from harness import load_service  # noqa: E402
+
+AUTH = {'Authorization': 'Basic ' + b64encode(b'admin:password').decode()}
+
+notes_app = load_service('notes-server')
+viewer = load_service('results-viewer')
+notes = sys.modules['notes']
+notes_app.MongoClient = mongomock.MongoClient
+viewer.MongoClient = mongomock.MongoClient
+
+
+@pytest.fixture
+def notes_client():
+    """notes-server's Flask test client on a fresh database"""
+    notes_app.notes_collection = None
+    notes_app.collection_pid = None
+    notes_app.note_cache.clear()
+    return notes_app.app.test_client()
+
+
+@pytest.fixture
+def viewer_client():
+    """results-viewer's Flask test client on a fresh database"""
+    viewer.results_collection = None
+    viewer.collection_pid = None
+    viewer.index_cache = (None, None)
+    viewer.trends_cache.clear()
+    return viewer.app.test_client()
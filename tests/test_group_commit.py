@@ -0,0 +1,78 @@
+import threading
+
+import mongomock
+import pytest
+from bson import ObjectId
+from pymongo.errors import AutoReconnect, BulkWriteError, DuplicateKeyError, WriteError
+
+from conftest import load_service
+
+group_commit = load_service('notes-server', 'group_commit')
+
+
+def test_batch_errors_follow_write_error_indexes():
+    exc = BulkWriteError({'writeErrors': [
+        {'index': 3, 'code': 121, 'errmsg': 'Document failed validation'},
+        {'index': 0, 'code': 11000, 'errmsg': 'E11000 duplicate key'},
+    ]})
+    errors = group_commit.batch_errors(4, exc)
+    assert type(errors[0]) is DuplicateKeyError and errors[1] is None and errors[2] is None
+    assert type(errors[3]) is WriteError and errors[3].code == 121
+
+
+def insert_concurrently(committer, docs):
+    """Insert every doc from its own thread; one ``_id`` or exception per doc, in order"""
+    outcomes = [None] * len(docs)
+    start = threading.Barrier(len(docs))
+
+    def insert(index):
+        start.wait()
+        try:
+            outcomes[index] = committer.insert(docs[index])
+        except Exception as e:
+            outcomes[index] = e
+    threads = [threading.Thread(target=insert, args=(index,)) for index in range(len(docs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+def test_each_waiter_gets_its_own_result():
+    collection = mongomock.MongoClient().db.notes
+    collection.create_index('key', unique=True)
+    collection.insert_one({'key': 'taken'})
+    docs = [{'_id': ObjectId(), 'key': 'taken' if index % 3 == 0 else f'key{index}'} for index in range(9)]
+    committer = group_commit.GroupCommitter(lambda: collection, window=1, max_batch=len(docs))
+
+    outcomes = insert_concurrently(committer, docs)
+    for doc, outcome in zip(docs, outcomes):
+        if doc['key'] == 'taken':
+            assert isinstance(outcome, DuplicateKeyError)
+        else:
+            assert outcome == doc['_id']
+    assert collection.count_documents({}) == 7
+    stats = committer.stats.snapshot()
+    assert (stats['batches'], stats['documents'], stats['failed_documents']) == (1, 9, 3)
+
+
+def test_a_failed_batch_fails_every_waiter():
+    class Unreachable:
+        def insert_many(self, docs, ordered):
+            raise AutoReconnect('connection closed')
+    committer = group_commit.GroupCommitter(Unreachable, window=1, max_batch=4)
+
+    outcomes = insert_concurrently(committer, [{'_id': ObjectId()} for _ in range(4)])
+    assert all(isinstance(outcome, AutoReconnect) for outcome in outcomes)
+    assert committer.stats.snapshot()['failed_documents'] == 4
+
+
+@pytest.mark.parametrize('max_batch', [1, 3])
+def test_batches_are_capped_at_max_batch(max_batch):
+    collection = mongomock.MongoClient().db.notes
+    committer = group_commit.GroupCommitter(lambda: collection, window=0.05, max_batch=max_batch)
+
+    docs = [{'_id': ObjectId()} for _ in range(6)]
+    assert insert_concurrently(committer, docs) == [doc['_id'] for doc in docs]
+    assert committer.stats.snapshot()['batch_size_max'] <= max_batch
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from conftest import load_service
+
+loadgen = load_service('performance-tests', 'loadgen')
+
+
+class FakeConnection:
+    def __init__(self, error=None, responded=False):
+        self.error = error
+        self.responded = responded
+        self.closed = False
+
+    async def request(self, data):
+        if self.error is not None:
+            raise self.error
+        return 200, b'{}', True
+
+    def close(self):
+        self.closed = True
+
+
+def pool_with(idle):
+    pool = loadgen.ConnectionPool('http://localhost:1', 1, 'admin', 'password')
+    pool._idle = [idle]
+    pool.connects = 0
+
+    async def connect():
+        pool.connects += 1
+        return FakeConnection()
+    pool._connect = connect
+    return pool
+
+
+@pytest.mark.parametrize('error', [ConnectionResetError(), BrokenPipeError(), asyncio.IncompleteReadError(b'', None)])
+def test_stale_idle_connection_is_retried_on_a_new_one(error):
+    idle = FakeConnection(error)
+    pool = pool_with(idle)
+    assert asyncio.run(pool.request('GET', '/notes')) == (200, b'{}')
+    assert idle.closed and pool.connects == 1
+
+
+@pytest.mark.parametrize('idle', [
+    FakeConnection(TimeoutError()),
+    FakeConnection(asyncio.IncompleteReadError(b'HTTP/1.1 200', None)),
+    FakeConnection(ConnectionResetError(), responded=True),
+])
+def test_timeouts_and_partial_responses_are_not_retried(idle):
+    pool = pool_with(idle)
+    with pytest.raises((TimeoutError, asyncio.IncompleteReadError, ConnectionResetError)):
+        asyncio.run(pool.request('GET', '/notes'))
+    assert idle.closed and pool.connects == 0
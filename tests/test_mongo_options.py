@@ -0,0 +1,24 @@
+from pymongo import MongoClient
+
+from mongo import client_options
+
+URL = 'mongodb://localhost:27017/?maxPoolSize=7&serverSelectionTimeoutMS=45000&compressors=zlib'
+
+
+def test_unset_variables_leave_the_url_options_alone():
+    options = client_options({})
+    assert set(options) == {'event_listeners'}
+
+    client = MongoClient(URL, connect=False, **options)
+    assert client.options.pool_options.max_pool_size == 7
+    assert client.options.server_selection_timeout == 45
+    assert client.options.pool_options._compression_settings.compressors == ['zlib']
+    client.close()
+
+
+def test_set_variables_are_passed():
+    options = client_options({'MONGO_MAX_POOL_SIZE': '20', 'MONGO_MIN_POOL_SIZE': '',
+                              'MONGO_COMPRESSORS': 'zlib', 'MONGO_ZLIB_LEVEL': '3'})
+    assert options['maxPoolSize'] == 20
+    assert 'minPoolSize' not in options
+    assert options['compressors'] == 'zlib' and options['zlibCompressionLevel'] == 3
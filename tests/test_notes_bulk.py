@@ -0,0 +1,34 @@
+from bson import ObjectId
+
+from conftest import AUTH, notes_app
+
+
+def test_bulk_reports_each_failure_and_applies_the_rest(notes_client):
+    kept = notes_client.post('/notes', json={'title': 'kept'}, headers=AUTH).json['id']
+    doomed = notes_client.post('/notes', json={'title': 'doomed'}, headers=AUTH).json['id']
+    missing = str(ObjectId())
+    collection = notes_app.get_collection()
+    # A write error from MongoDB itself, not from request validation
+    collection.create_index('title', unique=True)
+
+    response = notes_client.post('/notes/_bulk', headers=AUTH, json={'operations': [
+        {'op': 'create', 'title': 'kept'},
+        {'op': 'update', 'id': missing, 'title': 'x'},
+        {'op': 'delete', 'id': 'not-an-id'},
+        {'op': 'update', 'id': kept, 'content': 'edited'},
+        {'op': 'delete', 'id': doomed},
+        {'op': 'upsert'},
+        {'op': 'create', 'title': 'fresh'},
+    ]})
+    assert response.status_code == 200
+    results = response.json['results']
+    assert [result['index'] for result in results] == list(range(7))
+    assert [result['status'] for result in results] == [500, 404, 400, 200, 200, 400, 201]
+    assert 'E11000' in results[0]['error']
+    assert results[1]['id'] == missing
+    assert response.json['errors'] == 4
+
+    assert sorted(doc['title'] for doc in collection.find()) == ['fresh', 'kept']
+    assert collection.find_one({'_id': ObjectId(kept)})['content'] == 'edited'
+    assert [doc['_id'] for doc in notes_app.get_tombstones().find()] == [ObjectId(doomed)]
+    assert results[6]['note']['title'] == 'fresh'
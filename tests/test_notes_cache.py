@@ -0,0 +1,31 @@
+from bson import ObjectId
+
+from conftest import AUTH, notes, notes_app
+
+
+def test_write_from_another_worker_in_the_same_millisecond_is_seen(notes_client):
+    created = notes_client.post('/notes', json={'title': 't', 'content': 'first'}, headers=AUTH).json
+    first = notes_client.get(f"/notes/{created['id']}", headers=AUTH)
+    assert first.json['content'] == 'first'
+
+    # Another worker rewrites the note with the very same updated_at
+    collection = notes_app.get_collection()
+    stored = collection.find_one({'_id': ObjectId(created['id'])})
+    collection.update_one({'_id': stored['_id']}, notes.build_note_update({'content': 'second'}, stored['updated_at']))
+
+    second = notes_client.get(f"/notes/{created['id']}", headers=AUTH)
+    assert second.json['content'] == 'second'
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert 'version' not in second.json
+
+
+def test_cache_hit_reads_only_the_version(notes_client, monkeypatch):
+    created = notes_client.post('/notes', json={'title': 't', 'content': 'body'}, headers=AUTH).json
+    collection = notes_app.get_collection()
+    lookups = []
+    find_one = type(collection).find_one
+    monkeypatch.setattr(type(collection), 'find_one',
+                        lambda self, *args, **kwargs: lookups.append(args) or find_one(self, *args, **kwargs))
+
+    assert notes_client.get(f"/notes/{created['id']}", headers=AUTH).json['content'] == 'body'
+    assert lookups == [({'_id': ObjectId(created['id'])}, notes.CACHE_VERSION_PROJECTION)]
@@ -0,0 +1,82 @@
+from datetime import timedelta
+
+import mongomock
+from pymongo.errors import OperationFailure
+
+from conftest import AUTH, notes, notes_app
+
+
+def test_idle_feed_token_stays_fresh_past_tombstone_ttl(notes_client, monkeypatch):
+    clock = [notes.utc_now()]
+    monkeypatch.setattr(notes_app, 'utc_now', lambda: clock[0])
+
+    response = notes_client.get('/notes/changes', headers=AUTH)
+    assert response.status_code == 200
+    token = response.json['next']
+
+    # Nothing changes for twice the TTL; the client polls every half TTL
+    for _ in range(4):
+        clock[0] += timedelta(seconds=notes.TOMBSTONE_TTL / 2)
+        response = notes_client.get(f'/notes/changes?since={token}', headers=AUTH)
+        assert response.status_code == 200
+        assert response.json['changed'] == [] and response.json['deleted'] == []
+        assert response.json['next'] != token
+        token = response.json['next']
+
+    created = notes_client.post('/notes', json={'title': 'after the idle spell'}, headers=AUTH).json
+    clock[0] += notes.CHANGES_SETTLE + timedelta(seconds=1)
+    response = notes_client.get(f'/notes/changes?since={token}', headers=AUTH)
+    assert [note['id'] for note in response.json['changed']] == [created['id']]
+
+
+def test_token_older_than_tombstone_ttl_needs_resync(notes_client, monkeypatch):
+    clock = [notes.utc_now()]
+    monkeypatch.setattr(notes_app, 'utc_now', lambda: clock[0])
+    token = notes_client.get('/notes/changes', headers=AUTH).json['next']
+
+    clock[0] += timedelta(seconds=notes.TOMBSTONE_TTL + 60)
+    assert notes_client.get(f'/notes/changes?since={token}', headers=AUTH).status_code == 410
+
+
+def test_unsettled_writes_are_not_skipped(notes_client, monkeypatch):
+    clock = [notes.utc_now()]
+    monkeypatch.setattr(notes_app, 'utc_now', lambda: clock[0])
+    created = notes_client.post('/notes', json={'title': 'in flight'}, headers=AUTH).json
+
+    response = notes_client.get('/notes/changes', headers=AUTH).json
+    assert response['changed'] == []
+    clock[0] += notes.CHANGES_SETTLE
+    response = notes_client.get(f"/notes/changes?since={response['next']}", headers=AUTH).json
+    assert [note['id'] for note in response['changed']] == [created['id']]
+
+
+def test_changed_tombstone_ttl_is_applied_to_the_existing_index(notes_client, monkeypatch):
+    client = mongomock.MongoClient()
+    db = client[notes.DB_NAME]
+    db[notes.TOMBSTONE_COLLECTION_NAME].create_index('deleted_at', expireAfterSeconds=notes.TOMBSTONE_TTL + 3600)
+    monkeypatch.setattr(notes_app, 'MongoClient', lambda *args, **kwargs: client)
+
+    # mongomock reports the conflict without MongoDB's error code and has no collMod
+    create_index = mongomock.collection.Collection.create_index
+
+    def conflicting_create_index(self, keys, **options):
+        try:
+            return create_index(self, keys, **options)
+        except OperationFailure as e:
+            raise OperationFailure(str(e), code=85)
+
+    database_command = mongomock.database.Database.command
+    commands = []
+
+    def command(self, command, *args, **kwargs):
+        if isinstance(command, dict) and 'collMod' in command:
+            commands.append(command)
+            return {'ok': 1}
+        return database_command(self, command, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, 'create_index', conflicting_create_index)
+    monkeypatch.setattr(mongomock.database.Database, 'command', command)
+
+    assert notes_client.get('/notes/changes', headers=AUTH).status_code == 200
+    assert commands == [{'collMod': notes.TOMBSTONE_COLLECTION_NAME,
+                         'index': {'keyPattern': {'deleted_at': 1}, 'expireAfterSeconds': notes.TOMBSTONE_TTL}}]
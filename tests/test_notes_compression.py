@@ -0,0 +1,29 @@
+from bson import ObjectId
+
+from conftest import AUTH, notes, notes_app
+
+BODY = ' '.join(['Load tests page through notes, and the cursor holds.'] * 400)
+
+
+def test_compressed_notes_keep_their_words_searchable(notes_client, monkeypatch):
+    monkeypatch.setattr(notes, 'COMPRESS_CONTENT', True)
+    created = notes_client.post('/notes', json={'title': 'big', 'content': BODY}, headers=AUTH).json
+
+    stored = notes_app.get_collection().find_one({'_id': ObjectId(created['id'])})
+    assert 'content' not in stored
+    assert stored['content_terms'] == 'load tests page through notes, and the cursor holds.'
+
+    keys = next(keys for _, keys, options in notes.INDEXES if options.get('name') == 'notes_text')
+    assert ('content_terms', 'text') in keys
+
+    note = notes_client.get(f"/notes/{created['id']}", headers=AUTH).json
+    assert note['content'] == BODY and 'content_terms' not in note
+
+
+def test_plain_update_drops_the_search_terms(notes_client, monkeypatch):
+    monkeypatch.setattr(notes, 'COMPRESS_CONTENT', True)
+    created = notes_client.post('/notes', json={'title': 'big', 'content': BODY}, headers=AUTH).json
+
+    updated = notes_client.put(f"/notes/{created['id']}", json={'content': 'short'}, headers=AUTH).json
+    assert updated['content'] == 'short' and 'content_terms' not in updated
+    assert notes_app.get_collection().count_documents({'content_terms': {'$exists': True}}) == 0
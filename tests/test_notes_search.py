@@ -0,0 +1,35 @@
+from conftest import AUTH, load_service, notes, notes_app
+
+backfill = load_service('notes-server', 'backfill_title_keys')
+
+
+def test_warm_pool_leaves_title_keys_to_the_migration(notes_client):
+    collection = notes_app.get_collection()
+    collection.insert_many([{'title': 'Legacy note', 'content': ''}, {'title': 'legend', 'content': ''}])
+
+    notes_app.warm_pool()
+    assert collection.count_documents(notes.TITLE_KEY_MISSING) == 2
+
+    assert backfill.backfill_title_keys(collection) == 2
+    assert backfill.backfill_title_keys(collection) == 0
+    response = notes_client.get('/notes/search?prefix=LEG', headers=AUTH)
+    assert sorted(note['title'] for note in response.json['notes']) == ['Legacy note', 'legend']
+
+
+def test_prefix_pages_cross_ties_on_the_title_key(notes_client):
+    titles = ['alpha', 'Alpha', 'ALPHA', 'alphabet', 'Alps', 'Beta', 'al']
+    ids = {notes_client.post('/notes', json={'title': title}, headers=AUTH).json['id']: title for title in titles}
+
+    seen, after = [], None
+    while True:
+        url = '/notes/search?prefix=AL&limit=2' + (f'&after={after}' if after else '')
+        response = notes_client.get(url, headers=AUTH)
+        assert response.status_code == 200
+        assert len(response.json['notes']) <= 2
+        seen += [note['id'] for note in response.json['notes']]
+        after = response.json['next']
+        if after is None:
+            break
+
+    # The three 'alpha' notes share a title key, so the page boundary falls between them
+    assert [ids[note_id] for note_id in seen] == ['al', 'alpha', 'Alpha', 'ALPHA', 'alphabet', 'Alps']
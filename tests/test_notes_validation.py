@@ -0,0 +1,32 @@
+import pytest
+
+from conftest import AUTH, notes, notes_app
+
+
+@pytest.mark.parametrize('content', [42, {'text': 'hi'}, ['a'], None])
+def test_content_must_be_a_string(notes_client, content):
+    response = notes_client.post('/notes', json={'title': 't', 'content': content}, headers=AUTH)
+    assert response.status_code == 400
+    assert response.json['error'] == 'content must be a string'
+
+    note_id = notes_client.post('/notes', json={'title': 't'}, headers=AUTH).json['id']
+    response = notes_client.put(f'/notes/{note_id}', json={'content': content}, headers=AUTH)
+    assert response.status_code == 400
+    assert notes_client.get(f'/notes/{note_id}', headers=AUTH).json['content'] == ''
+
+
+def test_bulk_rejects_non_string_content_per_operation(notes_client):
+    note_id = notes_client.post('/notes', json={'title': 't'}, headers=AUTH).json['id']
+    response = notes_client.post('/notes/_bulk', headers=AUTH, json={'operations': [
+        {'op': 'create', 'title': 'bad', 'content': 7},
+        {'op': 'update', 'id': note_id, 'content': {'x': 1}},
+        {'op': 'create', 'title': 'good', 'content': 'fine'},
+    ]})
+    statuses = [result['status'] for result in response.json['results']]
+    assert statuses == [400, 400, 201]
+    assert notes_app.get_collection().count_documents({'content': {'$type': 'string'}}) == 2
+
+
+def test_summary_projection_tolerates_non_string_content():
+    content = notes.parse_projection({'view': 'summary'})['content']['$substrCP'][0]
+    assert content['$cond'][0] == {'$eq': [{'$type': '$content'}, 'string']}
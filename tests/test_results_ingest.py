@@ -0,0 +1,90 @@
+import gzip
+import hashlib
+import json
+import sys
+
+import pytest
+
+from conftest import viewer
+
+POINTS = [
+    {'type': 'Metric', 'metric': 'http_req_duration', 'data': {'type': 'trend', 'contains': 'time'}},
+    {'type': 'Point', 'metric': 'http_req_duration',
+     'data': {'time': '2024-05-01T12:00:00.000456+00:00', 'value': 12.5}},
+    {'type': 'Point', 'metric': 'http_req_duration',
+     'data': {'time': '2024-05-01T12:00:01.000987+00:00', 'value': 20.0}},
+]
+SUMMARY = {'metrics': {'http_reqs': {'count': 2, 'rate': 1.0}}}
+
+
+def point_stream():
+    return '\n'.join(json.dumps(point) for point in POINTS)
+
+
+@pytest.mark.parametrize('body', [point_stream(), json.dumps(SUMMARY)], ids=['points', 'summary'])
+@pytest.mark.parametrize('fmt', ['pretty', 'compact'])
+def test_download_length_matches_body_with_sub_millisecond_times(viewer_client, body, fmt):
+    created = viewer_client.post('/api/results', data=body)
+    assert created.status_code == 201
+
+    response = viewer_client.get(f"/download/{created.json['id']}?format={fmt}")
+    assert response.status_code == 200
+    assert int(response.headers['Content-Length']) == len(response.data)
+    if fmt == 'compact':
+        assert response.headers['ETag'].strip('"') == hashlib.sha1(response.data).hexdigest() + '-compact'
+
+    tail = viewer_client.get(f"/download/{created.json['id']}?format={fmt}", headers={'Range': 'bytes=-10'})
+    assert tail.status_code == 206
+    assert tail.data == response.data[-10:]
+    assert tail.headers['Content-Range'].endswith(f'/{len(response.data)}')
+
+
+def test_failed_upload_leaves_no_series(viewer_client, monkeypatch):
+    def fail(doc):
+        raise RuntimeError('summary failed')
+    monkeypatch.setattr(viewer, 'summarize_result', fail)
+
+    response = viewer_client.post('/api/results', data=point_stream())
+    assert response.status_code == 500
+    assert viewer.get_series_collection().count_documents({}) == 0
+    assert viewer.get_results_collection().count_documents({}) == 0
+
+
+def test_rejected_upload_leaves_no_series(viewer_client):
+    response = viewer_client.post('/api/results', data=point_stream() + '\nnot json')
+    assert response.status_code == 400
+    assert viewer.get_series_collection().count_documents({}) == 0
+
+
+def test_single_line_summary_longer_than_a_point_line_is_accepted(viewer_client):
+    ingest = sys.modules['ingest']
+    summary = dict(SUMMARY, options={'padding': 'x' * (ingest.MAX_LINE_BYTES * 2)})
+    response = viewer_client.post('/api/results', data=json.dumps(summary))
+    assert response.status_code == 201
+    assert response.json['source'] == 'summary'
+
+
+def test_point_lines_stay_bounded(viewer_client):
+    ingest = sys.modules['ingest']
+    long_point = json.dumps({'type': 'Point', 'metric': 'http_req_duration',
+                             'data': {'time': '2024-05-01T12:00:02Z', 'value': 1, 'tags': {'x': 'y' * ingest.MAX_LINE_BYTES}}})
+    response = viewer_client.post('/api/results', data=point_stream() + '\n' + long_point)
+    assert response.status_code == 400
+
+
+def test_gzip_bomb_is_refused_with_413(viewer_client, monkeypatch):
+    ingest = sys.modules['ingest']
+    monkeypatch.setattr(ingest, 'MAX_BODY_BYTES', 4 * 1024 * 1024)
+    bomb = gzip.compress(point_stream().encode() + b'\n' + b' ' * (64 * 1024 * 1024))
+    assert len(bomb) < 100 * 1024
+
+    response = viewer_client.post('/api/results', data=bomb, headers={'Content-Encoding': 'gzip'})
+    assert response.status_code == 413
+    assert viewer.get_series_collection().count_documents({}) == 0
+
+
+def test_gzip_point_stream_is_ingested(viewer_client):
+    response = viewer_client.post('/api/results', data=gzip.compress(point_stream().encode()),
+                                  headers={'Content-Encoding': 'gzip'})
+    assert response.status_code == 201
+    assert response.json['series']['points'] == 2
@@ -0,0 +1,48 @@
+import sys
+from datetime import datetime, timedelta
+
+from conftest import viewer
+
+ingest = sys.modules['ingest']
+retention = sys.modules['retention']
+
+
+def series_doc(run_id, start, values):
+    stats = ingest.MetricStats('trend')
+    for value in values:
+        stats.add(value)
+    return {'run_id': run_id, 'start': start, 'seconds': 10, 'metrics': [stats.to_doc('http_req_duration')]}
+
+
+def test_compaction_keeps_the_series_of_a_result_without_a_stored_summary(viewer_client):
+    now = datetime.utcnow()
+    started = now - timedelta(days=retention.COMPACT_AFTER_DAYS + 1)
+    results = viewer.get_results_collection()
+    series = viewer.get_series_collection()
+    run_id = results.insert_one({
+        'test_id': 'ingested', 'timestamp': started,
+        'summary': {'http_reqs': 6, 'avg_duration': 35, 'p95_duration': 60, 'error_rate': 0},
+        'series': {'bucket_seconds': 10, 'documents': 3},
+        'root_group': {'checks': [{'passes': 5, 'fails': 1}]},
+        'options': {'vus': 2},
+    }).inserted_id
+    series.insert_many([series_doc(run_id, started + timedelta(seconds=10 * i), [10 * i, 10 * i + 50])
+                        for i in range(3)])
+    assert viewer.SUMMARY_FIELD not in results.find_one()
+
+    report = viewer.compactor.run_pass(now)
+    assert report['results'] == 1
+
+    doc = results.find_one()
+    assert doc['series'] == {'bucket_seconds': retention.ROLLUP_SECONDS, 'documents': 1}
+    assert doc['checks'] == {'passes': 5, 'fails': 1} and 'options' not in doc
+    assert viewer.extract_metrics(doc)['http_reqs'] == 6
+    assert doc[viewer.SUMMARY_FIELD]['compacted']['series_bytes_before'] > 0
+
+    rolled = list(series.find({'run_id': run_id}))
+    assert len(rolled) == 1 and rolled[0][retention.ROLLUP_FIELD]
+    metric = rolled[0]['metrics'][0]
+    assert (metric['count'], metric['min'], metric['max']) == (6, 0, 70)
+
+    assert viewer.compactor.run_pass(now)['results'] == 0
+    assert series.count_documents({'run_id': run_id}) == 1
@@ -0,0 +1,63 @@
+import sys
+from datetime import datetime
+
+from conftest import load_service, viewer
+
+
+def test_summaries_are_materialized_on_first_list_not_at_startup(viewer_client):
+    collection = viewer.get_results_collection()
+    collection.insert_one({'test_id': 'legacy', 'timestamp': '2024-01-01T00:00:00Z',
+                           'metrics': {'http_reqs': {'count': 10, 'rate': 1.0}}})
+
+    viewer.warm_pool()
+    assert viewer.pool_ready.is_set()
+    assert viewer.SUMMARY_FIELD not in collection.find_one()
+
+    assert viewer_client.get('/api/results').status_code == 200
+    assert viewer.SUMMARY_FIELD in collection.find_one()
+
+
+def test_producer_summary_wins_over_the_metrics_tree(viewer_client):
+    doc = {'test_id': 'both', 'timestamp': '2024-01-02T00:00:00Z',
+           'summary': {'http_reqs': 500, 'avg_duration': 12.7, 'p95_duration': 40.2, 'error_rate': 1.5},
+           'metrics': {'http_reqs': {'values': {'count': 9}},
+                       'http_req_duration': {'values': {'avg': 99, 'p(95)': 199}}}}
+    expected = {'http_reqs': 500, 'avg_duration': 12, 'p95_duration': 40, 'error_rate': '1.50'}
+    assert viewer.extract_metrics(doc) == expected
+
+    viewer.get_results_collection().insert_one(doc)
+    assert viewer_client.get('/').status_code == 200
+    stored = viewer.get_results_collection().find_one()
+    assert viewer.extract_metrics(stored) == expected
+
+
+def test_backfill_script_stores_missing_summaries(viewer_client, monkeypatch):
+    # The script imports the viewer as ``app``, the name it has in the image
+    monkeypatch.setitem(sys.modules, 'app', viewer)
+    backfill = load_service('results-viewer', 'backfill_summaries')
+    collection = viewer.get_results_collection()
+    collection.insert_many([{'test_id': f'legacy-{i}', 'timestamp': f'2024-01-0{i + 1}T00:00:00Z',
+                             'metrics': {'http_reqs': {'values': {'count': i}}}} for i in range(5)])
+
+    assert backfill.backfill_summaries(collection, batch=2) == 5
+    assert collection.count_documents({viewer.SUMMARY_FIELD: {'$exists': False}}) == 0
+    assert backfill.backfill_summaries(collection, batch=2) == 0
+
+
+def test_api_results_pages_through_mixed_timestamp_types(viewer_client):
+    collection = viewer.get_results_collection()
+    timestamps = ([datetime(2024, 1, day) for day in (1, 2, 3)] + ['2023-12-01T00:00:00Z', '2023-11-01T00:00:00Z']
+                  + [1700000000, 1.5] + [None])
+    collection.insert_many([{'test_id': f'run-{i}', 'timestamp': timestamp} for i, timestamp in enumerate(timestamps)])
+    collection.insert_one({'test_id': 'no-timestamp'})
+
+    seen = []
+    after = ''
+    while True:
+        page = viewer_client.get(f'/api/results?limit=2&after={after}').json
+        seen += [result['filename'] for result in page['results']]
+        if page['next'] is None:
+            break
+        after = page['next']
+    assert sorted(seen) == sorted([f'run-{i}' for i in range(len(timestamps))] + ['no-timestamp'])
+    assert len(seen) == len(set(seen))